@@ -0,0 +1,146 @@
+"""レスポンスの展開処理のピークRSSを旧実装と新実装で比較する
+
+合成したレスポンス(既定で100万ドロップ)を1ページずつ生成して展開し、
+モードごとに別プロセスで実行して ru_maxrss を計測する
+
+使用方法:
+    python -m benchmarks.bench_fetch_memory [--drops 1000000]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from typing import Iterator
+
+import pandas as pd
+
+from fgo_drop_analyzer.data_fetcher import concat_pages
+from fgo_drop_analyzer.data_fetcher import flatten_page
+from fgo_drop_analyzer.data_fetcher import parse_response
+
+REPORTS_PER_PAGE = 100
+DROPS_PER_REPORT = 20
+ITEM_NAMES = ["証", "骨", "牙", "塵", "種", "ランタン", "心臓", "QP", "剣の輝石", "セイバーピース"]
+
+
+def generate_pages(drops: int) -> Iterator[bytes]:
+    """AppSync のレスポンスを模したページを順に生成する"""
+    reports = drops // DROPS_PER_REPORT
+    for start in range(0, reports, REPORTS_PER_PAGE):
+        items = []
+        for i in range(start, min(start + REPORTS_PER_PAGE, reports)):
+            owner = f"owner{i % 500}"
+            items.append(
+                {
+                    "id": f"{i:08d}-0000-0000-0000-000000000000",
+                    "owner": owner,
+                    "name": owner,
+                    "twitterId": str(i % 500),
+                    "twitterName": owner,
+                    "twitterUsername": owner,
+                    "type": "open",
+                    "warName": f"war{i % 40}",
+                    "questType": "normal",
+                    "questName": f"quest{i % 400}",
+                    "timestamp": 1_700_000_000 + i,
+                    "runs": 100,
+                    "note": "",
+                    "dropObjects": [
+                        {
+                            "objectName": ITEM_NAMES[j % len(ITEM_NAMES)],
+                            "drops": [{"num": j, "stack": 1}],
+                        }
+                        for j in range(DROPS_PER_REPORT)
+                    ],
+                }
+            )
+        yield json.dumps(
+            {"data": {"listReportsSortedByTimestamp": {"items": items}}}
+        ).encode()
+
+
+def run_legacy(drops: int) -> int:
+    """json.loads(response.text) と1ドロップ1辞書のリストによる旧実装(比較用)"""
+    reports = []
+    for content in generate_pages(drops):
+        response_data = json.loads(content.decode())
+        for item in response_data["data"]["listReportsSortedByTimestamp"]["items"]:
+            for drop_obj in item["dropObjects"]:
+                for drop in drop_obj["drops"]:
+                    reports.append(
+                        {
+                            "id": item["id"],
+                            "owner": item["owner"],
+                            "name": item["name"],
+                            "twitter_id": item["twitterId"],
+                            "twitter_name": item["twitterName"],
+                            "twitter_username": item["twitterUsername"],
+                            "report_type": item["type"],
+                            "war_name": item["warName"],
+                            "quest_type": item["questType"],
+                            "quest_name": item["questName"],
+                            "timestamp": item["timestamp"],
+                            "runs": item["runs"],
+                            "note": item["note"],
+                            "object_name": drop_obj["objectName"],
+                            "num": drop["num"],
+                            "stack": drop["stack"],
+                        }
+                    )
+    return len(pd.DataFrame(reports))
+
+
+def run_new(drops: int) -> int:
+    pages = []
+    for content in generate_pages(drops):
+        response_data = parse_response(content)
+        pages.append(
+            flatten_page(response_data["data"]["listReportsSortedByTimestamp"]["items"])
+        )
+    _, drops_df = concat_pages(pages)
+    return len(drops_df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drops", type=int, default=1_000_000)
+    parser.add_argument("--mode", choices=("legacy", "new", "baseline"))
+    args = parser.parse_args()
+
+    if args.mode:
+        # 子プロセスとして1つのモードだけ実行する
+        start = time.perf_counter()
+        rows = {"legacy": run_legacy, "new": run_new, "baseline": lambda _: 0}[
+            args.mode
+        ](args.drops)
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(json.dumps({"rows": rows, "elapsed": elapsed, "peak_rss_mb": peak}))
+        return
+
+    for mode in ("baseline", "legacy", "new"):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                __spec__.name,
+                "--drops",
+                str(args.drops),
+                "--mode",
+                mode,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output)
+        print(
+            f"{mode:8s} rows={result['rows']:>9,} "
+            f"peak_rss={result['peak_rss_mb']:8.1f}MB elapsed={result['elapsed']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""make_sort_name の旧実装と新実装のスループット(件/秒)を比較する
+
+使用方法:
+    python -m benchmarks.bench_make_sort_name [--names 200000]
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+
+from fgo_drop_analyzer.data_cleaning import make_sort_name
+
+
+def make_sort_name_legacy(s: str) -> str:
+    """re.sub を14回呼ぶ旧実装(比較用)"""
+    replacements = {
+        r"(剣|弓|槍|騎|術|殺|狂)の(輝|魔|秘)石": r"\1\2",
+        r"(剣|弓|槍|騎|術|殺|狂)の叡智の(灯火|大火|猛火|業火)": r"\1\2",
+        r"セイバーピース": r"剣ピ",
+        r"アーチャーピース": r"弓ピ",
+        r"ランサーピース": r"槍ピ",
+        r"ライダーピース": r"騎ピ",
+        r"アサシンピース": r"殺ピ",
+        r"バーサーカーピース": r"狂ピ",
+        r"セイバーモニュメント": r"剣モ",
+        r"アーチャーモニュメント": r"弓モ",
+        r"ランサーモニュメント": r"槍モ",
+        r"ライダーモニュメント": r"騎モ",
+        r"アサシンモニュメント": r"殺モ",
+        r"バーサーカーモニュメント": r"狂モ",
+    }
+
+    for pattern, replacement in replacements.items():
+        s = re.sub(pattern, replacement, s)
+
+    return s
+
+
+SAMPLE_NAMES = [
+    "証",
+    "心臓",
+    "QP",
+    "剣の輝石",
+    "狂の魔石",
+    "術の秘石",
+    "弓の叡智の猛火",
+    "槍の叡智の業火",
+    "セイバーピース",
+    "バーサーカーモニュメント",
+    "アサシンピース",
+    "イベントポイント",
+    "星冠の結晶〔セイバー〕",
+]
+
+
+def measure(func, names) -> float:
+    start = time.perf_counter()
+    for name in names:
+        func(name)
+    return len(names) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--names", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = [SAMPLE_NAMES[i] for i in rng.integers(0, len(SAMPLE_NAMES), args.names)]
+
+    for name in SAMPLE_NAMES:
+        assert make_sort_name(name) == make_sort_name_legacy(name), name
+
+    legacy = measure(make_sort_name_legacy, names)
+    new = measure(make_sort_name, names)
+    print(f"legacy: {legacy:,.0f} names/s")
+    print(f"new:    {new:,.0f} names/s")
+    print(f"speedup: {new / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
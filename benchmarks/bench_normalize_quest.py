@@ -0,0 +1,96 @@
+"""normalize_quest の旧実装と新実装の処理時間を比較する
+
+使用方法:
+    python -m benchmarks.bench_normalize_quest [--rows 500000] [--skip-legacy]
+"""
+import argparse
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fgo_drop_analyzer.data_cleaning import normalize_quest
+
+base_dir = Path(__file__).resolve().parents[1]
+
+
+def normalize_quest_legacy(
+    df: pd.DataFrame, freequest_df: pd.DataFrame
+) -> pd.DataFrame:
+    """iterrows による旧実装(比較用)"""
+    pattern = re.compile(r"(剣|弓|槍|騎|術|殺|狂)の修練場 (初|中|上|超|極)級")
+
+    for index, row in df.iterrows():
+        df.at[index, "category"] = "その他クエスト"
+
+        if pattern.match(row["quest_name"]):
+            df.at[index, "category"] = "修練場"
+            continue
+
+        matching_rows = freequest_df[freequest_df["war_name"] == row["war_name"]]
+
+        for _, freequest_row in matching_rows.iterrows():
+            if row["quest_name"] == freequest_row["quest_name"]:
+                df.at[index, "quest_name"] = freequest_row["counter_name"]
+                df.at[index, "category"] = freequest_row["category"]
+                break
+
+            elif row["quest_name"] == freequest_row["spot"]:
+                df.at[index, "quest_name"] = freequest_row["counter_name"]
+                df.at[index, "category"] = freequest_row["category"]
+                break
+
+    return df
+
+
+def make_synthetic_reports(freequest_df: pd.DataFrame, rows: int) -> pd.DataFrame:
+    """フリクエのクエスト名・spot名・修練場・イベントクエストを混ぜた報告データを作成する"""
+    rng = np.random.default_rng(0)
+    candidates = (
+        list(zip(freequest_df["war_name"], freequest_df["quest_name"]))
+        + list(zip(freequest_df["war_name"], freequest_df["spot"]))
+        + [("修練場", "剣の修練場 極級"), ("修練場", "狂の修練場 超級")]
+        + [("イベント", f"イベントクエスト{i}") for i in range(20)]
+    )
+    picked = rng.integers(0, len(candidates), size=rows)
+    return pd.DataFrame(
+        {
+            "war_name": [candidates[i][0] for i in picked],
+            "quest_name": [candidates[i][1] for i in picked],
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    freequest_df = pd.read_csv(
+        base_dir / "data" / "freequest.csv", encoding="utf-8-sig"
+    )
+    df = make_synthetic_reports(freequest_df, args.rows)
+
+    start = time.perf_counter()
+    new_df = normalize_quest(df.copy(), freequest_df)
+    new_elapsed = time.perf_counter() - start
+    print(f"new:    {args.rows} rows {new_elapsed:.3f}s")
+
+    if args.skip_legacy:
+        return
+
+    start = time.perf_counter()
+    legacy_df = normalize_quest_legacy(df.copy(), freequest_df)
+    legacy_elapsed = time.perf_counter() - start
+    print(f"legacy: {args.rows} rows {legacy_elapsed:.3f}s")
+    print(f"speedup: {legacy_elapsed / new_elapsed:.1f}x")
+
+    pd.testing.assert_frame_equal(new_df, legacy_df)
+    print("outputs are identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""合成した報告データでパイプライン全体と処理段階ごとの処理時間を計測し、結果を保存する
+
+ドロップ数ごとに合成データをローカルのスタブのエンドポイントから配信し、
+別プロセスで main() を --profile-json 付きで実行して、処理段階ごとの経過時間と
+main() 全体の経過時間・ピークRSSを benchmarks/results/<ラベル>.json に保存する
+ラベルの既定値はコミットのハッシュ(未コミットの変更がある場合は -dirty 付き)
+起動時間として python -X importtime によるモジュールの読み込み時間と --help の実行時間も保存し、
+IMPORT_BUDGETS_MS を超えたモジュールを表示する
+
+使用方法:
+    python -m benchmarks.bench_pipeline [--sizes 10000 100000 1000000] [--label ラベル] [main() のオプション ...]
+    python -m benchmarks.bench_pipeline --startup-only
+    python -m benchmarks.bench_pipeline --compare 比較元.json [比較先.json]
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+
+import pandas as pd
+
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import generate_reports
+
+base_dir = Path(__file__).resolve().parents[1]
+results_dir = base_dir / "benchmarks" / "results"
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+# モジュールの読み込み時間の予算(ミリ秒)、cli は pandas などを読み込まずに --help に応答できること
+IMPORT_BUDGETS_MS = {
+    "fgo_drop_analyzer.cli": 50,
+    "fgo_drop_analyzer.app": 1500,
+}
+
+
+def git_label() -> str:
+    """現在のコミットのハッシュ、未コミットの変更がある場合は -dirty を付ける"""
+    return subprocess.run(
+        ["git", "describe", "--always", "--dirty"],
+        cwd=base_dir,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def measure_import_ms(module: str) -> float:
+    """python -X importtime で計測したモジュールの読み込み時間(ミリ秒)"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=base_dir,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    # 最後の行が指定したモジュールで、2列目が依存するモジュールを含めた累計(マイクロ秒)
+    cumulative = stderr.strip().splitlines()[-1].split("|")[1]
+    return int(cumulative) / 1000
+
+
+def measure_startup() -> Dict[str, Any]:
+    """モジュールの読み込み時間と --help の実行時間を計測する"""
+    imports_ms = {
+        module: min(measure_import_ms(module) for _ in range(3))
+        for module in IMPORT_BUDGETS_MS
+    }
+    help_seconds = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "fgo_drop_analyzer", "--help"],
+            cwd=base_dir,
+            check=True,
+            capture_output=True,
+        )
+        help_seconds.append(time.perf_counter() - start)
+    return {
+        "imports_ms": imports_ms,
+        "help_seconds": min(help_seconds),
+        "over_budget": [
+            module
+            for module, elapsed in imports_ms.items()
+            if elapsed > IMPORT_BUDGETS_MS[module]
+        ],
+    }
+
+
+def run_child(endpoint: str, workdir: Path, app_args: List[str]) -> None:
+    """子プロセスとしてスタブのエンドポイントから取得する main() を実行する"""
+    from fgo_drop_analyzer.app import run
+    from fgo_drop_analyzer.cli import parse_arguments
+    from fgo_drop_analyzer.context import AppContext
+
+    # 取得ポイントは作業ディレクトリの config.ini に保存させる
+    config_path = workdir / "config.ini"
+    config_path.write_text(
+        f"[appsync]\napi_key = benchmark\ngraphql_endpoint = {endpoint}\n"
+    )
+    sys.argv = [
+        "fgo_drop_analyzer",
+        str(workdir / "output.xlsx"),
+        "--profile-json",
+        str(workdir / "profile.json"),
+    ] + app_args
+
+    start = time.perf_counter()
+    run(parse_arguments(), AppContext(config_path))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"elapsed": elapsed, "peak_rss_mb": peak}))
+
+
+def run_size(drops: int, app_args: List[str]) -> Dict[str, Any]:
+    """指定したドロップ数の合成データで main() を実行して計測結果を返す"""
+    reports = generate_reports(drops)
+    with StubServer(reports) as stub, tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                __spec__.name,
+                "--child",
+                stub.endpoint,
+                "--workdir",
+                str(workdir),
+            ]
+            + app_args,
+            cwd=base_dir,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        profile = json.loads((workdir / "profile.json").read_text(encoding="utf-8"))
+    return {
+        "reports": len(reports),
+        "drops": sum(
+            len(obj["drops"]) for report in reports for obj in report["dropObjects"]
+        ),
+        "requests": stub.requests,
+        "elapsed": result["elapsed"],
+        "peak_rss_mb": result["peak_rss_mb"],
+        "stages": {stage["name"]: stage["wall_time"] for stage in profile["stages"]},
+    }
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    startup = result["startup"]
+    print(f"--help: {startup['help_seconds']:.3f}s")
+    for module, elapsed in startup["imports_ms"].items():
+        budget = IMPORT_BUDGETS_MS.get(module)
+        status = " (予算超過)" if module in startup["over_budget"] else ""
+        print(f"    import {module:<28} {elapsed:8.1f}ms / {budget}ms{status}")
+    for size, size_result in result["sizes"].items():
+        print(
+            f"{int(size):>9,} drops ({size_result['reports']:,} reports): "
+            f"elapsed={size_result['elapsed']:.2f}s "
+            f"peak_rss={size_result['peak_rss_mb']:.1f}MB"
+        )
+        for name, wall_time in size_result["stages"].items():
+            print(f"    {name:<28} {wall_time:9.3f}s")
+
+
+def compare_results(base: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """2つの計測結果の経過時間を処理段階ごとに比較して表示する"""
+    print(f"{base['label']} -> {current['label']}")
+    if "startup" in base and "startup" in current:
+        print("startup")
+        rows = [
+            (
+                "--help",
+                base["startup"]["help_seconds"],
+                current["startup"]["help_seconds"],
+            )
+        ]
+        rows += [
+            (
+                f"import {module}",
+                before / 1000,
+                current["startup"]["imports_ms"][module] / 1000,
+            )
+            for module, before in base["startup"]["imports_ms"].items()
+            if module in current["startup"]["imports_ms"]
+        ]
+        for name, before, after in rows:
+            ratio = after / before if before else float("nan")
+            print(f"    {name:<28} {before:9.3f}s {after:9.3f}s  x{ratio:.2f}")
+    for size in sorted(base["sizes"].keys() & current["sizes"].keys(), key=int):
+        base_size, current_size = base["sizes"][size], current["sizes"][size]
+        print(f"{int(size):,} drops")
+        rows = [("main()", base_size["elapsed"], current_size["elapsed"])]
+        rows += [
+            (name, base_size["stages"][name], wall_time)
+            for name, wall_time in current_size["stages"].items()
+            if name in base_size["stages"]
+        ]
+        for name, before, after in rows:
+            ratio = after / before if before else float("nan")
+            print(f"    {name:<28} {before:9.3f}s {after:9.3f}s  x{ratio:.2f}")
+        print(
+            f"    {'peak_rss':<28} {base_size['peak_rss_mb']:8.1f}MB "
+            f"{current_size['peak_rss_mb']:8.1f}MB"
+        )
+
+
+def load_result(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--label", help="保存するファイル名、省略時はコミットのハッシュ")
+    parser.add_argument("--startup-only", action="store_true", help="起動時間だけを計測する")
+    parser.add_argument(
+        "--compare",
+        nargs="+",
+        metavar="RESULT",
+        help="比較元の結果、比較先を省略した場合は計測してから比較する",
+    )
+    parser.add_argument("--child", metavar="ENDPOINT", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    # 残りのオプションは main() にそのまま渡す
+    args, app_args = parser.parse_known_args()
+
+    if args.child:
+        run_child(args.child, Path(args.workdir), app_args)
+        return
+    if args.compare and len(args.compare) > 1:
+        compare_results(load_result(args.compare[0]), load_result(args.compare[1]))
+        return
+
+    label = args.label or git_label()
+    result = {
+        "label": label,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "app_args": app_args,
+        "startup": measure_startup(),
+        "sizes": {},
+    }
+    for drops in [] if args.startup_only else args.sizes:
+        result["sizes"][str(drops)] = run_size(drops, app_args)
+    print_result(result)
+
+    results_dir.mkdir(exist_ok=True)
+    path = results_dir / f"{label}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"{path} に保存しました")
+
+    if args.compare:
+        compare_results(load_result(args.compare[0]), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""ベンチマーク用に AppSync の GraphQL エンドポイントを模したローカルのHTTPサーバー
+
+listReportsSortedByTimestamp の timestamp 条件 (gt, between) と nextToken によるページングに対応する
+"""
+import bisect
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from benchmarks.synthetic import encode_page
+
+# AppSync の既定の取得件数
+PAGE_SIZE = 100
+
+
+class StubServer:
+    """timestamp の昇順に並んだ報告をページに分けて返すサーバー
+
+    with 文で使うと別スレッドで起動し、終了時に停止する
+    """
+
+    def __init__(self, reports: List[Dict[str, Any]], page_size: int = PAGE_SIZE):
+        self.reports = reports
+        self.timestamps = [report["timestamp"] for report in reports]
+        self.page_size = page_size
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.create_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/graphql"
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def find_range(self, condition: Dict[str, Any]) -> Tuple[int, int]:
+        """timestamp の条件に一致する報告の範囲を求める"""
+        if "between" in condition:
+            lower, upper = condition["between"]
+            return (
+                bisect.bisect_left(self.timestamps, lower),
+                bisect.bisect_right(self.timestamps, upper),
+            )
+        return bisect.bisect_right(self.timestamps, condition["gt"]), len(self.reports)
+
+    def respond(self, variables: Dict[str, Any]) -> bytes:
+        """1ページ分のレスポンスの本文を作成する"""
+        start, end = self.find_range(variables["timestamp"])
+        if variables.get("nextToken"):
+            start = int(variables["nextToken"])
+        stop = min(start + self.page_size, end)
+        next_token = str(stop) if stop < end else None
+        self.requests += 1
+        return encode_page(self.reports[start:stop], next_token)
+
+    def create_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                payload = json.loads(self.rfile.read(length))
+                body = stub.respond(payload["variables"])
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,209 @@
+"""ベンチマーク用に AppSync の報告データを模した合成データを作成する
+
+data/freequest.csv のクエストと data/item.csv のアイテム名・別名を元に、
+次のような実際の報告に近いデータを作成する
+- フリクエのドロップ(クエスト名とスポット名の報告が混在する)
+- 北米のスポット名が war_name に入った報告、修練場、フリクエ以外のクエスト
+- 正式名称・別名・短縮名が混在するアイテム名、礼装ボーナスによる枠数(stack)
+- 「<アイテム名>泥UP <n>%」(全角を含む)の備考、ドロップ率の異常値、ドロップしないアイテム、num が -1 の報告
+"""
+import csv
+import json
+import random
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from fgo_drop_analyzer.data_classifier import NORTH_AMERICA_SPOTS
+from fgo_drop_analyzer.data_cleaning import REGEX_METACHARACTERS
+
+base_dir = Path(__file__).resolve().parents[1]
+
+START_TIMESTAMP = 1_700_000_000
+CLASS_NAMES = {
+    "剣": "セイバー",
+    "弓": "アーチャー",
+    "槍": "ランサー",
+    "騎": "ライダー",
+    "術": "キャスター",
+    "殺": "アサシン",
+    "狂": "バーサーカー",
+}
+EMBERS = ["灯火", "大火", "猛火", "業火"]
+EVENT_ITEMS = ["QP", "イベントポイント", "証", "骨", "剣の叡智の灯火"]
+RUNS_CHOICES = [1, 10, 30, 50, 100, 100, 300, 1000]
+# 礼装のドロップボーナスによる枠数、ほとんどの報告は1枠
+STACK_CHOICES = [1, 1, 1, 1, 2, 3]
+RARITY_RATES = {"銅": 1.0, "銀": 0.5, "金": 0.2}
+
+
+def read_freequests() -> List[Dict[str, Any]]:
+    """フリクエごとの war_name・spot・quest_name・ドロップするアイテムを読み込む"""
+    with open(base_dir / "data" / "freequest.csv", encoding="utf-8-sig") as f:
+        return [
+            {
+                "category": row["category"],
+                "war_name": row["war_name"],
+                "spot": row["spot"],
+                "quest_name": row["quest_name"],
+                "items": [row[f"item{i}"] for i in range(1, 35) if row.get(f"item{i}")],
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+def read_item_names() -> Dict[str, List[str]]:
+    """アイテム名ごとに、報告で使われる正式名称・別名・短縮名の候補を読み込む"""
+    with open(base_dir / "data" / "item.csv", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        next(reader)
+        names = {}
+        for rarity, name, *aliases in reader:
+            # 正規表現で書かれた別名は使わない
+            literal_aliases = [
+                alias
+                for alias in aliases
+                if alias and not any(c in alias for c in REGEX_METACHARACTERS)
+            ]
+            names[name] = [rarity, name] + literal_aliases
+    return names
+
+
+def raw_item_name(
+    rng: random.Random, name: str, item_names: Dict[str, List[str]]
+) -> str:
+    """正規化後のアイテム名から報告に含まれる名前を1つ選ぶ"""
+    if name[0] in CLASS_NAMES and name[1:] in ("輝", "魔", "秘"):
+        return rng.choice([name, f"{name[0]}の{name[1]}石"])
+    if name[0] in CLASS_NAMES and name[1:] in ("ピ", "モ"):
+        suffix = "ピース" if name[1] == "ピ" else "モニュメント"
+        return rng.choice([name, CLASS_NAMES[name[0]] + suffix])
+    if name[0] in CLASS_NAMES and name[1:] in EMBERS:
+        return f"{name[0]}の叡智の{name[1:]}"
+    if name in item_names:
+        return rng.choice(item_names[name][1:])
+    return name
+
+
+def create_drop_up_note(rng: random.Random, object_name: str) -> str:
+    """ドロップアップ礼装の備考を作る、倍率0や全角の記述も混ぜる"""
+    return rng.choice(
+        [
+            f"{object_name}泥UP 5%",
+            f"{object_name}泥UP０%",
+            f"{object_name}泥ＵＰ　１５ ％ です",
+            f"礼装 {object_name}泥UP10% 周回",
+        ]
+    )
+
+
+def generate_reports(drops: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """合計のドロップ数が指定した数以上になるまで報告を作成する
+
+    Args:
+        drops (int): 作成するドロップ(objectName と drops の組)の数
+        seed (int, optional): 乱数のシード
+
+    Returns:
+        List[Dict[str, Any]]: timestamp の昇順に並んだ報告
+    """
+    rng = random.Random(seed)
+    freequests = read_freequests()
+    item_names = read_item_names()
+
+    reports: List[Dict[str, Any]] = []
+    total_drops = 0
+    timestamp = START_TIMESTAMP
+    while total_drops < drops:
+        timestamp += rng.choice([0, 0, 1, 5, 60, 300])
+        r = rng.random()
+        if r < 0.8:
+            quest = rng.choice(freequests)
+            if quest["spot"] in NORTH_AMERICA_SPOTS:
+                # 北米は war_name にスポット名が入る
+                war_name, quest_name = quest["spot"], ""
+            elif quest["category"] == "修練場":
+                war_name, quest_name = "カルデアゲート", quest["quest_name"]
+            else:
+                war_name = quest["war_name"]
+                quest_name = rng.choice([quest["quest_name"], quest["spot"]])
+            names = quest["items"]
+        else:
+            war_name = "イベント"
+            quest_name = f"イベントクエスト{rng.randint(1, 10)}"
+            names = EVENT_ITEMS
+
+        runs = rng.choice(RUNS_CHOICES)
+        drop_objects = []
+        for name in names:
+            if rng.random() < 0.2:
+                continue
+            rate = RARITY_RATES.get(item_names.get(name, ["銅"])[0], 1.0)
+            drop_list = []
+            for stack in rng.sample(STACK_CHOICES, rng.choice([1, 1, 2])):
+                num = int(rng.random() * rate * runs / stack)
+                if rng.random() < 0.03:
+                    # ドロップ率の検証でErrorになる異常値
+                    num = runs * 2 + 1
+                elif rng.random() < 0.02:
+                    num = -1
+                drop_list.append({"num": num, "stack": stack})
+            drop_objects.append(
+                {
+                    "objectName": raw_item_name(rng, name, item_names),
+                    "drops": drop_list,
+                }
+            )
+        if rng.random() < 0.2:
+            drop_objects.append(
+                {
+                    "objectName": "QP",
+                    "drops": [{"num": runs, "stack": rng.choice([1000, 5000])}],
+                }
+            )
+        if rng.random() < 0.02:
+            drop_objects.append(
+                {"objectName": "存在しないアイテム", "drops": [{"num": 1, "stack": 1}]}
+            )
+
+        note = ""
+        if drop_objects and rng.random() < 0.1:
+            note = create_drop_up_note(rng, rng.choice(drop_objects)["objectName"])
+        owner = f"user{rng.randint(1, 500)}"
+        twitter_id = None if rng.random() < 0.05 else str(rng.randint(1, 10**9))
+        reports.append(
+            {
+                "id": f"{len(reports):08d}-0000-0000-0000-000000000000",
+                "owner": owner,
+                "name": owner.upper(),
+                "twitterId": twitter_id,
+                "twitterName": owner + "さん",
+                "twitterUsername": owner,
+                "type": "open",
+                "warName": war_name,
+                "questType": "normal",
+                "questName": quest_name,
+                "timestamp": timestamp,
+                "runs": runs,
+                "note": note,
+                "dropObjects": drop_objects,
+            }
+        )
+        total_drops += sum(len(obj["drops"]) for obj in drop_objects)
+    return reports
+
+
+def encode_page(items: List[Dict[str, Any]], next_token: Optional[str]) -> bytes:
+    """報告のリストを AppSync のレスポンスの本文にする"""
+    return json.dumps(
+        {
+            "data": {
+                "listReportsSortedByTimestamp": {
+                    "items": items,
+                    "nextToken": next_token,
+                }
+            }
+        }
+    ).encode()
@@ -1,139 +1,660 @@
 import argparse
-import configparser
 import logging
+import sqlite3
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
+from typing import ContextManager
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
 from typing import Tuple
+from typing import TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
-from openpyxl import Workbook
-
-from .create_report import append_rows_to_sheet
-from .create_report import create_list
-from .create_report import create_statics
-from .data_classifier import modify_war_and_quest_columns
-from .data_cleaning import check_nonexistent_items
-from .data_cleaning import normalize_item
-from .data_cleaning import normalize_quest
-from .data_cleaning import validate_drop_rates
-from .data_fetcher import fetch_reports
+
+from .context import AppContext
+from .data_fetcher import fetch_report_tables
+from .data_fetcher import iter_report_batches
+from .data_fetcher import join_drops
+from .profiler import DISABLED_PROFILER
+from .profiler import StageProfiler
+from .report_store import has_quest_item_stats
+from .report_store import iter_report_windows
+from .report_store import load_quest_item_stats
+from .report_store import load_report_tables
+from .report_store import open_store
+from .report_store import read_high_water_mark
+from .report_store import update_quest_item_stats
+from .report_store import upsert_report_tables
+from .schema import concat_frames
+from .spill import ReportSpill
+
+if TYPE_CHECKING:
+    from openpyxl import Workbook
+
+    from .reference import ReferenceData
+
+# 正規化・検証・出力に使うモジュール(openpyxl・jaconv など)は、
+# 新しい報告がない実行で読み込まないよう使う関数の中で読み込む
 
 logger = logging.getLogger(__name__)
 
-base_dir = Path(__file__).resolve().parents[1]
-config = configparser.ConfigParser()
-config_path = base_dir / "conf/config.ini"
+# 分割処理で検証前の値を残しておくカラムと、残しておく先のカラム
+UNVALIDATED_COLUMNS = {"object_name": "_object_name", "category": "_category"}
+
+
+class CleanedChunks(NamedTuple):
+    """clean_in_chunks の結果"""
+
+    # すべてのチャンクのクエスト・アイテムごとの集計
+    stats_df: pd.DataFrame
+    # 取得した報告の最新の unixtime
+    latest_unixtime: int
+
+
+def prepare_workbook(streaming: bool = False) -> "Workbook":
+    """Excelワークブックの初期設定
+
+    Args:
+        streaming (bool, optional): 書き込み専用モードで作成する
+
+    Returns:
+        Workbook: 初期化されたワークブック
+    """
+    from openpyxl import LXML
+    from openpyxl import Workbook
+
+    if streaming:
+        # 書き込み専用モードでは追加した行はすぐに一時ファイルへ書き出される
+        # ただし lxml が無い場合、openpyxl はシート全体をメモリ上に組み立ててから書き出す
+        if not LXML:
+            logger.warning("lxml がインストールされていないため --streaming でもメモリ使用量は減りません")
+        return Workbook(write_only=True)
+    wb = Workbook()
+    del wb["Sheet"]
+    return wb
 
 
-def parse_arguments() -> argparse.Namespace:
-    """オプションの設定
+def fetch_new_reports(
+    args: argparse.Namespace, context: AppContext
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """config.ini の取得ポイントより新しい報告を取得する
+
+    Args:
+        args (argparse.Namespace): オプション
+        context (AppContext): 設定と参照データ
 
     Returns:
-        argparse.Namespace: 設定されたオプション
+        Tuple[pd.DataFrame, pd.DataFrame]: 新しい報告データとドロップデータ
     """
-    parser = argparse.ArgumentParser(
-        prog="fgo_drop_analyzer", description="FGO Drop Analyzer"
+    last_unixtime, last_ids = context.read_fetch_point()
+    report_table_df, drops_df = fetch_report_tables(
+        last_unixtime,
+        windows=args.fetch_windows,
+        endpoint=context.graphql_endpoint,
+        api_key=context.api_key,
     )
-    parser.add_argument("filename", help="出力Excelファイル名")
-    parser.add_argument("-l", "--loglevel", choices=("debug", "info"), default="info")
-    return parser.parse_args()
+    # 最新の10件のレポートIDとマッチするものを除外
+    report_table_df = report_table_df[~report_table_df["id"].isin(last_ids)]
+    return report_table_df, drops_df
 
 
-def setup_logging(args):
-    """ロギングのセットアップ
+def update_report_store(
+    conn: sqlite3.Connection, args: argparse.Namespace, context: AppContext
+) -> Tuple[pd.DataFrame, pd.DataFrame, Set[str]]:
+    """保存済みの最新の報告より新しい報告だけを取得して保存する
 
     Args:
-        args (_type_): オプション
+        conn (sqlite3.Connection): 保存先への接続
+        args (argparse.Namespace): オプション
+        context (AppContext): 設定と参照データ
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame, Set[str]]: 取得した報告データとドロップデータ、新たに追加された報告のid
     """
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(name)s <%(filename)s-L%(lineno)s> [%(levelname)s] %(message)s",
+    last_unixtime, last_ids = read_high_water_mark(conn)
+    report_table_df, drops_df = fetch_report_tables(
+        last_unixtime,
+        windows=args.fetch_windows,
+        endpoint=context.graphql_endpoint,
+        api_key=context.api_key,
+    )
+    report_table_df = report_table_df[~report_table_df["id"].isin(last_ids)]
+    if report_table_df.empty:
+        return report_table_df, drops_df, set()
+    new_ids = upsert_report_tables(conn, report_table_df, drops_df)
+    logger.info("%d件の報告を保存しました", len(report_table_df))
+    return report_table_df, drops_df, new_ids
+
+
+def fetch_report_chunks(
+    conn: Optional[sqlite3.Connection], args: argparse.Namespace, context: AppContext
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """新しい報告を取得し、報告数が --chunk-size 程度のチャンクに分けて古い順に返す
+       保存先を使う場合は取得したチャンクごとに保存してから、保存されているすべての報告を期間ごとに読み込む
+
+    Args:
+        conn (Optional[sqlite3.Connection]): 保存先への接続
+        args (argparse.Namespace): オプション
+        context (AppContext): 設定と参照データ
+
+    Yields:
+        Iterator[Tuple[pd.DataFrame, pd.DataFrame]]: チャンクごとの報告データとドロップデータ
+    """
+    if conn is not None:
+        last_unixtime, last_ids = read_high_water_mark(conn)
+    else:
+        last_unixtime, last_ids = context.read_fetch_point()
+    # 最新の10件のレポートIDとマッチするものを除外
+    batches = (
+        (report_table_df[~report_table_df["id"].isin(last_ids)], drops_df)
+        for report_table_df, drops_df in iter_report_batches(
+            last_unixtime,
+            args.chunk_size,
+            endpoint=context.graphql_endpoint,
+            api_key=context.api_key,
+        )
     )
-    logger.setLevel(args.loglevel.upper())
+    if conn is None:
+        yield from batches
+        return
 
+    # 全期間を取得する場合もすべての報告を一度にメモリに持たないよう、取得したチャンクごとに保存する
+    stored = 0
+    for report_table_df, drops_df in batches:
+        if not report_table_df.empty:
+            upsert_report_tables(conn, report_table_df, drops_df)
+            stored += len(report_table_df)
+    if stored == 0:
+        return
+    logger.info("%d件の報告を保存しました", stored)
+    yield from iter_report_windows(conn, args.chunk_size)
 
-def read_config() -> Tuple[int, List[str]]:
-    """config.iniが存在する場合読み込む
+
+def prepare_reports(
+    report_table_df: pd.DataFrame,
+    drops_df: pd.DataFrame,
+    context: AppContext,
+    profiler: StageProfiler = DISABLED_PROFILER,
+) -> pd.DataFrame:
+    """クエストとアイテムを正規化して1ドロップ1行のデータにする
+
+    Args:
+        report_table_df (pd.DataFrame): 報告データ
+        drops_df (pd.DataFrame): ドロップデータ
+        context (AppContext): 設定と参照データ
+        profiler (StageProfiler, optional): 処理段階ごとの計測
 
     Returns:
-        Tuple[int, List[str]]: unixtime と キャッシュされたidのリスト
+        pd.DataFrame: 正規化されたデータ
     """
-    if config_path.exists():
-        config.read(config_path)
-    return config.getint("DEFAULT", "last_unixtime", fallback=0), config.get(
-        "DEFAULT", "last_ids", fallback=""
-    ).split(",")
+    from .data_classifier import modify_war_and_quest_columns
+    from .data_cleaning import normalize_item
+    from .data_cleaning import normalize_quest
 
+    # クエストとカテゴリの解決は報告単位で行い、その後ドロップに結合する
+    with profiler.stage("modify_war_and_quest_columns", len(report_table_df)) as stage:
+        report_table_df = modify_war_and_quest_columns(report_table_df)
+        stage.rows_out = len(report_table_df)
+    with profiler.stage("normalize_quest", len(report_table_df)) as stage:
+        report_table_df = normalize_quest(
+            report_table_df,
+            context.reference.freequest_df,
+            context.reference.quest_index,
+        )
+        stage.rows_out = len(report_table_df)
+    with profiler.stage("join_drops", len(drops_df)) as stage:
+        reports_df = join_drops(report_table_df, drops_df)
+        stage.rows_out = len(reports_df)
+    with profiler.stage("normalize_item", len(reports_df)) as stage:
+        reports_df = normalize_item(
+            reports_df, context.reference.freequest_df, context.normalize_item_name
+        )
+        stage.rows_out = len(reports_df)
+    return reports_df
 
-def prepare_workbook() -> Workbook:
-    """Excelワークブックの初期設定
+
+def validate_reports(
+    reports_df: pd.DataFrame,
+    context: AppContext,
+    profiler: StageProfiler = DISABLED_PROFILER,
+) -> pd.DataFrame:
+    """ドロップ率とドロップしないアイテムを検証してErrorカテゴリを付与する
+
+    Args:
+        reports_df (pd.DataFrame): 正規化されたデータ
+        context (AppContext): 設定と参照データ
+        profiler (StageProfiler, optional): 処理段階ごとの計測
 
     Returns:
-        Workbook: 初期化されたワークブック
+        pd.DataFrame: 検証したデータ
     """
-    wb = Workbook()
-    del wb["Sheet"]
-    return wb
+    from .data_cleaning import check_nonexistent_items
+    from .data_cleaning import validate_drop_rates
+
+    with profiler.stage("validate_drop_rates", len(reports_df)) as stage:
+        reports_df = validate_drop_rates(reports_df, context.reference.rarity_dict)
+        stage.rows_out = len(reports_df)
+    with profiler.stage("check_nonexistent_items", len(reports_df)) as stage:
+        reports_df = check_nonexistent_items(
+            reports_df,
+            context.reference.freequest_df,
+            context.reference.quest_items,
+        )
+        stage.rows_out = len(reports_df)
+    return reports_df
+
+
+def clean_reports(
+    report_table_df: pd.DataFrame, drops_df: pd.DataFrame, context: AppContext
+) -> pd.DataFrame:
+    """正規化・検証した1ドロップ1行のデータを作成し、UNVALIDATED_COLUMNS に検証前の値を残す
+
+    Args:
+        report_table_df (pd.DataFrame): 報告データ
+        drops_df (pd.DataFrame): ドロップデータ
+        context (AppContext): 設定と参照データ
+
+    Returns:
+        pd.DataFrame: 検証したデータ、ドロップが無ければ空のデータ
+    """
+    reports_df = prepare_reports(report_table_df, drops_df, context)
+    if reports_df.empty:
+        return reports_df
+    # 全データシートは検証前の名前で出力するので、検証で変わる値を残しておく
+    unvalidated = {
+        name: reports_df[col].copy() for col, name in UNVALIDATED_COLUMNS.items()
+    }
+    return validate_reports(reports_df, context).assign(**unvalidated)
+
+
+# プロセスプールのワーカーで使う設定と参照データ
+worker_context: Optional[AppContext] = None
+
+
+def init_clean_worker(reference: "ReferenceData") -> None:
+    """プロセスプールのワーカーの初期化、参照データはワーカーごとに一度だけ受け取る
+
+    Args:
+        reference (ReferenceData): 参照データ
+    """
+    global worker_context
+    worker_context = AppContext(reference=reference)
+
+
+def clean_shard(report_table_df: pd.DataFrame, drops_df: pd.DataFrame) -> pd.DataFrame:
+    """ワーカーで1シャード分の報告に clean_reports を行う
+
+    Args:
+        report_table_df (pd.DataFrame): 報告データ
+        drops_df (pd.DataFrame): ドロップデータ
+
+    Raises:
+        RuntimeError: init_clean_worker で初期化されていないプロセスで呼び出した
+
+    Returns:
+        pd.DataFrame: 検証したデータ
+    """
+    if worker_context is None:
+        raise RuntimeError("init_clean_worker で初期化したワーカーで呼び出してください")
+    return clean_reports(report_table_df, drops_df, worker_context)
+
 
+def create_clean_executor(
+    jobs: int, context: AppContext
+) -> Optional[ProcessPoolExecutor]:
+    """正規化・検証に使うプロセスプールを作成する
 
-def prepare_dataframe() -> pd.DataFrame:
-    """フリーククエストデータの準備
+    Args:
+        jobs (int): プロセス数
+        context (AppContext): 設定と参照データ
 
     Returns:
-        pd.DataFrame: フリークエストデータ
+        Optional[ProcessPoolExecutor]: プロセスプール、jobs が1以下なら None
     """
-    freequest_df = pd.read_csv(
-        base_dir / "data" / "freequest.csv", encoding="utf-8-sig"
+    if jobs <= 1:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_clean_worker,
+        initargs=(context.reference,),
     )
-    freequest_df = freequest_df.loc[:, ~freequest_df.columns.str.contains("^Unnamed")]
-    return freequest_df
 
 
-def main():
-    args = parse_arguments()
-    setup_logging(args)
-    last_unixtime, last_ids = read_config()
-    wb = prepare_workbook()
-    freequest_df = prepare_dataframe()
+def shard_report_tables(
+    report_table_df: pd.DataFrame, drops_df: pd.DataFrame, shards: int
+) -> List[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """報告を id ごとに並び順の連続した shards 個のシャードに分ける
+       同じ id の報告とドロップは同じシャードに含める
 
-    reports_df = fetch_reports(last_unixtime)
-    # 最新の10件のレポートIDとマッチするものを除外
-    if not reports_df.empty:
-        reports_df = reports_df[~reports_df["id"].isin(last_ids)]
-        if reports_df.empty:
+    Args:
+        report_table_df (pd.DataFrame): 報告データ
+        drops_df (pd.DataFrame): ドロップデータ
+        shards (int): シャードの数
+
+    Returns:
+        List[Tuple[pd.DataFrame, pd.DataFrame]]: シャードごとの報告データとドロップデータ
+    """
+    codes, ids = pd.factorize(report_table_df["id"])
+    shard_of_id = np.arange(len(ids)) * shards // max(len(ids), 1)
+    report_shards = shard_of_id[codes]
+    # 報告データに無い id のドロップはどのシャードにも含めない(結合で除かれる)
+    drop_codes = ids.get_indexer(drops_df["id"])
+    drop_shards = np.where(drop_codes >= 0, shard_of_id[drop_codes], -1)
+    return [
+        (report_table_df[report_shards == i], drops_df[drop_shards == i])
+        for i in range(shards)
+    ]
+
+
+def clean_in_shards(
+    report_table_df: pd.DataFrame,
+    drops_df: pd.DataFrame,
+    executor: ProcessPoolExecutor,
+    shards: int,
+) -> pd.DataFrame:
+    """報告をシャードに分けてプロセスプールで clean_reports を行い、結果を結合する
+       報告ごとの検証は同じ id の行の中で完結するので、一度に処理した場合と同じ結果になる
+
+    Args:
+        report_table_df (pd.DataFrame): 報告データ
+        drops_df (pd.DataFrame): ドロップデータ
+        executor (ProcessPoolExecutor): create_clean_executor で作成したプロセスプール
+        shards (int): シャードの数
+
+    Returns:
+        pd.DataFrame: 一度に処理した場合と同じ順に並べた検証済みのデータ
+    """
+    frames = [
+        df
+        for df in executor.map(
+            clean_shard, *zip(*shard_report_tables(report_table_df, drops_df, shards))
+        )
+        if not df.empty
+    ]
+    if not frames:
+        return pd.DataFrame()
+    # 同じ時刻の行はシャードの順(元の並び順)のままにする
+    return concat_frames(frames).sort_values(
+        by="timestamp", ascending=False, kind="stable"
+    )
+
+
+def clean_in_chunks(
+    chunks: Iterable[Tuple[pd.DataFrame, pd.DataFrame]],
+    context: AppContext,
+    spill: ReportSpill,
+    profiler: StageProfiler = DISABLED_PROFILER,
+    executor: Optional[ProcessPoolExecutor] = None,
+    shards: int = 1,
+) -> Optional[CleanedChunks]:
+    """チャンクごとに正規化・検証してディスクに書き出し、クエスト・アイテムごとの集計を合わせる
+       メモリに持つのは1チャンク分の報告とチャンクごとの集計だけになる
+       書き出す報告データには UNVALIDATED_COLUMNS に検証前の値を残す
+
+    Args:
+        chunks (Iterable[Tuple[pd.DataFrame, pd.DataFrame]]): 古い順に並んだチャンクごとの報告データとドロップデータ
+        context (AppContext): 設定と参照データ
+        spill (ReportSpill): 処理したチャンクの書き出し先
+        profiler (StageProfiler, optional): 処理段階ごとの計測
+        executor (Optional[ProcessPoolExecutor], optional): 指定した場合はチャンクをさらにシャードに分けて並列に処理する
+        shards (int, optional): executor を指定した場合のシャードの数
+
+    Returns:
+        Optional[CleanedChunks]: 集計と最新の unixtime、処理する報告が無ければ None
+    """
+    from .create_report import aggregate_quest_items
+    from .create_report import fold_quest_item_stats
+
+    stats_list = []
+    latest_unixtime = None
+    for report_table_df, drops_df in chunks:
+        if report_table_df.empty:
+            continue
+        # 処理する前に最新の unixtime を取得
+        chunk_unixtime = int(report_table_df["timestamp"].max())
+        if latest_unixtime is None or chunk_unixtime > latest_unixtime:
+            latest_unixtime = chunk_unixtime
+        with profiler.stage("clean_chunk", len(drops_df)) as stage:
+            if executor is None:
+                reports_df = clean_reports(report_table_df, drops_df, context)
+            else:
+                reports_df = clean_in_shards(
+                    report_table_df, drops_df, executor, shards
+                )
+            if not reports_df.empty:
+                stats_list.append(aggregate_quest_items(reports_df))
+                spill.write(reports_df)
+            stage.rows_out = len(reports_df)
+    # 集計があれば latest_unixtime も必ず設定されている
+    if not stats_list or latest_unixtime is None:
+        return None
+    return CleanedChunks(fold_quest_item_stats(stats_list), latest_unixtime)
+
+
+def split_unvalidated(reports_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """clean_reports の結果を結合したデータを、検証前のデータと検証結果に分ける
+
+    Args:
+        reports_df (pd.DataFrame): clean_reports の結果を処理した順に結合したデータ
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: 検証前のデータと、検証で変わるカラムの検証後の値
+    """
+    validated_df = reports_df[list(UNVALIDATED_COLUMNS)]
+    for col, name in UNVALIDATED_COLUMNS.items():
+        reports_df[col] = reports_df.pop(name)
+    # 一度に処理した場合と同じ順にする(同じ時刻の行は先に処理したものが先)
+    order = reports_df["timestamp"].sort_values(ascending=False, kind="stable").index
+    return reports_df.loc[order], validated_df.loc[order]
+
+
+def update_summary(
+    conn: sqlite3.Connection,
+    context: AppContext,
+    chunk_size: Optional[int] = None,
+) -> pd.DataFrame:
+    """保存されている報告のうち、まだ集計に含めていない報告の集計を保存済みの集計に加算し、更新後の集計を返す
+       差分モードを使わずに保存した報告や、前回集計する前に止まった実行で保存した報告も含まれる
+       集計がまだ無い場合は保存されているすべての報告が対象になる
+
+    Args:
+        conn (sqlite3.Connection): 保存先への接続
+        context (AppContext): 設定と参照データ
+        chunk_size (Optional[int], optional): 一度に処理する報告数の目安、省略時はすべて
+
+    Returns:
+        pd.DataFrame: クエスト・アイテムごとの集計
+    """
+    from .create_report import aggregate_quest_items
+
+    if not has_quest_item_stats(conn):
+        logger.info("保存されているすべての報告から集計を作成します")
+    if chunk_size:
+        chunks = iter_report_windows(conn, chunk_size, unaggregated=True)
+    else:
+        chunks = iter([load_report_tables(conn, unaggregated=True)])
+    for report_table_df, drops_df in chunks:
+        if report_table_df.empty:
+            continue
+        chunk_df = prepare_reports(report_table_df, drops_df, context)
+        if not chunk_df.empty:
+            chunk_df = validate_reports(chunk_df, context)
+        # ドロップの無い報告も集計済みとして記録する
+        update_quest_item_stats(
+            conn, aggregate_quest_items(chunk_df), report_table_df["id"]
+        )
+    return load_quest_item_stats(conn)
+
+
+def executor_context(
+    executor: Optional[ProcessPoolExecutor],
+) -> ContextManager[Optional[ProcessPoolExecutor]]:
+    """with で使うプロセスプールを返す、無い場合は何もしない context manager を返す
+
+    Args:
+        executor (Optional[ProcessPoolExecutor]): プロセスプール
+
+    Returns:
+        ContextManager[Optional[ProcessPoolExecutor]]: with を抜けるとプロセスプールを終了する
+    """
+    if executor is not None:
+        return executor
+    return nullcontext()
+
+
+def run(args: argparse.Namespace, context: AppContext):
+    """報告を取得して正規化・検証し、Excelファイルなどに出力する
+
+    Args:
+        args (argparse.Namespace): オプション
+        context (AppContext): 設定と参照データ
+    """
+    profiler = StageProfiler(
+        enabled=args.profile or args.profile_json is not None,
+        trace_malloc=args.profile_tracemalloc,
+    )
+    # 報告単位のデータとドロップ単位のデータを別々に持つ
+    conn = open_store(args.store) if args.store else None
+    # 分割・並列処理では検証で変わるカラムの検証後の値も作成済み(分割処理では集計も)
+    validated_df = None
+    stats_df = None
+    if args.chunk_size and not args.incremental:
+        with tempfile.TemporaryDirectory(prefix="fgo_drop_analyzer-") as spill_dir:
+            spill = ReportSpill(Path(spill_dir))
+            executor = create_clean_executor(args.jobs, context)
+            with executor_context(executor):
+                cleaned = clean_in_chunks(
+                    fetch_report_chunks(conn, args, context),
+                    context,
+                    spill,
+                    profiler,
+                    executor,
+                    args.jobs,
+                )
+            if cleaned is None:
+                logger.info("新規データがありません")
+                sys.exit()
+            with profiler.stage("read_spill") as stage:
+                reports_df, validated_df = split_unvalidated(spill.read())
+                stage.rows_out = len(reports_df)
+        latest_unixtime = cleaned.latest_unixtime
+        stats_df = cleaned.stats_df
+    else:
+        with profiler.stage("fetch") as stage:
+            if conn is not None:
+                report_table_df, drops_df, _ = update_report_store(conn, args, context)
+                # 差分モードでなければ保存されているすべての報告から出力する
+                if not report_table_df.empty and not args.incremental:
+                    report_table_df, drops_df = load_report_tables(conn)
+            else:
+                report_table_df, drops_df = fetch_new_reports(args, context)
+            stage.rows_out = len(report_table_df)
+        if report_table_df.empty:
             logger.info("新規データがありません")
             sys.exit()
-        reports_df = modify_war_and_quest_columns(reports_df)
-        reports_df = normalize_quest(reports_df, freequest_df)
+
         # 処理する前に最新の unixtime を取得
-        latest_unixtime = reports_df["timestamp"].max()
+        latest_unixtime = report_table_df["timestamp"].max()
+
+        executor = create_clean_executor(args.jobs, context)
+        if executor is None:
+            reports_df = prepare_reports(report_table_df, drops_df, context, profiler)
+        else:
+            # 報告をシャードに分けて、正規化から検証までをまとめて並列に行う
+            with executor, profiler.stage("clean_in_shards", len(drops_df)) as stage:
+                reports_df = clean_in_shards(
+                    report_table_df, drops_df, executor, args.jobs
+                )
+                stage.rows_out = len(reports_df)
+            if not reports_df.empty:
+                reports_df, validated_df = split_unvalidated(reports_df)
+        if reports_df.empty:
+            logger.info("新規データがありません")
+            sys.exit()
+
+    # 新しい報告がある場合だけ出力に使うモジュールを読み込む
+    from .create_report import aggregate_quest_items
+    from .create_report import append_rows_to_sheet
+    from .create_report import create_list
+    from .create_report import create_statics
+    from .create_report import create_summary
+    from .create_report import prepare_report_set
+    from .create_report import update_report_set
+    from .export import export_tables
 
-        reports_df = normalize_item(reports_df, freequest_df)
+    # Excel 以外の形式ではワークブックを作成しない
+    wb = prepare_workbook(args.streaming) if args.format == "xlsx" else None
 
-        ws = wb.create_sheet(title="全データ")
-        append_rows_to_sheet(ws, reports_df)
+    if wb is not None:
+        with profiler.stage("全データ", len(reports_df)):
+            # 全データ・報告シート・統計シートで共有する中間データ(全データは検証前の名前で出力する)
+            prepared = prepare_report_set(reports_df)
+            ws = wb.create_sheet(title="全データ")
+            append_rows_to_sheet(ws, prepared)
 
-        reports_df = validate_drop_rates(reports_df)
-        reports_df = check_nonexistent_items(reports_df, freequest_df)
-        create_list(wb, reports_df)
-        create_statics(wb, reports_df, freequest_df)
+    if validated_df is None:
+        reports_df = validate_reports(reports_df, context, profiler)
+    else:
+        for col in validated_df.columns:
+            reports_df[col] = validated_df[col]
+    summary_df = None
+    if conn is not None and args.incremental:
+        with profiler.stage("update_summary", len(reports_df)) as stage:
+            summary_df = update_summary(conn, context, args.chunk_size)
+            stage.rows_out = len(summary_df)
+
+    if wb is None:
+        with profiler.stage("export", len(reports_df)):
+            if summary_df is None:
+                summary_df = (
+                    stats_df
+                    if stats_df is not None
+                    else aggregate_quest_items(reports_df)
+                )
+            for path in export_tables(
+                args.filename, args.format, reports_df, summary_df
+            ):
+                logger.info("%s を出力しました", path)
+    else:
+        with profiler.stage("update_report_set", len(reports_df)):
+            prepared = update_report_set(prepared, reports_df)
+        # シートごとの行の作成はプロセスで並列に行い、シートは元の順番で作成する
+        with executor_context(
+            ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+        ) as executor:
+            with profiler.stage("create_list", len(reports_df)):
+                create_list(wb, prepared, executor)
+            with profiler.stage("create_statics", len(reports_df)):
+                create_statics(wb, prepared, context.reference.freequest_df, executor)
+        if summary_df is not None:
+            with profiler.stage("create_summary", len(summary_df)):
+                create_summary(wb, summary_df, context.reference.freequest_df)
 
         # Workbookを保存します
         if args.filename.endswith(".xlsx") is True:
             filename = args.filename
         else:
             filename = args.filename + ".xlsx"
-        wb.save(filename)
+        with profiler.stage("wb.save"):
+            wb.save(filename)
 
-        # 最新の取得ポイントと最新の10件のレポートIDを config.ini に保存
-        config.set("DEFAULT", "last_unixtime", str(latest_unixtime))
+    if args.profile:
+        print(profiler.format_table(), file=sys.stderr)
+    if args.profile_json is not None:
+        profiler.write_json(args.profile_json)
 
-        # 最新の10件のレポートIDを更新
-        latest_ids = reports_df["id"].head(10).tolist()
-        config.set("DEFAULT", "last_ids", ",".join(latest_ids))
+    # 保存先を使う場合は保存先が取得ポイントを持つ
+    if conn is not None:
+        conn.close()
+        return
 
-        with config_path.open("w") as f:
-            config.write(f)
-    else:
-        logger.info("新規データがありません")
+    # 最新の取得ポイントと最新の10件のレポートIDを config.ini に保存
+    context.save_fetch_point(latest_unixtime, reports_df["id"].head(10).tolist())
@@ -0,0 +1,111 @@
+import argparse
+import logging
+
+from .context import AppContext
+
+
+def parse_arguments() -> argparse.Namespace:
+    """オプションの設定
+
+    Returns:
+        argparse.Namespace: 設定されたオプション
+    """
+    parser = argparse.ArgumentParser(
+        prog="fgo_drop_analyzer", description="FGO Drop Analyzer"
+    )
+    parser.add_argument("filename", help="出力Excelファイル名")
+    parser.add_argument("-l", "--loglevel", choices=("debug", "info"), default="info")
+    parser.add_argument(
+        "-s",
+        "--store",
+        help="取得した報告を蓄積するSQLiteファイル、指定すると差分だけを取得して蓄積したすべての報告から出力する",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="--store と併用し、新しい報告だけを出力して保存済みのクエスト・アイテムごとの集計を更新する",
+    )
+    parser.add_argument(
+        "-w",
+        "--fetch-windows",
+        type=int,
+        default=1,
+        help="取得期間を分割して並列に取得する数",
+    )
+    parser.add_argument(
+        "-c",
+        "--chunk-size",
+        type=int,
+        metavar="N",
+        help="報告N件程度ごとに正規化・検証してディスクに書き出し、すべての報告を一度にメモリに持たない"
+        "(--fetch-windows は使わない、--incremental と併用した場合は集計を作り直すときだけ分割する)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="正規化・検証と報告シート・統計シートの作成に使うプロセス数、1の場合は順に処理する",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=("xlsx", "parquet", "feather", "csv"),
+        default="xlsx",
+        help="出力形式、xlsx 以外ではドロップ・報告・クエストごとの集計をそれぞれ別のファイルに出力する(csv は gzip 圧縮)",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="書き込み専用モードでExcelファイルを出力し、セルをメモリに保持しない",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="処理段階ごとの経過時間・CPU時間・行数・ピークメモリを表で出力する",
+    )
+    parser.add_argument(
+        "--profile-json",
+        metavar="PATH",
+        help="--profile と同じ計測結果を JSON で保存する",
+    )
+    parser.add_argument(
+        "--profile-tracemalloc",
+        action="store_true",
+        help="--profile, --profile-json で tracemalloc によるメモリ確保量のピークも計測する(処理が数倍遅くなる)",
+    )
+    args = parser.parse_args()
+    if args.incremental and not args.store:
+        parser.error("--incremental には --store の指定が必要です")
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error("--chunk-size には1以上を指定してください")
+    if args.format != "xlsx":
+        from .export import arrow_available
+        from .export import ARROW_FORMATS
+
+        if args.format in ARROW_FORMATS and not arrow_available():
+            parser.error(f"--format {args.format} には pyarrow のインストールが必要です")
+    return args
+
+
+def setup_logging(args):
+    """ロギングのセットアップ
+
+    Args:
+        args (_type_): オプション
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(name)s <%(filename)s-L%(lineno)s> [%(levelname)s] %(message)s",
+    )
+    logging.getLogger(__package__).setLevel(args.loglevel.upper())
+
+
+def main():
+    args = parse_arguments()
+    setup_logging(args)
+    # pandas や openpyxl を読み込むのはオプションの解析が終わってから
+    from .app import run
+
+    run(args, AppContext())
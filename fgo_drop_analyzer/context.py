@@ -0,0 +1,90 @@
+import configparser
+from functools import cached_property
+from pathlib import Path
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .reference import ReferenceData
+
+base_dir = Path(__file__).resolve().parents[1]
+CONFIG_PATH = base_dir / "conf" / "config.ini"
+DATA_DIR = base_dir / "data"
+REFERENCE_CACHE_PATH = base_dir / ".cache" / "reference.pickle"
+
+
+class AppContext:
+    """1回の実行で使う設定と参照データ
+    config.ini は作成時に読み込み、参照データ(フリクエ・アイテム)は初めて使うときに読み込む
+    """
+
+    def __init__(
+        self,
+        config_path: Path = CONFIG_PATH,
+        data_dir: Path = DATA_DIR,
+        cache_path: Optional[Path] = REFERENCE_CACHE_PATH,
+        reference: Optional["ReferenceData"] = None,
+    ):
+        """
+        Args:
+            config_path (Path, optional): config.ini のパス
+            data_dir (Path, optional): freequest.csv と item.csv があるディレクトリ
+            cache_path (Optional[Path], optional): 参照データのキャッシュのパス、None の場合はキャッシュを使わない
+            reference (Optional[ReferenceData], optional): 読み込み済みの参照データ、プロセスプールのワーカーで使う
+        """
+        self.config_path = config_path
+        self.data_dir = data_dir
+        self.cache_path = cache_path
+        self._reference = reference
+        self.config = configparser.ConfigParser()
+        if config_path.exists():
+            self.config.read(config_path, encoding="utf-8")
+
+    @property
+    def graphql_endpoint(self) -> str:
+        return self.config.get("appsync", "graphql_endpoint", fallback="")
+
+    @property
+    def api_key(self) -> str:
+        return self.config.get("appsync", "api_key", fallback="")
+
+    def read_fetch_point(self) -> Tuple[int, List[str]]:
+        """config.ini に保存した取得ポイントを読み込む
+
+        Returns:
+            Tuple[int, List[str]]: unixtime と キャッシュされたidのリスト
+        """
+        return self.config.getint(
+            "DEFAULT", "last_unixtime", fallback=0
+        ), self.config.get("DEFAULT", "last_ids", fallback="").split(",")
+
+    def save_fetch_point(self, last_unixtime: int, last_ids: List[str]) -> None:
+        """最新の取得ポイントと最新のレポートIDを config.ini に保存する
+
+        Args:
+            last_unixtime (int): 最新の報告の unixtime
+            last_ids (List[str]): 最新のレポートID
+        """
+        self.config.set("DEFAULT", "last_unixtime", str(last_unixtime))
+        self.config.set("DEFAULT", "last_ids", ",".join(last_ids))
+        with self.config_path.open("w", encoding="utf-8") as f:
+            self.config.write(f)
+
+    @property
+    def reference(self) -> "ReferenceData":
+        """freequest.csv と item.csv から作成した参照データ、キャッシュがあればそこから読み込む"""
+        if self._reference is None:
+            from .reference import load_reference_data
+
+            self._reference = load_reference_data(self.data_dir, self.cache_path)
+        return self._reference
+
+    @cached_property
+    def normalize_item_name(self) -> Callable[[str], str]:
+        """item.csv の別名を正規化する関数"""
+        from .data_cleaning import create_alias_normalizer
+
+        return create_alias_normalizer(self.reference.aliases)
@@ -1,8 +1,167 @@
+from concurrent.futures import Executor
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
 import numpy as np
 import pandas as pd
 from openpyxl import Workbook
+from openpyxl.cell.cell import WriteOnlyCell
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
 from openpyxl.worksheet.worksheet import Worksheet
 
+from .schema import report_urls
+from .schema import to_plain_dtypes
+
+# フリクエデータのドロップアイテムのカラム
+ITEM_COLUMNS = [f"item{i}" for i in range(1, 35)]
+# 報告シートのヘッダー
+LIST_HEADERS = [
+    "id",
+    "timestamp",
+    "owner",
+    "name",
+    "twitter_id",
+    "twitter_name",
+    "twitter_username",
+    "note",
+    "url",
+    "war_name",
+    "quest_name",
+    "runs",
+]
+# 統計シートの集計で欠損があってはいけない報告単位のカラム
+STATICS_KEY_COLUMNS = LIST_HEADERS[1:] + ["report_type", "quest_type"]
+
+
+class PreparedReports(NamedTuple):
+    """全データ・報告シート・統計シートで共有する、報告データから一度だけ作成する中間データ"""
+
+    # 報告ごとのヘッダー部分の値(報告の最初の行の値)、id がインデックス
+    header_df: pd.DataFrame
+    # ドロップごとの id・アイテム名・個数・枠数・カテゴリ・シートに出力する名前
+    drops_df: pd.DataFrame
+    # ドロップごとの Error カテゴリかどうか
+    error: np.ndarray
+
+
+def create_drop_labels(object_names: pd.Series, stack: pd.Series) -> pd.Series:
+    """報告シートに出力する枠数付きのアイテム名をまとめて作成する
+
+    Args:
+        object_names (pd.Series): アイテム名
+        stack (pd.Series): 枠数
+
+    Returns:
+        pd.Series: 枠数が1の場合はアイテム名、2以上の場合は (+枠数) か (x枠数) を付けた名前
+    """
+    object_names = object_names.astype(object)
+    is_point = (object_names == "QP") | object_names.str.endswith(
+        ("ポイント", "P"), na=False
+    )
+    return object_names.where(
+        (stack == 1).to_numpy(dtype=bool, na_value=False),
+        object_names + np.where(is_point, "(+", "(x") + stack.astype(str) + ")",
+    )
+
+
+def prepare_report_set(reports_df: pd.DataFrame) -> PreparedReports:
+    """報告データからシートの作成に使う中間データを作成する
+
+    Args:
+        reports_df (pd.DataFrame): 報告データ(1ドロップ1行)
+
+    Returns:
+        PreparedReports: 中間データ
+    """
+    header_df = reports_df.drop_duplicates(subset="id").set_index("id")
+    # url はドロップごとには持たず、報告ごとに id から作成する
+    if "url" not in header_df.columns:
+        header_df["url"] = report_urls(header_df.index)
+    header_df = header_df[STATICS_KEY_COLUMNS]
+    # カテゴリ型と nullable 整数型はそのまま使う
+    drops_df = reports_df[
+        ["id", "object_name", "num", "stack", "category"]
+    ].reset_index(drop=True)
+    drops_df["label"] = create_drop_labels(drops_df["object_name"], drops_df["stack"])
+    return PreparedReports(
+        header_df, drops_df, (drops_df["category"] == "Error").to_numpy()
+    )
+
+
+def update_report_set(
+    prepared: PreparedReports, reports_df: pd.DataFrame
+) -> PreparedReports:
+    """検証後の報告データのカテゴリとアイテム名を中間データに反映する
+       検証で変わるのは Error カテゴリにされた行だけなので、その行の名前だけを作り直す
+
+    Args:
+        prepared (PreparedReports): 検証前の報告データから作成した中間データ
+        reports_df (pd.DataFrame): 検証した報告データ(行は検証前と対応する)
+
+    Returns:
+        PreparedReports: 更新した中間データ
+    """
+    error = (reports_df["category"] == "Error").to_numpy()
+    drops_df = prepared.drops_df.assign(
+        object_name=reports_df["object_name"].array,
+        category=reports_df["category"].array,
+    )
+    drops_df.loc[error, "label"] = create_drop_labels(
+        drops_df.loc[error, "object_name"], drops_df.loc[error, "stack"]
+    )
+    return prepared._replace(drops_df=drops_df, error=error)
+
+
+def select_reports(prepared: PreparedReports, mask: np.ndarray) -> PreparedReports:
+    """中間データから一部のドロップだけを取り出す
+
+    Args:
+        prepared (PreparedReports): 中間データ
+        mask (np.ndarray): 取り出すドロップ
+
+    Returns:
+        PreparedReports: 取り出したドロップとその報告だけの中間データ
+    """
+    drops_df = prepared.drops_df[mask].reset_index(drop=True)
+    header_df = prepared.header_df[prepared.header_df.index.isin(drops_df["id"])]
+    return PreparedReports(header_df, drops_df, prepared.error[mask])
+
+
+def create_statics_source(prepared: PreparedReports) -> pd.DataFrame:
+    """統計シート用に報告・アイテムごとの個数(個数 x 枠数の合計)を求める
+       Error カテゴリのドロップと、集計に使うカラムに欠損のある報告は含めない
+
+    Args:
+        prepared (PreparedReports): 中間データ
+
+    Returns:
+        pd.DataFrame: 報告・アイテムごとの個数と報告のヘッダー部分
+    """
+    header_df = prepared.header_df
+    complete_ids = header_df.index[header_df.notna().all(axis=1)]
+    drops_df = prepared.drops_df[~prepared.error]
+    drops_df = drops_df[
+        drops_df["id"].isin(complete_ids)
+        & drops_df["object_name"].notna()
+        & drops_df["category"].notna()
+    ]
+    source_df = (
+        drops_df.assign(num=drops_df["num"] * drops_df["stack"])
+        .groupby(["id", "category", "object_name"], sort=False, observed=True)["num"]
+        .sum()
+        .reset_index()
+    )
+    # 統計シートの行はクエストごとに値を並べて作るので、ここで通常の型に戻す
+    return to_plain_dtypes(source_df.join(header_df, on="id"))
+
 
 def prepare_data(reports_df: pd.DataFrame, freequest_df: pd.DataFrame) -> pd.DataFrame:
     """報告と対応するクエストデータをマージする
@@ -24,189 +183,163 @@ def prepare_data(reports_df: pd.DataFrame, freequest_df: pd.DataFrame) -> pd.Dat
         fill_value=None,
     ).reset_index()
 
-    # freequest_dfの"quest_name"を"counter_name"の値で置き換え
-    freequest_df["quest_name"] = freequest_df["counter_name"]
+    # freequest_dfの"quest_name"を"counter_name"の値で置き換え(呼び出し元のデータは変更しない)
+    freequest_df = freequest_df.assign(quest_name=freequest_df["counter_name"])
     merged_df = freequest_df.merge(
         reports_df_pivot, on=["war_name", "quest_name"], how="outer"
     )
     return merged_df
 
 
-def create_output_df(group: pd.DataFrame, item_columns: np.ndarray) -> pd.DataFrame:
-    """あるフリクエ用にExcelの統計シート出力用にデータを整形する
+def create_output_rows(
+    group: pd.DataFrame, item_columns: np.ndarray
+) -> List[Tuple[str, list]]:
+    """あるフリクエ用にExcelの統計シート出力用の行を作成する
 
     Args:
         group (pd.DataFrame): そのフリクエの全入力データ
         item_columns (np.ndarray): そのフリクエでドロップするアイテム
 
     Returns:
-        pd.DataFrame: 整形されたデータ
+        List[Tuple[str, list]]: 周回数・各アイテム・ソース・メモの行の見出しと報告ごとの値
     """
+    labels = ["周回数"] + list(item_columns) + ["ソース", "メモ"]
+    # 報告の無いクエストは見出しだけを出力する
+    if group["id"].isnull().all():
+        return [(label, []) for label in labels]
+
     # ソート操作を追加。timestamp列に基づいて昇順にソート
     group = group.sort_values(by="timestamp")
 
-    columns_after_item13 = group.columns.tolist()[
-        group.columns.tolist().index("item34") + 1
+    # 転置せずに列ごとの値をそのまま行にする、報告の無いアイテムは空欄
+    blank = [""] * len(group)
+    columns = ["runs"] + list(item_columns) + ["url", "timestamp"]
+    rows = [
+        group[col].to_numpy(dtype=object).tolist() if col in group.columns else blank
+        for col in columns
     ]
-    output_columns = ["url", "timestamp", "runs"] + list(item_columns)
 
-    if group[columns_after_item13].isnull().all().all():
-        output_df = pd.DataFrame(columns=output_columns)
-    else:
-        output_df = group.drop(["id", "category", "war_name"], axis=1).reset_index(
-            drop=True
-        )
+    # 報告とwar_nameが一致しないフリクエの行は値がすべて欠損した列になる
+    # 転置していたときと同じく、空欄のアイテムが無ければ NaT として出力する
+    if all(col in group.columns for col in columns):
+        missing = np.flatnonzero(group[columns].isnull().all(axis=1).to_numpy())
+        for values in rows:
+            for i in missing:
+                values[i] = pd.NaT
 
-    for col in output_columns:
-        if col not in output_df.columns:
-            output_df[col] = ""
-
-    output_df = output_df[output_columns[2:] + ["url", "timestamp"]]
-    output_df = output_df.rename(
-        columns={"url": "ソース", "timestamp": "メモ", "runs": "周回数"}
-    )
-    output_df = output_df.T
-    output_df.reset_index(inplace=True)
-    output_df.columns = pd.Index(["No."] + list(output_df.columns[1:]))
-    return output_df
+    return list(zip(labels, rows))
 
 
 def write_to_sheet(
-    ws: Worksheet,
-    output_df: pd.DataFrame,
+    ws: Union[Worksheet, WriteOnlyWorksheet],
+    output_rows: List[Tuple[str, list]],
     war_name: str,
     quest_name: str,
     previous_war_name: str,
-) -> str:
+    max_column: int = 1,
+) -> Tuple[str, int]:
     """あるクエストの全データをまとめて特定の統計シートに出力する
 
     Args:
-        ws (Worksheet): 出力するシート
-        output_df (pd.DataFrame): quest_nameの全報告データ
+        ws (Union[Worksheet, WriteOnlyWorksheet]): 出力するシート
+        output_rows (List[Tuple[str, list]]): quest_nameの全報告データの行
         war_name (str): いわゆる特異点名、修練場の場合は曜日
         quest_name (str): クエスト名
         previous_war_name (str): このクエストの前に出力した特異点名
+        max_column (int, optional): このシートにすでに出力した最大の列数
 
     Returns:
-        str: _description_
+        Tuple[str, int]: 出力した特異点名と出力後のシートの最大の列数
     """
     if war_name != previous_war_name:
         ws.append([war_name])
 
     ws.append([None, quest_name])
     ws.append([None] + ["No."])
-
-    for data_row in output_df.values:
-        ws.append([None] + data_row.tolist()[:1] + [None, None] + data_row.tolist()[1:])
-        if data_row.tolist()[0] == "メモ":
-            for cell in ws[ws.max_row][4:]:
+    max_column = max(max_column, 2)
+
+    for label, values in output_rows:
+        max_column = max(max_column, 4 + len(values))
+        # 書式とリンクは追加する前に設定しておく(書き込み専用のシートは追加後に変更できない)
+        if label == "メモ":
+            # シートの最大列までの空のセルにも書式を設定する
+            cells = [WriteOnlyCell(ws, value=value) for value in values]
+            cells += [WriteOnlyCell(ws) for _ in range(max_column - 4 - len(values))]
+            for cell in cells:
                 cell.number_format = "mm/dd"
-        elif data_row.tolist()[0] == "ソース":
-            for cell in ws[ws.max_row][4:]:
+            ws.append([None, label, None, None] + cells)
+        elif label == "ソース":
+            cells = [WriteOnlyCell(ws, value=value) for value in values]
+            for cell in cells:
                 if cell.value is not None:
                     cell.hyperlink = str(cell.value)  # type: ignore
+            ws.append([None, label, None, None] + cells)
+            # 通常のシートではリンクの参照先を追加された位置に合わせる
+            for cell in cells:
+                if cell.hyperlink is not None:
+                    cell.hyperlink.ref = cell.coordinate
+        else:
+            ws.append([None, label, None, None] + values)
 
     ws.append([])
     ws.append([])
-    return war_name  # war_nameを更新
+    return war_name, max_column  # war_nameを更新
 
 
-def aggregate_items_by_object(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    DataFrameを入力として受け取り、特定のカラムとobject_nameでグループ化し、
-    numとstackの乗算の合計を計算して集計する関数。
+def select_mapper(executor: Optional[Executor]) -> Callable[..., Iterator[Any]]:
+    """シートごとの行の作成に使う map を選ぶ
 
     Args:
-        df: 入力Pandas DataFrame。以下のカラムを含み、numとstackがint型であることを期待します。
-            id, owner, name, twitter_id, twitter_name, twitter_username,
-            report_type, war_name, quest_type, quest_name, timestamp,
-            runs, note, object_name, num, stack, category, url
+        executor (Optional[Executor]): 並列に作成する場合の Executor
 
     Returns:
-        集計済みのPandas DataFrame。object_nameごとにnum * stackの合計が
-        計算され、stackは1に設定されます。元のDataFrameと同じカラム構成と順序になります。
+        Callable[..., Iterator[Any]]: executor があれば executor.map、無ければ組み込みの map
     """
-    # 入力DataFrameのコピーを作成し、元のDataFrameを変更しないようにする
-    df_processed = df.copy()
-
-    # numとstackの乗算結果を計算する一時カラムを作成
-    # numとstackがint型であることを前提としていますが、乗算結果や合計は大きくなる可能性があるので、
-    # Pandasに適切な型を推論させます。
-    df_processed["_num_stack_product"] = df_processed["num"] * df_processed["stack"]
-
-    # グループ化に使用するカラムリストを定義
-    # object_nameもグループ化キーに含めます
-    group_cols = [
-        "id",
-        "owner",
-        "name",
-        "twitter_id",
-        "twitter_name",
-        "twitter_username",
-        "report_type",
-        "war_name",
-        "quest_type",
-        "quest_name",
-        "timestamp",
-        "runs",
-        "note",
-        "category",
-        "url",
-        "object_name",
-    ]
+    if executor is not None:
+        return executor.map
+    return map
 
-    # 指定されたカラムとobject_nameでグループ化し、_num_stack_productの合計を計算
-    # aggメソッドを使用して集計し、結果のカラム名を'num'とする
-    aggregated_df = (
-        df_processed.groupby(group_cols)
-        .agg(num=("_num_stack_product", "sum"))
-        .reset_index()
-    )  # グループ化キーをカラムに戻す
-
-    # 集計後のDataFrameにstackカラムを追加し、すべての値を1に設定
-    aggregated_df["stack"] = 1
-
-    # 元のDataFrameの順序に合わせてカラムを並べ替える
-    # 必要なカラムリストを定義
-    output_cols = [
-        "id",
-        "owner",
-        "name",
-        "twitter_id",
-        "twitter_name",
-        "twitter_username",
-        "report_type",
-        "war_name",
-        "quest_type",
-        "quest_name",
-        "timestamp",
-        "runs",
-        "note",
-        "object_name",
-        "num",
-        "stack",
-        "category",
-        "url",
-    ]
 
-    # 並べ替えたDataFrameを作成
-    # aggの結果のカラム順序は group_cols + ['num', 'stack'] のようになっているため、
-    # output_colsリストを使って明示的にカラムを選択し、順序を調整します。
-    result_df = aggregated_df[output_cols]
+def create_statics_blocks(
+    quests: List[Tuple[str, str]],
+    quest_groups: Dict[str, pd.DataFrame],
+    quest_items: Dict[str, np.ndarray],
+) -> List[Tuple[str, str, List[Tuple[str, list]]]]:
+    """あるカテゴリの統計シートに出力するクエストごとの行を作成する
 
-    return result_df
+    Args:
+        quests (List[Tuple[str, str]]): 出力する順のクエスト名と特異点名
+        quest_groups (Dict[str, pd.DataFrame]): クエスト名ごとの全入力データ
+        quest_items (Dict[str, np.ndarray]): クエスト名ごとのドロップするアイテム
+
+    Returns:
+        List[Tuple[str, str, List[Tuple[str, list]]]]: 特異点名・クエスト名・出力する行
+    """
+    return [
+        (
+            war_name,
+            quest_name,
+            create_output_rows(quest_groups[quest_name], quest_items[quest_name]),
+        )
+        for quest_name, war_name in quests
+    ]
 
 
-def create_statics(wb: Workbook, reports_df: pd.DataFrame, freequest_df: pd.DataFrame):
+def create_statics(
+    wb: Workbook,
+    prepared: PreparedReports,
+    freequest_df: pd.DataFrame,
+    executor: Optional[Executor] = None,
+):
     """統計シートを出力する
 
     Args:
         wb (Workbook): 出力するワークブック
-        reports_df (pd.DataFrame): 報告データ
+        prepared (PreparedReports): 検証した報告データの中間データ
         freequest_df (pd.DataFrame): フリークエストに関するデータ
+        executor (Optional[Executor], optional): シートごとの行の作成に使う executor、省略時は順に作成する
     """
-    new_report_df = aggregate_items_by_object(reports_df)
-    merged_df = prepare_data(new_report_df, freequest_df)
+    merged_df = prepare_data(create_statics_source(prepared), freequest_df)
 
     order = [
         "修練場",
@@ -216,139 +349,292 @@ def create_statics(wb: Workbook, reports_df: pd.DataFrame, freequest_df: pd.Data
         "奏章",
         "冠位戴冠戦",
     ]
-    # カテゴリごとに処理
+    # クエスト名ごとの報告データを一度のグループ化で分けておく
+    quest_groups = dict(tuple(merged_df.groupby("quest_name", sort=False)))
+    empty_group = merged_df.iloc[:0]
+
+    # クエストごとのドロップアイテムも先に求めておく
+    quest_items: Dict[str, np.ndarray] = {}
+    for quest_name, items in zip(
+        freequest_df["counter_name"], freequest_df[ITEM_COLUMNS].to_numpy()
+    ):
+        items = items[~pd.isnull(items)]
+        if quest_name in quest_items:
+            items = np.concatenate([quest_items[quest_name], items])
+        quest_items[quest_name] = items
+
+    # カテゴリごとにシートに出力する行を作成する(executor があればプロセスで並列に作成する)
+    quests_list = []
+    groups_list = []
+    items_list = []
     for category_name in order:
         group = freequest_df[freequest_df["category"] == category_name]
+        quests = list(zip(group["counter_name"], group["war_name"]))
+        quests_list.append(quests)
+        groups_list.append(
+            {
+                quest_name: quest_groups.get(quest_name, empty_group)
+                for quest_name, _ in quests
+            }
+        )
+        items_list.append(
+            {quest_name: quest_items[quest_name] for quest_name, _ in quests}
+        )
+    mapper = select_mapper(executor)
+    blocks_list = mapper(create_statics_blocks, quests_list, groups_list, items_list)
+
+    # シートへの書き込みは元の順番で行う
+    for category_name, blocks in zip(order, blocks_list):
         ws = wb.create_sheet(title=f"統計【{category_name}】")  # 新しいシートを作成
 
         # 前回のwar_nameを記憶する変数
         previous_war_name = ""
+        max_column = 1
+        for war_name, quest_name, output_rows in blocks:
+            previous_war_name, max_column = write_to_sheet(
+                ws, output_rows, war_name, quest_name, previous_war_name, max_column
+            )
+
+
+def sort_quest_item_stats(stats_df: pd.DataFrame) -> pd.DataFrame:
+    """クエスト・アイテムごとの集計を最終報告の新しい順に並べる
+       最終報告が同じ時刻の行は war_name, quest_name, object_name の順に並べる
+
+    Args:
+        stats_df (pd.DataFrame): クエスト・アイテムごとの集計
+
+    Returns:
+        pd.DataFrame: 並べ替えた集計
+    """
+    return stats_df.sort_values(
+        ["last_timestamp", "war_name", "quest_name", "object_name"],
+        ascending=[False, True, True, True],
+        ignore_index=True,
+    )
+
+
+def aggregate_quest_items(reports_df: pd.DataFrame) -> pd.DataFrame:
+    """クエスト・アイテムごとに周回数・ドロップ数・報告数・最終報告時刻を集計する
+       Errorカテゴリの行は集計しない
+
+    Args:
+        reports_df (pd.DataFrame): 報告データ
+
+    Returns:
+        pd.DataFrame: クエスト・アイテムごとの集計
+    """
+    df = reports_df[reports_df["category"] != "Error"]
+    # Int32 のまま合計するとあふれるので、合計する値は int64 にする
+    df = df.assign(
+        runs=df["runs"].astype("Int64"),
+        _drops=df["num"].astype("Int64") * df["stack"],
+        _timestamp=df["timestamp"].astype("int64") // 10**9,
+    )
+
+    # 同じ報告で複数の枠数(stack)がある場合も周回数は報告ごとに1回だけ数える
+    keys = ["war_name", "quest_name", "object_name"]
+    per_report_df = df.groupby(keys + ["id"], sort=False, observed=True).agg(
+        runs=("runs", "first"),
+        drops=("_drops", "sum"),
+        last_timestamp=("_timestamp", "max"),
+    )
+    # by にインデックスのレベル名を渡してもレベルでグループ化される
+    stats_df = (
+        per_report_df.groupby(keys, sort=False, observed=True)
+        .agg(
+            runs=("runs", "sum"),
+            drops=("drops", "sum"),
+            reports=("runs", "size"),
+            last_timestamp=("last_timestamp", "max"),
+        )
+        .reset_index()
+    )
+    return sort_quest_item_stats(to_plain_dtypes(stats_df))
+
+
+def fold_quest_item_stats(stats_list: List[pd.DataFrame]) -> pd.DataFrame:
+    """報告の重ならない部分ごとに aggregate_quest_items で集計した結果を合わせる
+       行は aggregate_quest_items と同じく sort_quest_item_stats の順に並べる
+
+    Args:
+        stats_list (List[pd.DataFrame]): 部分ごとのクエスト・アイテムごとの集計
+
+    Returns:
+        pd.DataFrame: すべての報告のクエスト・アイテムごとの集計
+    """
+    keys = ["war_name", "quest_name", "object_name"]
+    stats_df = (
+        pd.concat(stats_list, ignore_index=True)
+        .groupby(keys, sort=False)
+        .agg(
+            runs=("runs", "sum"),
+            drops=("drops", "sum"),
+            reports=("reports", "sum"),
+            last_timestamp=("last_timestamp", "max"),
+        )
+        .reset_index()
+    )
+    return sort_quest_item_stats(stats_df)
+
+
+def create_summary(
+    wb: Workbook, stats_df: pd.DataFrame, freequest_df: pd.DataFrame
+) -> None:
+    """クエスト・アイテムごとの集計シートを出力する
+
+    Args:
+        wb (Workbook): 出力するワークブック
+        stats_df (pd.DataFrame): クエスト・アイテムごとの集計
+        freequest_df (pd.DataFrame): フリークエストに関するデータ
+    """
+    ws = wb.create_sheet(title="集計")
+    ws.append(
+        [
+            "カテゴリ",
+            "特異点",
+            "クエスト",
+            "アイテム",
+            "周回数",
+            "ドロップ数",
+            "報告数",
+            "ドロップ率",
+            "最終報告",
+        ]
+    )
+    if stats_df.empty:
+        return
+
+    # 修練場のように報告とフリクエデータで war_name が異なるクエストがあるので、クエスト名で引く
+    quest_stats_df = stats_df.groupby(["quest_name", "object_name"], sort=False).agg(
+        runs=("runs", "sum"),
+        drops=("drops", "sum"),
+        reports=("reports", "sum"),
+        last_timestamp=("last_timestamp", "max"),
+    )
+    quest_stats = {
+        quest_name: group.droplevel("quest_name")
+        for quest_name, group in quest_stats_df.groupby(level="quest_name", sort=False)
+    }
+
+    order = [
+        "修練場",
+        "フリクエ1部",
+        "フリクエ1.5部",
+        "フリクエ2部",
+        "奏章",
+        "冠位戴冠戦",
+    ]
+    item_columns = freequest_df.filter(like="item").columns
+    for category_name in order:
+        group = freequest_df[freequest_df["category"] == category_name]
         for _, row in group.iterrows():
             quest_name = row["counter_name"]
-            war_name = row["war_name"]
-
-            group = merged_df[merged_df["quest_name"] == quest_name]
-
-            item_columns = freequest_df.loc[
-                freequest_df["quest_name"] == quest_name,
-                [
-                    "item1",
-                    "item2",
-                    "item3",
-                    "item4",
-                    "item5",
-                    "item6",
-                    "item7",
-                    "item8",
-                    "item9",
-                    "item10",
-                    "item11",
-                    "item12",
-                    "item13",
-                    "item14",
-                    "item15",
-                    "item16",
-                    "item17",
-                    "item18",
-                    "item19",
-                    "item20",
-                    "item21",
-                    "item22",
-                    "item23",
-                    "item24",
-                    "item25",
-                    "item26",
-                    "item27",
-                    "item28",
-                    "item29",
-                    "item30",
-                    "item31",
-                    "item32",
-                    "item33",
-                    "item34",
-                ],
-            ].values.ravel()
-            item_columns = item_columns[~pd.isnull(item_columns)]
-            output_df = create_output_df(group, item_columns)
-            previous_war_name = write_to_sheet(
-                ws, output_df, war_name, quest_name, previous_war_name
-            )
+            if quest_name not in quest_stats:
+                continue
+            items_df = quest_stats[quest_name]
+            # フリクエデータのアイテム順に並べ、それ以外のアイテムは後ろに名前順で並べる
+            items = [
+                item for item in row[item_columns].dropna() if item in items_df.index
+            ]
+            items += sorted(set(items_df.index) - set(items))
+            for object_name, item in items_df.loc[items].iterrows():
+                ws.append(
+                    [
+                        category_name,
+                        row["war_name"],
+                        quest_name,
+                        object_name,
+                        item["runs"],
+                        item["drops"],
+                        item["reports"],
+                        item["drops"] / item["runs"] if item["runs"] else None,
+                        pd.Timestamp(item["last_timestamp"], unit="s").to_pydatetime(),
+                    ]
+                )
+
+
+def to_object_values(df: pd.DataFrame) -> np.ndarray:
+    """欠損を None にした object 型の配列に変換する
 
+    Args:
+        df (pd.DataFrame): 変換するデータ
 
-def append_rows_to_sheet(ws: Worksheet, df: pd.DataFrame) -> None:
-    """Worksheetに各行を追加する
+    Returns:
+        np.ndarray: 変換した配列
+    """
+    # pandas-stubs の na_value は None を受け付けないが、pandas は None を受け付ける
+    return df.to_numpy(dtype=object, na_value=cast(Any, None))
+
+
+def create_list_rows(prepared: PreparedReports) -> List[list]:
+    """報告シートに出力する行を作成する
 
     Args:
-        ws (Worksheet): 出力するワークブックシート
-        df (pd.DataFrame): 使用するデータフレーム
+        prepared (PreparedReports): 出力する報告の中間データ
+
+    Returns:
+        List[list]: ヘッダーと報告ごとの行
     """
     # ヘッダーを追加
-    headers = [
-        "id",
-        "timestamp",
-        "owner",
-        "name",
-        "twitter_id",
-        "twitter_name",
-        "twitter_username",
-        "note",
-        "url",
-        "war_name",
-        "quest_name",
-        "runs",
-    ]
-    ws.append(headers)
+    rows = [LIST_HEADERS]
+
+    drops_df = prepared.drops_df
+    if drops_df.empty:
+        return rows
+
+    # 枠数が1未満のドロップは出力しない
+    keep = (drops_df["stack"] >= 1).to_numpy(dtype=bool, na_value=False)
+    drop_values = to_object_values(drops_df[["label", "num"]])
+
+    # 報告ごとの行の位置を一度のグループ化で求める、ヘッダー部分は報告の最初の行の値を使う
+    positions = cast(Dict[int, np.ndarray], drops_df.groupby("id").indices)
+    report_ids = sorted(positions)
+    header_values = to_object_values(
+        prepared.header_df.loc[report_ids, LIST_HEADERS[1:]]
+    )
 
-    if df.empty:
-        return
-    id_group_df = df.groupby("id").agg(list)
     # タイムスタンプで降順再ソート
-    id_group_df = id_group_df.sort_values(by="timestamp", ascending=False)
-
-    for idx, row in id_group_df.iterrows():
-        new_row = []
-        for object_name, num, stack in zip(
-            row["object_name"], row["num"], row["stack"]
-        ):
-            if stack == 1:
-                new_row.extend([object_name, num])
-            elif stack > 1:
-                if (
-                    object_name == "QP"
-                    or object_name.endswith("ポイント")
-                    or object_name.endswith("P")
-                ):
-                    new_row.extend([f"{object_name}(+{stack})", num])
-                else:
-                    new_row.extend([f"{object_name}(x{stack})", num])
-
-        for col in reversed(
-            [
-                "timestamp",
-                "owner",
-                "name",
-                "twitter_id",
-                "twitter_name",
-                "twitter_username",
-                "note",
-                "url",
-                "war_name",
-                "quest_name",
-                "runs",
-            ]
-        ):
-            new_row.insert(0, row[col][0])
+    # 従来の報告ごとのリストの比較と同じ順になるよう (タイムスタンプ, 行数) で並べる
+    sort_keys = pd.Series(
+        [
+            (timestamp, len(positions[report_id]))
+            for report_id, timestamp in zip(report_ids, header_values[:, 0])
+        ],
+        index=range(len(report_ids)),
+    )
+    for i in sort_keys.sort_values(ascending=False).index:
+        position = positions[report_ids[i]]
+        rows.append(
+            [report_ids[i]]
+            + header_values[i].tolist()
+            + drop_values[position[keep[position]]].ravel().tolist()
+        )
+
+    return rows
+
 
-        new_row.insert(0, idx)
-        ws.append(new_row)
+def append_rows_to_sheet(
+    ws: Union[Worksheet, WriteOnlyWorksheet], prepared: PreparedReports
+) -> None:
+    """Worksheetに各行を追加する
 
+    Args:
+        ws (Union[Worksheet, WriteOnlyWorksheet]): 出力するワークブックシート
+        prepared (PreparedReports): 出力する報告の中間データ
+    """
+    for row in create_list_rows(prepared):
+        ws.append(row)
 
-def create_list(wb: Workbook, reports_df: pd.DataFrame) -> None:
+
+def create_list(
+    wb: Workbook, prepared: PreparedReports, executor: Optional[Executor] = None
+) -> None:
     """各カテゴリの報告シートを出力する
 
     Args:
         wb (Workbook): 出力するワークブック
-        reports_df (pd.DataFrame): 報告データ
+        prepared (PreparedReports): 検証した報告データの中間データ
+        executor (Optional[Executor], optional): シートごとの行の作成に使う executor、省略時は順に作成する
     """
     order = [
         "修練場",
@@ -361,18 +647,16 @@ def create_list(wb: Workbook, reports_df: pd.DataFrame) -> None:
         "Error",
     ]
 
-    # データフレームを 'category' でグループ化
-    grouped_reports = reports_df.groupby("category")
-
-    # 指定された順序に従って新しいシートを作成
-    for category in order:
-        if category in grouped_reports.groups:
-            category_group_df = grouped_reports.get_group(category)
-        else:
-            category_group_df = (
-                pd.DataFrame()
-            )  # データが存在しない場合、空のデータフレームを作成
+    # カテゴリごとのドロップを取り出す、データが存在しない場合は空になる
+    categories = prepared.drops_df["category"]
+    category_reports = [
+        select_reports(prepared, (categories == category).to_numpy())
+        for category in order
+    ]
 
+    # 各シートの行を作成し(executor があればプロセスで並列に作成する)、指定された順序でシートを作成
+    mapper = select_mapper(executor)
+    for category, rows in zip(order, mapper(create_list_rows, category_reports)):
         ws = wb.create_sheet(title=category)
-
-        append_rows_to_sheet(ws, category_group_df)
+        for row in rows:
+            ws.append(row)
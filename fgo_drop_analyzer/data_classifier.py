@@ -1,31 +1,34 @@
 import pandas as pd
 
+from .schema import set_values
+
+# 報告の war_name に北米のスポット名が入っているもの
+NORTH_AMERICA_SPOTS = [
+    "ブラックヒルズ",
+    "リバートン",
+    "デンバー",
+    "デミング",
+    "ダラス",
+    "アルカトラズ",
+    "デモイン",
+    "モントゴメリー",
+    "ラボック",
+    "アレクサンドリア",
+    "カーニー",
+    "シャーロット",
+    "ワシントン",
+    "シカゴ",
+]
 
-def modify_war_and_quest_columns(df: pd.DataFrame) -> pd.DataFrame:
-    spot_list = [
-        "ブラックヒルズ",
-        "リバートン",
-        "デンバー",
-        "デミング",
-        "ダラス",
-        "アルカトラズ",
-        "デモイン",
-        "モントゴメリー",
-        "ラボック",
-        "アレクサンドリア",
-        "カーニー",
-        "シャーロット",
-        "ワシントン",
-        "シカゴ",
-    ]
 
-    # 'war_name' columnがspot_listに含まれている行を特定
-    mask = df["war_name"].isin(spot_list)
+def modify_war_and_quest_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # 'war_name' columnがNORTH_AMERICA_SPOTSに含まれている行を特定
+    mask = df["war_name"].isin(NORTH_AMERICA_SPOTS)
 
     # 'quest_name' columnに元の'war_name'の値を代入
-    df.loc[mask, "quest_name"] = df.loc[mask, "war_name"]
+    set_values(df, mask, "quest_name", df.loc[mask, "war_name"])
 
     # 'war_name' columnの値を'北米'に変更
-    df.loc[mask, "war_name"] = "北米"
+    set_values(df, mask, "war_name", "北米")
 
     return df
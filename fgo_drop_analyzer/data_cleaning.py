@@ -1,87 +1,149 @@
 import csv
+import functools
 import re
 import unicodedata
 from pathlib import Path
 from typing import Callable
 from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
 
 import jaconv  # type: ignore
+import numpy as np
 import pandas as pd
 
+from .schema import is_categorical
+from .schema import map_values
+from .schema import set_values
+
 base_dir = Path(__file__).resolve().parents[1]
+ITEM_CSV_PATH = base_dir / "data" / "item.csv"
 regex_patterns = [
     r"(剣|弓|槍|騎|術|殺|狂)(輝|魔)",
     r"(剣|弓|槍|騎|術|殺|狂)(灯火|大火|猛火|業火)",
     r"(剣|弓|槍|騎|術|殺|狂)(モ|ピ)",
 ]
+# アイテムの別名が正規表現かどうかの判定に使う記号
+REGEX_METACHARACTERS = set(".^$*+?{}[]|()\\")
+# フリクエを識別するカラム
+QUEST_KEYS = ["war_name", "quest_name"]
+drop_up_pattern = re.compile(r"泥UP\s*([0-9]+)\s*%")
+training_ground_pattern = re.compile(r"(剣|弓|槍|騎|術|殺|狂)の修練場 (初|中|上|超|極)級")
+
+
+def read_rarity_dict(file_path: Path = ITEM_CSV_PATH) -> Dict[str, str]:
+    """item.csv からアイテム名とレアリティの対応を読み込む
+
+    Args:
+        file_path (Path, optional): item.csv のパス
+
+    Returns:
+        Dict[str, str]: アイテム名に対するレアリティ(金・銀・銅)
+    """
+    with open(file_path, mode="r", encoding="utf-8-sig") as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)  # ヘッダー行をスキップ
+        item_dict = {}
+        for row in reader:
+            rarity, name, _, _ = row
+            item_dict[name] = rarity
+    return item_dict
+
 
+@functools.lru_cache(maxsize=None)
+def get_rarity_dict() -> Dict[str, str]:
+    """data/item.csv によるレアリティの対応、初めて使うときに読み込む
+
+    Returns:
+        Dict[str, str]: アイテム名に対するレアリティ(金・銀・銅)
+    """
+    return read_rarity_dict()
 
-def validate_drop_rates(reports_df: pd.DataFrame) -> pd.DataFrame:
+
+def validate_drop_rates(
+    reports_df: pd.DataFrame, rarity_dict: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
     """報告データのドロップ率がおかしくないか検証する
        おかしい場合は、Errorカテゴリに分類しエラー情報を付与する
 
     Args:
         reports_df (pd.DataFrame): 入力データ
+        rarity_dict (Optional[Dict[str, str]], optional): アイテム名に対するレアリティ、省略時は data/item.csv から読み込む
 
     Returns:
         pd.DataFrame: 検証したデータ
     """
+    if rarity_dict is None:
+        rarity_dict = get_rarity_dict()
+    object_names = reports_df["object_name"]
+
+    # スキル石・種火・ピース・モニュメントは対象外、判定はユニークなアイテム名に対して一度だけ行う
+    unique_names = pd.Series(object_names.unique(), dtype=object)
+    excluded_names = unique_names[
+        unique_names.str.match("|".join(f"(?:{p})" for p in regex_patterns))
+        .fillna(False)
+        .astype(bool)
+    ]
+    rarity = object_names.map(rarity_dict).where(~object_names.isin(excluded_names))
+
+    target = (~reports_df["category"].isin(["修練場", "冠位戴冠戦", "その他クエスト"])).to_numpy()
+    # war_name を持たない入力ではオーディール・コールの判定を省略する
+    if "war_name" in reports_df.columns:
+        target &= (reports_df["war_name"] != "オーディール・コール").to_numpy()
+
+    num = reports_df["num"].to_numpy(dtype="float64", na_value=np.nan)
+    runs = reports_df["runs"].to_numpy(dtype="float64", na_value=np.nan)
+    over_100_runs = runs >= 100
+    gold = (rarity == "金").to_numpy() & (
+        (num > runs) | (over_100_runs & (num > runs * 0.5))
+    )
+    silver = (rarity == "銀").to_numpy() & (
+        (num > runs * 2) | (over_100_runs & (num > runs * 0.7))
+    )
+    bronze = (rarity == "銅").to_numpy() & (
+        (num > runs * 3) | (over_100_runs & (num > runs * 0.9))
+    )
+    error = target & (gold | silver | bronze)
 
-    def read_item_csv(file_path):
-        with open(file_path, mode="r", encoding="utf-8-sig") as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # ヘッダー行をスキップ
-            item_dict = {}
-            for row in reader:
-                rarity, name, _, _ = row
-                item_dict[name] = rarity
-        return item_dict
-
-    # CSVファイルからデータを読み込む
-    rarity_dict = read_item_csv(base_dir / "data" / "item.csv")
-
-    # 'object_name'が辞書のキーに一致する行に対して前処理を適用
-    for idx, row in reports_df.iterrows():
-        if any(re.match(pattern, row["object_name"]) for pattern in regex_patterns):
-            continue
-
-        if row["object_name"] in rarity_dict:
-            rarity = rarity_dict[row["object_name"]]
-            if (
-                row["category"] not in ["修練場", "冠位戴冠戦", "その他クエスト"]
-                and row["war_name"] != "オーディール・コール"
-            ):
-                if (
-                    (
-                        rarity == "金"
-                        and (
-                            row["num"] > row["runs"]
-                            or (row["runs"] >= 100 and row["num"] > row["runs"] * 0.5)
-                        )
-                    )
-                    or (
-                        rarity == "銀"
-                        and (
-                            row["num"] > row["runs"] * 2
-                            or (row["runs"] >= 100 and row["num"] > row["runs"] * 0.7)
-                        )
-                    )
-                    or (
-                        rarity == "銅"
-                        and (
-                            row["num"] > row["runs"] * 3
-                            or (row["runs"] >= 100 and row["num"] > row["runs"] * 0.9)
-                        )
-                    )
-                ):
-                    reports_df.at[idx, "category"] = "Error"
-                    reports_df.at[idx, "object_name"] = "[E: 泥率]" + row["object_name"]
+    set_values(reports_df, error, "category", "Error")
+    set_values(
+        reports_df, error, "object_name", "[E: 泥率]" + object_names[error].astype(object)
+    )
 
     return reports_df
 
 
+def build_quest_items(
+    freequest_df: pd.DataFrame, quest_keys: List[str]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """クエストごとのドロップするアイテムの表と、フリクエの一覧を作成する
+
+    Args:
+        freequest_df (pd.DataFrame): フリクエ情報
+        quest_keys (List[str]): クエストを識別するカラム
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: (クエスト, ドロップするアイテム) の表とクエストの一覧
+    """
+    item_columns = freequest_df.filter(like="item").columns.tolist()
+    quest_items_df = (
+        freequest_df.melt(
+            id_vars=quest_keys, value_vars=item_columns, value_name="object_name"
+        )
+        .dropna(subset=["object_name"])
+        .drop_duplicates(subset=quest_keys + ["object_name"])
+        .assign(_dropped=True)[quest_keys + ["object_name", "_dropped"]]
+    )
+    known_quests_df = freequest_df[quest_keys].drop_duplicates().assign(_known=True)
+    return quest_items_df, known_quests_df
+
+
 def check_nonexistent_items(
-    reports_df: pd.DataFrame, freequest_df: pd.DataFrame
+    reports_df: pd.DataFrame,
+    freequest_df: pd.DataFrame,
+    quest_items: Optional[Tuple[pd.DataFrame, pd.DataFrame]] = None,
 ) -> pd.DataFrame:
     """通常フリクエで本来ドロップしないアイテムが報告されていないかチェックする
        そういうアイテムがあったら"Error"カテゴリに分類しエラー情報を付与する
@@ -89,6 +151,7 @@ def check_nonexistent_items(
     Args:
         reports_df (pd.DataFrame): 報告データ
         freequest_df (pd.DataFrame): フリクエ情報
+        quest_items (Optional[Tuple[pd.DataFrame, pd.DataFrame]], optional): war_name と quest_name で作成済みの build_quest_items の結果
 
     Returns:
         pd.DataFrame: チェックしたデータ
@@ -96,42 +159,67 @@ def check_nonexistent_items(
     # 以下のカテゴリを対象とします
     target_categories = ["修練場", "フリクエ1部", "フリクエ1.5部", "フリクエ2部"]
 
-    # 対象のcategoryの行のみを取り出します
-    target_reports_df = reports_df[reports_df["category"].isin(target_categories)]
-
-    # war_nameとquest_nameを結合してuniqueなquest identifierを作成
-    freequest_df["unique_quest_name"] = (
-        freequest_df["war_name"] + ":" + freequest_df["quest_name"]
+    # war_nameとquest_nameの組でクエストを識別する(war_nameが無いデータではquest_nameのみ)
+    quest_keys = [
+        col
+        for col in QUEST_KEYS
+        if col in reports_df.columns and col in freequest_df.columns
+    ]
+
+    # (クエスト, ドロップするアイテム) の表を作成
+    if quest_items is None or quest_keys != QUEST_KEYS:
+        quest_items = build_quest_items(freequest_df, quest_keys)
+    quest_items_df, known_quests_df = quest_items
+
+    # 対象のcategoryの行のみを取り出します、QPと星1-3種火は除外
+    object_names = reports_df["object_name"]
+    target = reports_df["category"].isin(target_categories) & ~(
+        (object_names == "QP") | object_names.str.endswith(("大火", "灯火", "種火"), na=False)
     )
-
-    # unique_quest_nameをインデックスとして設定し、アイテムに関するカラムのみを抽出して辞書に変換
-    quest_items_dict = (
-        freequest_df.set_index("unique_quest_name").filter(like="item").to_dict("index")
+    target_reports_df = reports_df.loc[target, quest_keys + ["object_name"]]
+
+    # quest_nameがfreequest_dfに存在し、かつ、object_nameがそのクエストのアイテムリストにない行
+    # 左外部結合は左側の行順を保つので、結果は target_reports_df の行と対応する
+    checked_df = target_reports_df.merge(
+        known_quests_df, on=quest_keys, how="left"
+    ).merge(quest_items_df, on=quest_keys + ["object_name"], how="left")
+    nonexistent = (
+        checked_df["_known"].notna() & checked_df["_dropped"].isna()
+    ).to_numpy()
+    error_index = target_reports_df.index[nonexistent]
+
+    # object_nameを "[E: 非存在]" + object_nameに変更します
+    set_values(
+        reports_df,
+        error_index,
+        "object_name",
+        "[E: 非存在]" + object_names[error_index].astype(object),
     )
 
-    # 対象の行を順に処理します
-    for idx, row in target_reports_df.iterrows():
-        unique_quest_name = row["war_name"] + ":" + row["quest_name"]
-        object_name = row["object_name"]
+    # 同じ"id"カラムを持つすべての行のcategoryを"Error"に変更します
+    error_ids = set(reports_df.loc[error_index, "id"])
+    set_values(reports_df, reports_df["id"].isin(error_ids), "category", "Error")
 
-        # QPと星1-3種火は除外
-        if object_name == "QP" or any(
-            object_name.endswith(s) for s in ["大火", "灯火", "種火"]
-        ):
-            continue
+    return reports_df
 
-        # quest_nameがfreequest_dfに存在し、かつ、object_nameがそのクエストのアイテムリストにない場合
-        if (
-            unique_quest_name in quest_items_dict
-            and object_name not in quest_items_dict[unique_quest_name].values()
-        ):
-            # object_nameを "[E: 非存在]" + object_nameに変更します
-            reports_df.loc[idx, "object_name"] = "[E: 非存在]" + object_name  # type: ignore
 
-            # 同じ"id"カラムを持つすべての行のcategoryを"Error"に変更します
-            reports_df.loc[reports_df["id"] == row["id"], "category"] = "Error"
+def find_drop_up_mentions(note: str) -> List[Tuple[str, bool]]:
+    """備考から「<アイテム名>泥UP <n>%」の記述を順に取り出す
 
-    return reports_df
+    Args:
+        note (str): 備考
+
+    Returns:
+        List[Tuple[str, bool]]: 記述より前の文字列と、倍率が0以外かどうかの組
+    """
+    if not isinstance(note, str) or not note:
+        return []
+    # 全角文字を半角文字に変換
+    note = jaconv.z2h(note, kana=False, digit=True, ascii=True)
+    return [
+        (note[: match.start()], match.group(1) != "0")
+        for match in drop_up_pattern.finditer(note)
+    ]
 
 
 def remove_drop_up(df: pd.DataFrame) -> pd.DataFrame:
@@ -143,26 +231,65 @@ def remove_drop_up(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: 除外が完了したデータ
     """
-
-    # row["note"]の全角文字を半角文字に変換
-    # note列にパターンが含まれるかどうかをチェックする関数
-    def check_pattern(row):
-        note = jaconv.z2h(row["note"], kana=False, digit=True, ascii=True)
-        object_name = re.escape(row["object_name"])
-        pattern = re.compile(rf"{object_name}泥UP\s*([0-9]+)\s*%")
-        match = pattern.search(note)
-        if match:
-            number = re.sub(r"\s", "", match.group(1))
-            if number != "0" and number != "":
-                return True
+    # 備考は報告単位なので、半角変換と記述の抽出はユニークな備考ごとに一度だけ行う
+    notes = df["note"].unique()
+    mentions = dict(zip(notes, map(find_drop_up_mentions, notes)))
+
+    def is_drop_up(note: str, object_name: str) -> bool:
+        # アイテム名の直後に「泥UP」が続く最初の記述の倍率で判定する
+        for prefix, nonzero in mentions[note]:
+            if prefix.endswith(object_name):
+                return nonzero
         return False
 
-    # パターンに一致するかどうかの新しい列を作成
-    df["remove"] = df.apply(check_pattern, axis=1)
+    # 泥UPの記述がある備考についてのみ、(備考, アイテム名) の組を判定する
+    candidates = df.loc[
+        df["note"].isin([note for note in notes if mentions[note]]),
+        ["note", "object_name"],
+    ].drop_duplicates()
+    drop_up_pairs = [
+        (note, object_name)
+        for note, object_name in zip(candidates["note"], candidates["object_name"])
+        if is_drop_up(note, object_name)
+    ]
 
     # 条件に一致する行を削除
-    df = df[~df["remove"]].drop(columns=["remove"])
-    return df
+    remove = pd.MultiIndex.from_frame(df[["note", "object_name"]]).isin(drop_up_pairs)
+    # 呼び出し側でカラムを書き換えられるよう、元のデータのスライスではなくコピーを返す
+    return df[~remove].copy()
+
+
+# make_sort_name で置き換える文字列
+sort_name_replacements = {
+    # ピース
+    "セイバーピース": "剣ピ",
+    "アーチャーピース": "弓ピ",
+    "ランサーピース": "槍ピ",
+    "ライダーピース": "騎ピ",
+    "アサシンピース": "殺ピ",
+    "バーサーカーピース": "狂ピ",
+    # モニュメント
+    "セイバーモニュメント": "剣モ",
+    "アーチャーモニュメント": "弓モ",
+    "ランサーモニュメント": "槍モ",
+    "ライダーモニュメント": "騎モ",
+    "アサシンモニュメント": "殺モ",
+    "バーサーカーモニュメント": "狂モ",
+}
+sort_name_pattern = re.compile(
+    # スキル石・種火
+    r"(?P<class>剣|弓|槍|騎|術|殺|狂)の"
+    r"(?:(?P<stone>輝|魔|秘)石|叡智の(?P<ember>灯火|大火|猛火|業火))"
+    # ピース・モニュメント
+    r"|(?P<literal>" + "|".join(sort_name_replacements) + ")"
+)
+
+
+def _replace_sort_name(match: re.Match) -> str:
+    literal = match.group("literal")
+    if literal is not None:
+        return sort_name_replacements[literal]
+    return match.group("class") + (match.group("stone") or match.group("ember"))
 
 
 def make_sort_name(s: str) -> str:
@@ -175,38 +302,31 @@ def make_sort_name(s: str) -> str:
     Returns:
         str: 正規化されたアイテム名
     """
-    replacements = {
-        # スキル石
-        r"(剣|弓|槍|騎|術|殺|狂)の(輝|魔|秘)石": r"\1\2",
-        # 種火
-        r"(剣|弓|槍|騎|術|殺|狂)の叡智の(灯火|大火|猛火|業火)": r"\1\2",
-        # ピース
-        r"セイバーピース": r"剣ピ",
-        r"アーチャーピース": r"弓ピ",
-        r"ランサーピース": r"槍ピ",
-        r"ライダーピース": r"騎ピ",
-        r"アサシンピース": r"殺ピ",
-        r"バーサーカーピース": r"狂ピ",
-        # モニュメント
-        r"セイバーモニュメント": r"剣モ",
-        r"アーチャーモニュメント": r"弓モ",
-        r"ランサーモニュメント": r"槍モ",
-        r"ライダーモニュメント": r"騎モ",
-        r"アサシンモニュメント": r"殺モ",
-        r"バーサーカーモニュメント": r"狂モ",
-    }
+    return sort_name_pattern.sub(_replace_sort_name, s)
 
-    for pattern, replacement in replacements.items():
-        s = re.sub(pattern, replacement, s)
 
-    return s
+class AliasIndex(NamedTuple):
+    """item.csv の別名から作成したアイテム名の索引
 
+    Attributes:
+        literal_aliases (Dict[str, str]): 正規表現の記号を含まない別名に対する正規化後の名前
+        pattern (Optional[re.Pattern]): 残りの別名を名前付きグループの選択としてまとめた正規表現
+        pattern_values (Dict[str, str]): pattern のグループ名に対する正規化後の名前
+    """
 
-def create_item_normalizer() -> Callable[[str], str]:
-    """CSVファイルで指定されたアイテム名を正規化する
+    literal_aliases: Dict[str, str]
+    pattern: Optional[re.Pattern]
+    pattern_values: Dict[str, str]
+
+
+def build_alias_index(file_path: Path = ITEM_CSV_PATH) -> AliasIndex:
+    """CSVファイルで指定されたアイテムの別名の索引を作成する
+
+    Args:
+        file_path (Path, optional): item.csv のパス
 
     Returns:
-        Callable[[str], str]: 正規化関数
+        AliasIndex: 別名の索引
     """
 
     def read_item_csv(file_path: Path) -> Dict[str, str]:
@@ -222,65 +342,157 @@ def create_item_normalizer() -> Callable[[str], str]:
         return item_dict
 
     # CSVファイルからデータを読み込む
-    item_dict = read_item_csv(base_dir / "data" / "item.csv")
-
-    def normalize_item_name(item_name: str) -> str:
-        # item_name に含まれる半角カナを全角カナに変換
-        item_name = unicodedata.normalize("NFKC", item_name)
+    item_dict = read_item_csv(file_path)
 
+    def match_alias(item_name: str) -> str:
+        # 別名を上から順に正規表現として試し、最初に一致したものを採用する
         for key, value in item_dict.items():
-            if re.fullmatch(key, item_name):  # 正規表現でマッチするか確認
+            if re.fullmatch(key, item_name):
                 return value
         return item_name
 
-    return normalize_item_name
+    # 正規表現の記号を含まない別名は完全一致の辞書で引く
+    # 値はその別名自身に対する照合結果なので、先に並ぶ正規表現の別名との優先順位も保たれる
+    literal_aliases = {
+        key: match_alias(key)
+        for key in item_dict
+        if not any(c in key for c in REGEX_METACHARACTERS)
+    }
 
+    # 残りの別名は名前付きグループの選択としてひとつの正規表現にまとめる
+    # fullmatch は選択肢を先頭から試すので、元の順番どおりに最初の一致が選ばれる
+    pattern_values = {}
+    alternatives: List[str] = []
+    for key, value in item_dict.items():
+        if key not in literal_aliases:
+            group_name = f"alias{len(alternatives)}"
+            pattern_values[group_name] = value
+            alternatives.append(f"(?P<{group_name}>{key})")
+    combined_pattern = re.compile("|".join(alternatives)) if alternatives else None
+    return AliasIndex(literal_aliases, combined_pattern, pattern_values)
 
-# ノーマライザ関数を作成
-normalize_item_name = create_item_normalizer()
 
+def create_alias_normalizer(aliases: AliasIndex) -> Callable[[str], str]:
+    """別名の索引からアイテム名を正規化する関数を作成する
 
-def normalize_item_and_name(item_name: str) -> str:
-    """_summary_
+    Args:
+        aliases (AliasIndex): 別名の索引
+
+    Returns:
+        Callable[[str], str]: 正規化関数
+    """
+    literal_aliases, combined_pattern, pattern_values = aliases
+
+    @functools.lru_cache(maxsize=4096)
+    def lookup(item_name: str) -> str:
+        if item_name in literal_aliases:
+            return literal_aliases[item_name]
+        if combined_pattern is not None:
+            match = combined_pattern.fullmatch(item_name)
+            if match:
+                return pattern_values[match.lastgroup]  # type: ignore
+        return item_name
+
+    def normalize_item_name(item_name: str) -> str:
+        # item_name に含まれる半角カナを全角カナに変換
+        return lookup(unicodedata.normalize("NFKC", item_name))
+
+    return normalize_item_name
+
+
+def create_item_normalizer(file_path: Path = ITEM_CSV_PATH) -> Callable[[str], str]:
+    """CSVファイルで指定されたアイテム名を正規化する
 
     Args:
-        item_name (str): アイテム名
+        file_path (Path, optional): item.csv のパス
 
     Returns:
-        str: 正規化されたアイテム名
+        Callable[[str], str]: 正規化関数
+    """
+    return create_alias_normalizer(build_alias_index(file_path))
+
+
+@functools.lru_cache(maxsize=None)
+def get_item_normalizer() -> Callable[[str], str]:
+    """data/item.csv による正規化関数、初めて使うときに作成する
+
+    Returns:
+        Callable[[str], str]: 正規化関数
     """
-    return make_sort_name(normalize_item_name(item_name))
+    return create_item_normalizer()
 
 
-def normalize_item(df: pd.DataFrame, freequest_df: pd.DataFrame) -> pd.DataFrame:
+def normalize_item(
+    df: pd.DataFrame,
+    freequest_df: pd.DataFrame,
+    normalize_item_name: Optional[Callable[[str], str]] = None,
+) -> pd.DataFrame:
     """一連の正規化を動かす
 
     Args:
         df (pd.DataFrame): 入力データ
         freequest_df (pd.DataFrame): フリクエデータ
+        normalize_item_name (Optional[Callable[[str], str]], optional): 別名の正規化関数、省略時は data/item.csv のもの
 
     Returns:
         pd.DataFrame: 正規化されたデータ
     """
     df = remove_drop_up(df)
-    df["object_name"] = df["object_name"].apply(normalize_item_and_name)
-
-    # "num" 列が -1 の行を削除する
-    df = df[df["num"] != -1]
+    # アイテム名の種類は行数よりはるかに少ないので、ユニークな値だけ正規化する
+    normalize_name = (
+        normalize_item_name
+        if normalize_item_name is not None
+        else get_item_normalizer()
+    )
+    df["object_name"] = map_values(
+        df["object_name"], lambda name: make_sort_name(normalize_name(name))
+    )
 
-    # "id" 列の値の先頭に URL を追加する
-    df["url"] = "https://fgodrop.max747.org/reports/" + df["id"]
+    # "num" 列が -1 の行を削除する(num が欠損している行は残す)
+    df = df[(df["num"] != -1).fillna(True)]
 
     # timestampを日付に変換
     df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
 
     # タイムスタンプで降順ソート
-    df = df.sort_values(by="timestamp", ascending=False)
+    # 同じ時刻の行は元の順のままにして、分割して処理しても同じ順になるようにする
+    df = df.sort_values(by="timestamp", ascending=False, kind="stable")
 
     return df
 
 
-def normalize_quest(df: pd.DataFrame, freequest_df: pd.DataFrame) -> pd.DataFrame:
+def build_quest_index(
+    freequest_df: pd.DataFrame,
+) -> Dict[Tuple[str, str], Tuple[str, str]]:
+    """(war_name, クエスト名) と (war_name, spot) をキーにしたフリクエの索引を作成する
+       キーが重複する場合は freequest_df の行順で先に現れたものを優先する
+
+    Args:
+        freequest_df (pd.DataFrame): フリクエデータ
+
+    Returns:
+        Dict[Tuple[str, str], Tuple[str, str]]: キーに対する (counter_name, category)
+    """
+    quest_index: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for war_name, spot, quest_name, counter_name, category in zip(
+        freequest_df["war_name"],
+        freequest_df["spot"],
+        freequest_df["quest_name"],
+        freequest_df["counter_name"],
+        freequest_df["category"],
+    ):
+        # 各行で quest_name、spot の順に比較していたので、その優先順位を保つ
+        for name in (quest_name, spot):
+            if isinstance(name, str):
+                quest_index.setdefault((war_name, name), (counter_name, category))
+    return quest_index
+
+
+def normalize_quest(
+    df: pd.DataFrame,
+    freequest_df: pd.DataFrame,
+    quest_index: Optional[Dict[Tuple[str, str], Tuple[str, str]]] = None,
+) -> pd.DataFrame:
     """指定された条件に基づいてdfのquest_name、categoryを更新し、
     特定のパターンに一致するquest_nameに対してcategoryを'修練場'に設定し、
     最終的にcategoryが決まらない場合は'その他クエスト'と設定する。
@@ -288,37 +500,40 @@ def normalize_quest(df: pd.DataFrame, freequest_df: pd.DataFrame) -> pd.DataFram
     Args:
         df (pd.DataFrame): 入力データ
         freequest_df (pd.DataFrame): フリクエデータ
+        quest_index (Optional[Dict[Tuple[str, str], Tuple[str, str]]], optional): 作成済みの build_quest_index の結果
 
     Returns:
         pd.DataFrame: 更新されたデータフレーム
     """
-    # 正規表現パターンの定義
-    pattern = re.compile(r"(剣|弓|槍|騎|術|殺|狂)の修練場 (初|中|上|超|極)級")
-
-    # dfをループして行ごとに処理
-    for index, row in df.iterrows():
-        # categoryが最終的に決まらなかった場合のデフォルト値を設定
-        df.at[index, "category"] = "その他クエスト"
-
-        # quest_nameが正規表現に一致する場合、categoryを'修練場'に設定し、ループから抜ける
-        if pattern.match(row["quest_name"]):
-            df.at[index, "category"] = "修練場"
-            continue  # 一致したらループを抜ける
-
-        # freequest_dfの対応する行を探す
-        matching_rows = freequest_df[freequest_df["war_name"] == row["war_name"]]
-
-        for _, freequest_row in matching_rows.iterrows():
-            # quest_nameが一致する場合
-            if row["quest_name"] == freequest_row["quest_name"]:
-                df.at[index, "quest_name"] = freequest_row["counter_name"]
-                df.at[index, "category"] = freequest_row["category"]
-                break  # 一致したらループを抜ける
-
-            # quest_nameが一致しないが、spotが一致する場合
-            elif row["quest_name"] == freequest_row["spot"]:
-                df.at[index, "quest_name"] = freequest_row["counter_name"]
-                df.at[index, "category"] = freequest_row["category"]
-                break  # 一致したらループを抜ける
+    index = quest_index if quest_index is not None else build_quest_index(freequest_df)
+
+    def resolve(war_name: str, quest_name: str) -> Tuple[str, str]:
+        # quest_nameが正規表現に一致する場合、categoryを'修練場'に設定
+        if isinstance(quest_name, str) and training_ground_pattern.match(quest_name):
+            return quest_name, "修練場"
+        # categoryが最終的に決まらなかった場合は'その他クエスト'
+        return index.get((war_name, quest_name), (quest_name, "その他クエスト"))
+
+    # (war_name, quest_name) の組み合わせごとに一度だけ解決する
+    keys = ["war_name", "quest_name"]
+    unique_df = df[keys].drop_duplicates()
+    resolved = [
+        resolve(war_name, quest_name)
+        for war_name, quest_name in zip(unique_df["war_name"], unique_df["quest_name"])
+    ]
+    unique_df["_quest_name"] = [quest_name for quest_name, _ in resolved]
+    unique_df["_category"] = [category for _, category in resolved]
+
+    # 左外部結合は左側の行順を保つので、結果をそのまま元の行に戻せる
+    merged_df = df[keys].merge(unique_df, on=keys, how="left")
+    category = merged_df["_category"].to_numpy()
+    quest_name = merged_df["_quest_name"].to_numpy()
+    # 入力がカテゴリ型の場合は結果もカテゴリ型にする
+    if is_categorical(df["quest_name"]):
+        df["category"] = pd.Categorical(category)
+        df["quest_name"] = pd.Categorical(quest_name)
+    else:
+        df["category"] = category
+        df["quest_name"] = quest_name
 
     return df
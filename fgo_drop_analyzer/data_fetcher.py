@@ -1,113 +1,441 @@
 import configparser
 import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+
+from .schema import apply_schema
+from .schema import DROP_DTYPES
+from .schema import REPORT_DTYPES
+
+try:
+    import orjson  # type: ignore[import]
+except ImportError:  # orjson は任意の依存
+    orjson = None  # type: ignore[assignment]
 
 base_dir = Path(__file__).resolve().parents[1]
 config_path = base_dir / "conf" / "config.ini"
 
-config = configparser.ConfigParser()
-config.read(config_path)
+# 取得先を引数で指定しない場合に使う、空の場合は取得時に config.ini から読み込む
+API_KEY = ""
+GRAPHQL_ENDPOINT = ""
 
-API_KEY = config.get("appsync", "api_key")
-GRAPHQL_ENDPOINT = config.get("appsync", "graphql_endpoint")
+# リトライの設定
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+REQUEST_TIMEOUT = 60
 
+# 報告単位(1報告1行)のカラム
+REPORT_COLUMNS = [
+    "id",
+    "owner",
+    "name",
+    "twitter_id",
+    "twitter_name",
+    "twitter_username",
+    "report_type",
+    "war_name",
+    "quest_type",
+    "quest_name",
+    "timestamp",
+    "runs",
+    "note",
+]
+# ドロップ単位(1ドロップ1行)のカラム、id で報告と紐づく
+DROP_COLUMNS = ["id", "object_name", "num", "stack"]
 
-def fetch_reports(timestamp: int) -> pd.DataFrame:
-    """GraphQLを使用してデータベースからデータを取得する
+QUERY = """
+query ListReportsSortedByTimestamp($type: String!, $nextToken: String, $timestamp: ModelIntKeyConditionInput) {
+    listReportsSortedByTimestamp(type: $type, timestamp: $timestamp, nextToken: $nextToken) {
+        items {
+            id
+            owner
+            name
+            twitterId
+            twitterName
+            twitterUsername
+            type
+            warName
+            questType
+            questName
+            timestamp
+            runs
+            note
+            dropObjects {
+                objectName
+                drops {
+                    num
+                    stack
+                }
+            }
+        }
+        nextToken
+    }
+}
+"""
+
+
+def create_session(api_key: str, pool_size: int = 1) -> requests.Session:
+    """接続を使い回すためのセッションを作成する
 
     Args:
-        timestamp (int): この時刻(unixtime)より新しいデータを取得
+        api_key (str): AppSync の API キー
+        pool_size (int, optional): 保持する接続数
+
+    Returns:
+        requests.Session: セッション
+    """
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json", "x-api-key": api_key})
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def post_with_retry(
+    session: requests.Session, endpoint: str, payload: Dict[str, Any]
+) -> requests.Response:
+    """POSTリクエストを送信し、一時的な失敗は待ち時間を空けてリトライする
+
+    Args:
+        session (requests.Session): セッション
+        endpoint (str): GraphQL のエンドポイント
+        payload (Dict[str, Any]): 送信するデータ
 
     Raises:
         ValueError: データベースからのデータ取得失敗
 
     Returns:
-        pd.DataFrame: 取得されたデータ
+        requests.Response: レスポンス
     """
-    query = """
-    query ListReportsSortedByTimestamp($type: String!, $nextToken: String, $timestamp: ModelIntKeyConditionInput) {
-        listReportsSortedByTimestamp(type: $type, timestamp: $timestamp, nextToken: $nextToken) {
-            items {
-                id
-                owner
-                name
-                twitterId
-                twitterName
-                twitterUsername
-                type
-                warName
-                questType
-                questName
-                timestamp
-                runs
-                note
-                dropObjects {
-                    objectName
-                    drops {
-                        num
-                        stack
-                    }
-                }
-            }
-            nextToken
-        }
-    }
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = session.post(endpoint, json=payload, timeout=REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                break
+        # 指数バックオフにジッターを加えて待つ
+        time.sleep(random.uniform(0, BACKOFF_SECONDS * 2**attempt))
+
+    if response.status_code != 200:
+        raise ValueError(f"Failed to fetch data from AppSync: {response.text}")
+    return response
+
+
+def parse_response(content: bytes) -> Dict[str, Any]:
+    """レスポンスの本文(バイト列)をそのままJSONとして読み込む、orjson があれば使う
+
+    Args:
+        content (bytes): レスポンスの本文
+
+    Returns:
+        Dict[str, Any]: 読み込んだデータ
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # 報告間で繰り返し現れる文字列は同じオブジェクトを共有させる
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def flatten_page(items: List[Dict[str, Any]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """1ページ分の報告を報告データとドロップデータの列に展開する
+
+    Args:
+        items (List[Dict[str, Any]]): 1ページ分の報告
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: 報告データとドロップデータ
     """
-    headers = {"Content-Type": "application/json", "x-api-key": API_KEY}
+    reports: Dict[str, list] = {col: [] for col in REPORT_COLUMNS}
+    drops: Dict[str, list] = {col: [] for col in DROP_COLUMNS}
+
+    for item in items:
+        report_id = item["id"]
+        reports["id"].append(report_id)
+        reports["owner"].append(_intern(item["owner"]))
+        reports["name"].append(_intern(item["name"]))
+        reports["twitter_id"].append(_intern(item["twitterId"]))
+        reports["twitter_name"].append(_intern(item["twitterName"]))
+        reports["twitter_username"].append(_intern(item["twitterUsername"]))
+        reports["report_type"].append(_intern(item["type"]))
+        reports["war_name"].append(_intern(item["warName"]))
+        reports["quest_type"].append(_intern(item["questType"]))
+        reports["quest_name"].append(_intern(item["questName"]))
+        reports["timestamp"].append(item["timestamp"])
+        reports["runs"].append(item["runs"])
+        reports["note"].append(item["note"])
+        for drop_obj in item["dropObjects"]:
+            object_name = _intern(drop_obj["objectName"])
+            for drop in drop_obj["drops"]:
+                drops["id"].append(report_id)
+                drops["object_name"].append(object_name)
+                drops["num"].append(drop["num"])
+                drops["stack"].append(drop["stack"])
 
+    return pd.DataFrame(reports), pd.DataFrame(drops)
+
+
+def iter_pages(
+    endpoint: str, api_key: str, condition: Dict[str, Any]
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """timestamp の条件に一致する報告をページをたどって順に取得する
+       各ページは受信した時点で報告データとドロップデータに展開する
+
+    Args:
+        endpoint (str): GraphQL のエンドポイント
+        api_key (str): AppSync の API キー
+        condition (Dict[str, Any]): timestamp の条件 (ModelIntKeyConditionInput)
+
+    Yields:
+        Iterator[Tuple[pd.DataFrame, pd.DataFrame]]: ページごとの報告データとドロップデータ
+    """
     next_token = None
-    reports = []
-
-    while True:
-        response = requests.post(
-            GRAPHQL_ENDPOINT,
-            json={
-                "query": query,
-                "variables": {
-                    "type": "open",
-                    "nextToken": next_token,
-                    "timestamp": {"gt": timestamp},
+
+    with create_session(api_key) as session:
+        while True:
+            response = post_with_retry(
+                session,
+                endpoint,
+                {
+                    "query": QUERY,
+                    "variables": {
+                        "type": "open",
+                        "nextToken": next_token,
+                        "timestamp": condition,
+                    },
                 },
-            },
-            headers=headers,
+            )
+
+            response_data = parse_response(response.content)
+            result = response_data["data"]["listReportsSortedByTimestamp"]
+            yield flatten_page(result["items"])
+            next_token = result["nextToken"]
+
+            if not next_token:
+                break
+
+
+def fetch_pages(
+    endpoint: str, api_key: str, condition: Dict[str, Any]
+) -> List[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """timestamp の条件に一致する報告をページをたどってすべて取得する
+
+    Args:
+        endpoint (str): GraphQL のエンドポイント
+        api_key (str): AppSync の API キー
+        condition (Dict[str, Any]): timestamp の条件 (ModelIntKeyConditionInput)
+
+    Returns:
+        List[Tuple[pd.DataFrame, pd.DataFrame]]: ページごとの報告データとドロップデータ
+    """
+    return list(iter_pages(endpoint, api_key, condition))
+
+
+def concat_pages(
+    pages: List[Tuple[pd.DataFrame, pd.DataFrame]]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """ページごとの報告データとドロップデータをそれぞれ結合し、カラムの型を揃える
+
+    Args:
+        pages (List[Tuple[pd.DataFrame, pd.DataFrame]]): ページごとのデータ
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: 報告データとドロップデータ
+    """
+    # ドロップの無い報告しかないページなどで列の型がぶれないよう、空のページは除く
+    report_chunks = [reports for reports, _ in pages if not reports.empty]
+    drop_chunks = [drops for _, drops in pages if not drops.empty]
+    reports_df = (
+        pd.concat(report_chunks, ignore_index=True)
+        if report_chunks
+        else pd.DataFrame(columns=REPORT_COLUMNS)
+    )
+    drops_df = (
+        pd.concat(drop_chunks, ignore_index=True)
+        if drop_chunks
+        else pd.DataFrame(columns=DROP_COLUMNS)
+    )
+    # ページごとにカテゴリが異なると結合できないので、型は結合した後に揃える
+    return apply_schema(reports_df, REPORT_DTYPES), apply_schema(drops_df, DROP_DTYPES)
+
+
+def split_time_range(start: int, end: int, windows: int) -> List[Dict[str, Any]]:
+    """(start, end] の期間を重ならない timestamp の条件に分割する
+
+    Args:
+        start (int): この時刻(unixtime)より新しいデータが対象
+        end (int): この時刻(unixtime)までのデータが対象
+        windows (int): 分割数
+
+    Returns:
+        List[Dict[str, Any]]: 古い順に並んだ between 条件
+    """
+    edges = [start + (end - start) * i // windows for i in range(windows + 1)]
+    return [
+        {"between": [lower + 1, upper]}
+        for lower, upper in zip(edges[:-1], edges[1:])
+        if upper > lower
+    ]
+
+
+def read_appsync_config() -> Tuple[str, str]:
+    """config.ini から AppSync の取得先を読み込む
+
+    Returns:
+        Tuple[str, str]: GraphQL のエンドポイントと API キー、未設定の場合は空文字列
+    """
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return config.get("appsync", "graphql_endpoint", fallback=""), config.get(
+        "appsync", "api_key", fallback=""
+    )
+
+
+def resolve_appsync(endpoint: Optional[str], api_key: Optional[str]) -> Tuple[str, str]:
+    """取得先を決める、引数で指定しない場合は GRAPHQL_ENDPOINT と API_KEY、それも空なら config.ini の値
+
+    Args:
+        endpoint (Optional[str]): GraphQL のエンドポイント
+        api_key (Optional[str]): AppSync の API キー
+
+    Raises:
+        ValueError: 取得先が設定されていない
+
+    Returns:
+        Tuple[str, str]: GraphQL のエンドポイントと API キー
+    """
+    if not endpoint:
+        endpoint, default_api_key = GRAPHQL_ENDPOINT, API_KEY
+        if not endpoint:
+            endpoint, default_api_key = read_appsync_config()
+        api_key = api_key or default_api_key
+    if not endpoint:
+        raise ValueError(f"{config_path} に [appsync] の設定がありません")
+    return endpoint, api_key or ""
+
+
+def fetch_report_tables(
+    timestamp: int,
+    windows: int = 1,
+    until: Optional[int] = None,
+    endpoint: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """GraphQLを使用してデータベースからデータを取得し、報告とドロップに分けて返す
+
+    Args:
+        timestamp (int): この時刻(unixtime)より新しいデータを取得
+        windows (int, optional): 期間を分割して並列に取得する数、1の場合は分割しない
+        until (Optional[int], optional): 分割する場合の期間の終わり、省略時は現在時刻
+        endpoint (Optional[str], optional): GraphQL のエンドポイント、省略時は GRAPHQL_ENDPOINT か config.ini の値
+        api_key (Optional[str], optional): AppSync の API キー、省略時は API_KEY か config.ini の値
+
+    Raises:
+        ValueError: データベースからのデータ取得失敗
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: 報告データ(1報告1行)とドロップデータ(1ドロップ1行)
+    """
+    # lambda の中でも str として扱えるよう、解決した値は別名で持つ
+    url, key = resolve_appsync(endpoint, api_key)
+
+    if windows > 1:
+        if until is None:
+            until = int(time.time())
+        conditions = split_time_range(timestamp, until, windows)
+    else:
+        conditions = [{"gt": timestamp}]
+
+    # 各期間を並列に取得し、古い期間から順に結合する
+    with ThreadPoolExecutor(max_workers=max(len(conditions), 1)) as executor:
+        results = executor.map(
+            lambda condition: fetch_pages(url, key, condition), conditions
         )
+        pages = [page for window_pages in results for page in window_pages]
+
+    return concat_pages(pages)
+
+
+def iter_report_batches(
+    timestamp: int,
+    batch_size: int,
+    endpoint: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """報告を取得しながら、報告数が batch_size 以上になるごとにまとめて返す
+       すべての報告を一度にメモリに持たないよう、ページは順に取得する
+
+    Args:
+        timestamp (int): この時刻(unixtime)より新しいデータを取得
+        batch_size (int): ひとまとまりにする報告数の目安
+        endpoint (Optional[str], optional): GraphQL のエンドポイント、省略時は GRAPHQL_ENDPOINT か config.ini の値
+        api_key (Optional[str], optional): AppSync の API キー、省略時は API_KEY か config.ini の値
+
+    Yields:
+        Iterator[Tuple[pd.DataFrame, pd.DataFrame]]: 報告データとドロップデータ
+    """
+    endpoint, api_key = resolve_appsync(endpoint, api_key)
+    pages: List[Tuple[pd.DataFrame, pd.DataFrame]] = []
+    reports = 0
+    for page in iter_pages(endpoint, api_key, {"gt": timestamp}):
+        pages.append(page)
+        reports += len(page[0])
+        if reports >= batch_size:
+            yield concat_pages(pages)
+            pages, reports = [], 0
+    if pages:
+        yield concat_pages(pages)
+
+
+def join_drops(reports_df: pd.DataFrame, drops_df: pd.DataFrame) -> pd.DataFrame:
+    """報告データとドロップデータを結合して1ドロップ1行のデータにする
+       ドロップの無い報告と、報告データに存在しないidのドロップは含まれない
+
+    Args:
+        reports_df (pd.DataFrame): 報告データ
+        drops_df (pd.DataFrame): ドロップデータ
 
-        if response.status_code != 200:
-            raise ValueError(f"Failed to fetch data from AppSync: {response.text}")
-
-        response_data = json.loads(response.text)
-        report_items = response_data["data"]["listReportsSortedByTimestamp"]["items"]
-        next_token = response_data["data"]["listReportsSortedByTimestamp"]["nextToken"]
-
-        for item in report_items:
-            for drop_obj in item["dropObjects"]:
-                for drop in drop_obj["drops"]:
-                    report = {
-                        "id": item["id"],
-                        "owner": item["owner"],
-                        "name": item["name"],
-                        "twitter_id": item["twitterId"],
-                        "twitter_name": item["twitterName"],
-                        "twitter_username": item["twitterUsername"],
-                        "report_type": item["type"],
-                        "war_name": item["warName"],
-                        "quest_type": item["questType"],
-                        "quest_name": item["questName"],
-                        "timestamp": item["timestamp"],
-                        "runs": item["runs"],
-                        "note": item["note"],
-                        "object_name": drop_obj["objectName"],
-                        "num": drop["num"],
-                        "stack": drop["stack"],
-                    }
-                    reports.append(report)
-
-        if not next_token:
-            break
-
-    df_reports = pd.DataFrame(reports)
-
-    return df_reports
+    Returns:
+        pd.DataFrame: 結合されたデータ
+    """
+    # 内部結合は左側(ドロップ)の行順を保つ
+    df = drops_df.merge(reports_df, on="id", how="inner")
+    columns = REPORT_COLUMNS + DROP_COLUMNS[1:]
+    columns += [col for col in df.columns if col not in columns]
+    return df[columns]
+
+
+def fetch_reports(timestamp: int) -> pd.DataFrame:
+    """GraphQLを使用してデータベースからデータを取得する
+
+    Args:
+        timestamp (int): この時刻(unixtime)より新しいデータを取得
+
+    Raises:
+        ValueError: データベースからのデータ取得失敗
+
+    Returns:
+        pd.DataFrame: 取得されたデータ(1ドロップ1行)
+    """
+    return join_drops(*fetch_report_tables(timestamp))
@@ -0,0 +1,92 @@
+import importlib.util
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+from .data_fetcher import REPORT_COLUMNS
+from .schema import report_urls
+
+# 出力形式ごとのファイルの拡張子
+FORMAT_SUFFIXES = {
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "csv": ".csv.gz",
+}
+# pyarrow が必要な出力形式
+ARROW_FORMATS = {"parquet", "feather"}
+
+
+def arrow_available() -> bool:
+    """Parquet と Feather の出力に必要な pyarrow がインストールされているかどうか
+
+    Returns:
+        bool: インストールされていれば True
+    """
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def create_report_table(reports_df: pd.DataFrame) -> pd.DataFrame:
+    """1ドロップ1行のデータから1報告1行の表を作成する
+       いずれかのドロップがErrorカテゴリの報告はErrorカテゴリにする
+
+    Args:
+        reports_df (pd.DataFrame): 検証済みの報告データ
+
+    Returns:
+        pd.DataFrame: 1報告1行の表
+    """
+    report_df = reports_df.drop_duplicates(subset="id")
+    # url はドロップごとには持たず、報告ごとに id から作成する
+    if "url" not in report_df.columns:
+        report_df = report_df.assign(url=report_urls(report_df["id"]))
+    report_df = report_df[REPORT_COLUMNS + ["category", "url"]].reset_index(drop=True)
+    error_ids = reports_df.loc[reports_df["category"] == "Error", "id"].unique()
+    report_df.loc[report_df["id"].isin(error_ids), "category"] = "Error"
+    return report_df
+
+
+def write_table(df: pd.DataFrame, path: Path, fmt: str) -> None:
+    """表を指定した形式で保存する
+
+    Args:
+        df (pd.DataFrame): 保存する表
+        path (Path): 保存先
+        fmt (str): 出力形式 (parquet, feather, csv)
+    """
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "feather":
+        # Feather は既定のインデックスしか保存できない
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False, compression="gzip")
+
+
+def export_tables(
+    filename: str, fmt: str, reports_df: pd.DataFrame, stats_df: pd.DataFrame
+) -> List[Path]:
+    """ドロップ・報告・クエストごとの集計の表をそれぞれ別のファイルに保存する
+       ファイル名は {filename}_drops, {filename}_reports, {filename}_quest_stats に拡張子を付けたもの
+
+    Args:
+        filename (str): 出力ファイル名(.xlsx が付いている場合は除く)
+        fmt (str): 出力形式 (parquet, feather, csv)
+        reports_df (pd.DataFrame): 検証済みの報告データ(1ドロップ1行)
+        stats_df (pd.DataFrame): クエスト・アイテムごとの集計
+
+    Returns:
+        List[Path]: 保存したファイル
+    """
+    base = filename.removesuffix(".xlsx")
+    tables = {
+        "drops": reports_df.reset_index(drop=True),
+        "reports": create_report_table(reports_df),
+        "quest_stats": stats_df.reset_index(drop=True),
+    }
+    paths = []
+    for name, df in tables.items():
+        path = Path(f"{base}_{name}{FORMAT_SUFFIXES[fmt]}")
+        write_table(df, path, fmt)
+        paths.append(path)
+    return paths
@@ -0,0 +1,198 @@
+import json
+import sys
+import time
+import tracemalloc
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+# ピークRSSをリセットできる Linux の procfs
+CLEAR_REFS_PATH = Path("/proc/self/clear_refs")
+STATUS_PATH = Path("/proc/self/status")
+
+
+class StageRecord(NamedTuple):
+    """処理段階ごとの計測結果
+
+    Attributes:
+        name (str): 処理段階の名前
+        wall_time (float): 経過時間(秒)
+        cpu_time (float): このプロセスのCPU時間(秒)、--jobs の子プロセスの分は含まない
+        rows_in (Optional[int]): 処理前の行数
+        rows_out (Optional[int]): 処理後の行数
+        peak_traced_mb (Optional[float]): tracemalloc で計測したPythonのメモリ確保量のピーク(MB)
+        peak_rss_mb (Optional[float]): ピークRSS(MB)、リセットできない環境ではその時点までのピーク
+    """
+
+    name: str
+    wall_time: float
+    cpu_time: float
+    rows_in: Optional[int]
+    rows_out: Optional[int]
+    peak_traced_mb: Optional[float]
+    peak_rss_mb: Optional[float]
+
+
+class Stage:
+    """計測中の処理段階、処理後の行数は rows_out に設定する"""
+
+    __slots__ = ("rows_out",)
+
+    def __init__(self):
+        self.rows_out: Optional[int] = None
+
+
+def reset_peak_rss() -> bool:
+    """ピークRSS(VmHWM)を現在のRSSにリセットする
+
+    Returns:
+        bool: リセットできた場合は True
+    """
+    try:
+        CLEAR_REFS_PATH.write_text("5")
+    except OSError:
+        return False
+    return True
+
+
+def read_peak_rss_mb(reset: bool) -> Optional[float]:
+    """ピークRSSをMB単位で取得する
+
+    Args:
+        reset (bool): reset_peak_rss でリセットできている
+
+    Returns:
+        Optional[float]: ピークRSS、取得できない場合は None
+    """
+    if reset:
+        for line in STATUS_PATH.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト単位、Linux はKB単位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class StageProfiler:
+    """main() の処理段階ごとの経過時間・CPU時間・行数・ピークメモリを記録する
+    無効な場合は何も計測しない
+    """
+
+    def __init__(self, enabled: bool = False, trace_malloc: bool = False):
+        """
+        Args:
+            enabled (bool, optional): 計測する
+            trace_malloc (bool, optional): tracemalloc でメモリ確保量も計測する(処理が数倍遅くなる)
+        """
+        self.enabled = enabled
+        self.trace_malloc = enabled and trace_malloc
+        self.records: List[StageRecord] = []
+        self.started_at = datetime.now(timezone.utc)
+        if self.trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[Stage]:
+        """with 文の中の処理を1つの処理段階として計測する
+
+        Args:
+            name (str): 処理段階の名前
+            rows_in (Optional[int], optional): 処理前の行数
+
+        Yields:
+            Iterator[Stage]: 処理後の行数を設定する計測中の処理段階
+        """
+        stage = Stage()
+        if not self.enabled:
+            yield stage
+            return
+
+        rss_reset = reset_peak_rss()
+        if self.trace_malloc:
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        yield stage
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+        peak_traced_mb = None
+        if self.trace_malloc:
+            # 処理段階の開始時点で確保済みだった分は除く
+            peak_traced = tracemalloc.get_traced_memory()[1] - traced_start
+            peak_traced_mb = peak_traced / 1024 / 1024
+        self.records.append(
+            StageRecord(
+                name=name,
+                wall_time=wall_time,
+                cpu_time=cpu_time,
+                rows_in=rows_in,
+                rows_out=stage.rows_out,
+                peak_traced_mb=peak_traced_mb,
+                peak_rss_mb=read_peak_rss_mb(rss_reset),
+            )
+        )
+
+    def format_table(self) -> str:
+        """計測結果を表形式の文字列にする
+
+        Returns:
+            str: 計測結果の表
+        """
+
+        def optional(value, fmt: str) -> str:
+            return "-" if value is None else format(value, fmt)
+
+        def pad_name(name: str) -> str:
+            # 全角文字は2桁分として揃える
+            width = sum(
+                2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in name
+            )
+            return name + " " * max(28 - width, 0)
+
+        lines = [
+            f"{pad_name('stage')} {'wall[s]':>9} {'cpu[s]':>9} {'rows in':>10} "
+            f"{'rows out':>10} {'traced[MB]':>11} {'rss[MB]':>9}"
+        ]
+        for record in self.records:
+            lines.append(
+                f"{pad_name(record.name)} {record.wall_time:>9.3f} {record.cpu_time:>9.3f} "
+                f"{optional(record.rows_in, ','):>10} {optional(record.rows_out, ','):>10} "
+                f"{optional(record.peak_traced_mb, '.1f'):>11} {optional(record.peak_rss_mb, '.1f'):>9}"
+            )
+        lines.append(
+            f"{pad_name('total')} {sum(r.wall_time for r in self.records):>9.3f} "
+            f"{sum(r.cpu_time for r in self.records):>9.3f}"
+        )
+        return "\n".join(lines)
+
+    def write_json(self, path: str) -> None:
+        """計測結果を JSON で保存する
+
+        Args:
+            path (str): 保存先
+        """
+        data = {
+            "started_at": self.started_at.isoformat(),
+            "trace_malloc": self.trace_malloc,
+            "stages": [record._asdict() for record in self.records],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+# 計測しない場合に使う無効なプロファイラ
+DISABLED_PROFILER = StageProfiler()
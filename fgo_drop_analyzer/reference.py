@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import pandas as pd
+
+from .data_cleaning import AliasIndex
+from .data_cleaning import build_alias_index
+from .data_cleaning import build_quest_index
+from .data_cleaning import build_quest_items
+from .data_cleaning import QUEST_KEYS
+from .data_cleaning import read_rarity_dict
+
+logger = logging.getLogger(__name__)
+
+# 参照データの形を変えた場合は上げて、古いキャッシュを使わないようにする
+CACHE_VERSION = 1
+SOURCE_FILES = ["freequest.csv", "item.csv"]
+
+
+class ReferenceData(NamedTuple):
+    """freequest.csv と item.csv から作成する参照データ
+       関数を含まないのでキャッシュに保存でき、プロセス間でも共有できる
+
+    Attributes:
+        freequest_df (pd.DataFrame): フリークエストデータ
+        quest_index (Dict[Tuple[str, str], Tuple[str, str]]): (war_name, クエスト名またはスポット) に対する (counter_name, category)
+        quest_items (Tuple[pd.DataFrame, pd.DataFrame]): war_name と quest_name で作成した (クエスト, ドロップするアイテム) の表とクエストの一覧
+        aliases (AliasIndex): アイテムの別名の索引
+        rarity_dict (Dict[str, str]): アイテム名に対するレアリティ(金・銀・銅)
+    """
+
+    freequest_df: pd.DataFrame
+    quest_index: Dict[Tuple[str, str], Tuple[str, str]]
+    quest_items: Tuple[pd.DataFrame, pd.DataFrame]
+    aliases: AliasIndex
+    rarity_dict: Dict[str, str]
+
+
+class Fingerprint(NamedTuple):
+    """キャッシュを作成したときの CSV ファイルの状態"""
+
+    mtime_ns: int
+    size: int
+    sha256: str
+
+
+def read_freequest_csv(file_path: Path) -> pd.DataFrame:
+    """フリーククエストデータを読み込む
+
+    Args:
+        file_path (Path): freequest.csv のパス
+
+    Returns:
+        pd.DataFrame: フリークエストデータ
+    """
+    freequest_df = pd.read_csv(file_path, encoding="utf-8-sig")
+    return freequest_df.loc[:, ~freequest_df.columns.str.contains("^Unnamed")]
+
+
+def build_reference_data(data_dir: Path) -> ReferenceData:
+    """CSV ファイルを読み込んで参照データを作成する
+
+    Args:
+        data_dir (Path): freequest.csv と item.csv があるディレクトリ
+
+    Returns:
+        ReferenceData: 参照データ
+    """
+    freequest_df = read_freequest_csv(data_dir / "freequest.csv")
+    return ReferenceData(
+        freequest_df=freequest_df,
+        quest_index=build_quest_index(freequest_df),
+        quest_items=build_quest_items(freequest_df, QUEST_KEYS),
+        aliases=build_alias_index(data_dir / "item.csv"),
+        rarity_dict=read_rarity_dict(data_dir / "item.csv"),
+    )
+
+
+def file_fingerprint(file_path: Path, sha256: Optional[str] = None) -> Fingerprint:
+    """ファイルの更新時刻・サイズ・ハッシュを取得する
+
+    Args:
+        file_path (Path): ファイルのパス
+        sha256 (Optional[str], optional): 計算済みのハッシュ
+
+    Returns:
+        Fingerprint: ファイルの状態
+    """
+    stat = file_path.stat()
+    if sha256 is None:
+        sha256 = hashlib.sha256(file_path.read_bytes()).hexdigest()
+    return Fingerprint(stat.st_mtime_ns, stat.st_size, sha256)
+
+
+def is_unchanged(file_path: Path, cached: Fingerprint) -> bool:
+    """ファイルがキャッシュを作成したときから変わっていないかどうか
+       更新時刻とサイズが同じなら読み込まずに変わっていないとみなし、
+       異なる場合は内容のハッシュで判定する
+
+    Args:
+        file_path (Path): ファイルのパス
+        cached (Fingerprint): キャッシュを作成したときの状態
+
+    Returns:
+        bool: 変わっていなければ True
+    """
+    stat = file_path.stat()
+    if (stat.st_mtime_ns, stat.st_size) == (cached.mtime_ns, cached.size):
+        return True
+    return file_fingerprint(file_path).sha256 == cached.sha256
+
+
+def read_cache(cache_path: Path) -> Optional[dict]:
+    """キャッシュを読み込む、無いか読み込めない場合は None
+
+    Args:
+        cache_path (Path): キャッシュファイルのパス
+
+    Returns:
+        Optional[dict]: キャッシュの内容
+    """
+    try:
+        with cache_path.open("rb") as f:
+            cache = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # 壊れたキャッシュや互換性の無いバージョンで作成されたキャッシュは作り直す
+        logger.debug("参照データのキャッシュを読み込めません: %s", e)
+        return None
+    if cache.get("version") != (CACHE_VERSION, pd.__version__):
+        return None
+    return cache
+
+
+def write_cache(
+    cache_path: Path, reference: ReferenceData, fingerprints: Dict[str, Fingerprint]
+) -> None:
+    """参照データをキャッシュに保存する、保存できない場合は警告だけ出して続ける
+
+    Args:
+        cache_path (Path): キャッシュファイルのパス
+        reference (ReferenceData): 参照データ
+        fingerprints (Dict[str, Fingerprint]): CSV ファイルごとの状態
+    """
+    cache = {
+        "version": (CACHE_VERSION, pd.__version__),
+        "fingerprints": fingerprints,
+        "reference": reference,
+    }
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with tmp_path.open("wb") as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # 別のプロセスが読み込み中でも壊れたファイルが見えないように置き換える
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("参照データのキャッシュを保存できません: %s", e)
+        tmp_path.unlink(missing_ok=True)
+
+
+def load_reference_data(data_dir: Path, cache_path: Optional[Path]) -> ReferenceData:
+    """参照データをキャッシュから読み込む
+       キャッシュが無いか、CSV ファイルが変わっている場合は作成し直してキャッシュに保存する
+
+    Args:
+        data_dir (Path): freequest.csv と item.csv があるディレクトリ
+        cache_path (Optional[Path]): キャッシュファイルのパス、None の場合はキャッシュを使わない
+
+    Returns:
+        ReferenceData: 参照データ
+    """
+    if cache_path is None:
+        return build_reference_data(data_dir)
+
+    cache = read_cache(cache_path)
+    if cache is not None and cache["fingerprints"].keys() == set(SOURCE_FILES):
+        fingerprints = cache["fingerprints"]
+        if all(
+            is_unchanged(data_dir / name, fingerprints[name]) for name in SOURCE_FILES
+        ):
+            refreshed = {
+                name: file_fingerprint(data_dir / name, fingerprints[name].sha256)
+                for name in SOURCE_FILES
+            }
+            # 内容が同じで更新時刻だけ変わった場合は、次回ハッシュを計算しないよう保存し直す
+            if refreshed != fingerprints:
+                write_cache(cache_path, cache["reference"], refreshed)
+            return cache["reference"]
+
+    logger.debug("参照データを作成します")
+    fingerprints = {name: file_fingerprint(data_dir / name) for name in SOURCE_FILES}
+    reference = build_reference_data(data_dir)
+    write_cache(cache_path, reference, fingerprints)
+    return reference
@@ -0,0 +1,309 @@
+import sqlite3
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+import pandas as pd
+
+from .data_fetcher import DROP_COLUMNS
+from .data_fetcher import REPORT_COLUMNS
+from .schema import apply_schema
+from .schema import DROP_DTYPES
+from .schema import REPORT_DTYPES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id TEXT PRIMARY KEY,
+    owner TEXT,
+    name TEXT,
+    twitter_id TEXT,
+    twitter_name TEXT,
+    twitter_username TEXT,
+    report_type TEXT,
+    war_name TEXT,
+    quest_type TEXT,
+    quest_name TEXT,
+    timestamp INTEGER NOT NULL,
+    runs INTEGER,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS reports_timestamp ON reports (timestamp);
+CREATE TABLE IF NOT EXISTS drops (
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    object_name TEXT,
+    num INTEGER,
+    stack INTEGER,
+    PRIMARY KEY (id, seq)
+);
+CREATE TABLE IF NOT EXISTS quest_item_stats (
+    war_name TEXT NOT NULL,
+    quest_name TEXT NOT NULL,
+    object_name TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    drops INTEGER NOT NULL,
+    reports INTEGER NOT NULL,
+    last_timestamp INTEGER NOT NULL,
+    PRIMARY KEY (war_name, quest_name, object_name)
+);
+CREATE TABLE IF NOT EXISTS aggregated_reports (
+    id TEXT PRIMARY KEY
+);
+"""
+# クエスト・アイテムごとの集計のカラム
+STATS_COLUMNS = [
+    "war_name",
+    "quest_name",
+    "object_name",
+    "runs",
+    "drops",
+    "reports",
+    "last_timestamp",
+]
+
+
+def open_store(path: Union[str, Path]) -> sqlite3.Connection:
+    """取得した報告を保存するSQLiteデータベースを開く、存在しない場合は作成する
+
+    Args:
+        path (Union[str, Path]): データベースファイルのパス
+
+    Returns:
+        sqlite3.Connection: データベースへの接続
+    """
+    conn = sqlite3.connect(path)
+    tables = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    conn.executescript(SCHEMA)
+    # 集計済みの報告を記録していない保存先では、どの報告が集計に含まれているか分からないので集計を作り直す
+    if "quest_item_stats" in tables and "aggregated_reports" not in tables:
+        with conn:
+            conn.execute("DELETE FROM quest_item_stats")
+    return conn
+
+
+def _to_records(df: pd.DataFrame, columns: List[str]) -> List[tuple]:
+    # numpy の型と NaN を SQLite に渡せる Python の値に変換する
+    values = df[columns].astype(object).where(df[columns].notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def upsert_report_tables(
+    conn: sqlite3.Connection, reports_df: pd.DataFrame, drops_df: pd.DataFrame
+) -> Set[str]:
+    """取得した報告データとドロップデータを保存する
+       すでに保存されている報告は、ドロップごと新しい内容で置き換える
+
+    Args:
+        conn (sqlite3.Connection): データベースへの接続
+        reports_df (pd.DataFrame): 報告データ(1報告1行)
+        drops_df (pd.DataFrame): ドロップデータ(1ドロップ1行)
+
+    Returns:
+        Set[str]: 新たに追加された報告のid
+    """
+    ids = reports_df["id"].tolist()
+    drops_df = drops_df[drops_df["id"].isin(ids)].copy()
+    # 報告内でのドロップの順番を保存する
+    drops_df["seq"] = drops_df.groupby("id").cumcount()
+
+    with conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (id TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM incoming")
+        conn.executemany(
+            "INSERT OR IGNORE INTO incoming VALUES (?)", [(i,) for i in ids]
+        )
+        new_ids = {
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM incoming WHERE id NOT IN (SELECT id FROM reports)"
+            )
+        }
+        conn.execute("DELETE FROM drops WHERE id IN (SELECT id FROM incoming)")
+        conn.executemany(
+            f"INSERT OR REPLACE INTO reports ({', '.join(REPORT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(REPORT_COLUMNS))})",
+            _to_records(reports_df, REPORT_COLUMNS),
+        )
+        drop_columns = DROP_COLUMNS[:1] + ["seq"] + DROP_COLUMNS[1:]
+        conn.executemany(
+            f"INSERT INTO drops ({', '.join(drop_columns)}) "
+            f"VALUES ({', '.join('?' * len(drop_columns))})",
+            _to_records(drops_df, drop_columns),
+        )
+        conn.execute("DELETE FROM incoming")
+
+    return new_ids
+
+
+def load_report_tables(
+    conn: sqlite3.Connection,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    unaggregated: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """保存されている報告データとドロップデータを古い順に読み込む
+
+    Args:
+        conn (sqlite3.Connection): データベースへの接続
+        since (Optional[int], optional): この時刻(unixtime)より新しいデータを対象にする
+        until (Optional[int], optional): この時刻(unixtime)までのデータを対象にする
+        unaggregated (bool, optional): まだクエスト・アイテムごとの集計に含めていない報告だけを対象にする
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: 報告データとドロップデータ
+    """
+    conditions = []
+    params: List[Any] = []
+    if unaggregated:
+        conditions.append("r.id NOT IN (SELECT id FROM aggregated_reports)")
+    if since is not None:
+        conditions.append("r.timestamp > ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("r.timestamp <= ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    reports_df = pd.read_sql_query(
+        f"SELECT {', '.join('r.' + col for col in REPORT_COLUMNS)} FROM reports r "
+        f"{where} ORDER BY r.timestamp, r.id",
+        conn,
+        params=tuple(params),
+    )
+    drops_df = pd.read_sql_query(
+        f"SELECT {', '.join('d.' + col for col in DROP_COLUMNS)} "
+        f"FROM drops d JOIN reports r ON d.id = r.id "
+        f"{where} ORDER BY r.timestamp, r.id, d.seq",
+        conn,
+        params=tuple(params),
+    )
+    return apply_schema(reports_df, REPORT_DTYPES), apply_schema(drops_df, DROP_DTYPES)
+
+
+def split_store_windows(
+    conn: sqlite3.Connection, batch_size: int, unaggregated: bool = False
+) -> List[Tuple[Optional[int], Optional[int]]]:
+    """保存されている報告を、報告数が batch_size 程度になる期間に分ける
+       同じ timestamp の報告は同じ期間に含める
+
+    Args:
+        conn (sqlite3.Connection): データベースへの接続
+        batch_size (int): ひとつの期間に含める報告数の目安
+        unaggregated (bool, optional): まだ集計に含めていない報告の数で分ける
+
+    Returns:
+        List[Tuple[Optional[int], Optional[int]]]: 古い順に並んだ load_report_tables の since と until
+    """
+    where = (
+        "WHERE id NOT IN (SELECT id FROM aggregated_reports)" if unaggregated else ""
+    )
+    edges = [
+        row[0]
+        for row in conn.execute(
+            "SELECT timestamp FROM "
+            "(SELECT timestamp, ROW_NUMBER() OVER (ORDER BY timestamp) AS n "
+            f"FROM reports {where}) "
+            "WHERE n % ? = 0 ORDER BY timestamp",
+            (batch_size,),
+        )
+    ]
+    # 最後の期間は上限を設けずに残りの報告をすべて含める
+    bounds = [None] + sorted(set(edges))
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def iter_report_windows(
+    conn: sqlite3.Connection, batch_size: int, unaggregated: bool = False
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """保存されている報告を split_store_windows の期間ごとに古い順に読み込む
+
+    Args:
+        conn (sqlite3.Connection): データベースへの接続
+        batch_size (int): ひとつの期間に含める報告数の目安
+        unaggregated (bool, optional): まだ集計に含めていない報告だけを読み込む
+
+    Yields:
+        Iterator[Tuple[pd.DataFrame, pd.DataFrame]]: 期間ごとの報告データとドロップデータ
+    """
+    for since, until in split_store_windows(conn, batch_size, unaggregated):
+        yield load_report_tables(conn, since, until, unaggregated)
+
+
+def read_high_water_mark(conn: sqlite3.Connection) -> Tuple[int, List[str]]:
+    """保存済みの最新の取得ポイントを返す、config.ini の last_unixtime と last_ids に相当する
+
+    Args:
+        conn (sqlite3.Connection): データベースへの接続
+
+    Returns:
+        Tuple[int, List[str]]: 最新の unixtime と 最新の10件のレポートIDのリスト
+    """
+    rows = conn.execute(
+        "SELECT id, timestamp FROM reports ORDER BY timestamp DESC, id DESC LIMIT 10"
+    ).fetchall()
+    if not rows:
+        return 0, []
+    return rows[0][1], [row[0] for row in rows]
+
+
+def has_quest_item_stats(conn: sqlite3.Connection) -> bool:
+    """クエスト・アイテムごとの集計が保存されているかどうか
+
+    Args:
+        conn (sqlite3.Connection): データベースへの接続
+
+    Returns:
+        bool: 集計が1件以上保存されていれば True
+    """
+    return conn.execute("SELECT 1 FROM quest_item_stats LIMIT 1").fetchone() is not None
+
+
+def update_quest_item_stats(
+    conn: sqlite3.Connection, stats_df: pd.DataFrame, ids: Iterable[str] = ()
+) -> None:
+    """新しい報告の集計を保存済みの集計に加算し、集計した報告を集計済みとして記録する
+       新しい報告のあったクエスト・アイテムの行だけが更新される
+       加算と記録は同じトランザクションで行うので、途中で止まっても二重に数えたり数え漏れたりしない
+
+    Args:
+        conn (sqlite3.Connection): データベースへの接続
+        stats_df (pd.DataFrame): 新しい報告のクエスト・アイテムごとの集計
+        ids (Iterable[str], optional): stats_df の集計に含めた報告のid
+    """
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO aggregated_reports VALUES (?)", [(i,) for i in ids]
+        )
+        conn.executemany(
+            f"INSERT INTO quest_item_stats ({', '.join(STATS_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(STATS_COLUMNS))}) "
+            "ON CONFLICT (war_name, quest_name, object_name) DO UPDATE SET "
+            "runs = runs + excluded.runs, "
+            "drops = drops + excluded.drops, "
+            "reports = reports + excluded.reports, "
+            "last_timestamp = MAX(last_timestamp, excluded.last_timestamp)",
+            _to_records(stats_df, STATS_COLUMNS),
+        )
+
+
+def load_quest_item_stats(conn: sqlite3.Connection) -> pd.DataFrame:
+    """保存されているクエスト・アイテムごとの集計を読み込む
+
+    Args:
+        conn (sqlite3.Connection): データベースへの接続
+
+    Returns:
+        pd.DataFrame: クエスト・アイテムごとの集計
+    """
+    return pd.read_sql_query(
+        f"SELECT {', '.join(STATS_COLUMNS)} FROM quest_item_stats", conn
+    )
@@ -0,0 +1,156 @@
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+# 報告の URL は id から作成する
+REPORT_URL_PREFIX = "https://fgodrop.max747.org/reports/"
+
+# 報告データ(1報告1行)のカラムの型
+# 報告間で繰り返し現れる文字列はカテゴリ型、欠損することのある整数は nullable 整数型にする
+# twitter_id は欠損が多く、報告者ごとにほぼ一意なので object 型のままにする
+# note は報告ごとにほぼ一意で、カテゴリ型にしてもメモリが減らないので object 型のままにする
+REPORT_DTYPES = {
+    "owner": "category",
+    "name": "category",
+    "twitter_name": "category",
+    "twitter_username": "category",
+    "report_type": "category",
+    "war_name": "category",
+    "quest_type": "category",
+    "quest_name": "category",
+    "timestamp": "int64",
+    "runs": "Int32",
+}
+# ドロップデータ(1ドロップ1行)のカラムの型
+DROP_DTYPES = {
+    "object_name": "category",
+    "num": "Int32",
+    "stack": "Int32",
+}
+
+
+def apply_schema(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """カラムを指定した型に変換する、df に無いカラムは無視する
+
+    Args:
+        df (pd.DataFrame): 報告データまたはドロップデータ
+        dtypes (Dict[str, str]): カラムごとの型
+
+    Returns:
+        pd.DataFrame: 変換したデータ
+    """
+    return df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+
+
+def report_urls(ids: Any) -> Any:
+    """報告の id から報告の URL を作成する
+
+    Args:
+        ids (Any): 報告の id (pd.Series または pd.Index)
+
+    Returns:
+        Any: ids と同じ形の URL
+    """
+    return REPORT_URL_PREFIX + ids.astype(object)
+
+
+def is_categorical(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def set_values(df: pd.DataFrame, rows: Any, column: str, values: Any) -> None:
+    """df.loc[rows, column] = values と同じ代入を行う
+       カテゴリ型のカラムには、代入する前に足りないカテゴリを追加する
+
+    Args:
+        df (pd.DataFrame): 変更するデータ
+        rows (Any): 変更する行(真偽値の配列またはインデックスのラベル)
+        column (str): 変更するカラム
+        values (Any): 設定する値、スカラーまたは rows の行と同じ順に並んだ値
+    """
+    if not is_categorical(df[column]):
+        df.loc[rows, column] = values
+        return
+    if not pd.api.types.is_scalar(values):
+        # カテゴリの異なるカテゴリ型どうしは代入できないので値の配列にする
+        values = np.asarray(values, dtype=object)
+    new_values = pd.Index(np.atleast_1d(values)).dropna()
+    new_categories = new_values.unique().difference(df[column].cat.categories)
+    if len(new_categories) > 0:
+        df[column] = df[column].cat.add_categories(new_categories)
+    df.loc[rows, column] = values
+
+
+def map_values(series: pd.Series, mapper: Callable[[Any], Any]) -> pd.Series:
+    """ユニークな値ごとに一度だけ mapper を適用して値を変換する
+       カテゴリ型はカテゴリだけを変換し、変換後もカテゴリ型のままにする
+
+    Args:
+        series (pd.Series): 変換する値
+        mapper (Callable[[Any], Any]): 値の変換関数
+
+    Returns:
+        pd.Series: 変換した値
+    """
+    if not is_categorical(series):
+        return series.map({value: mapper(value) for value in series.unique()})
+    if series.cat.categories.empty:
+        return series
+    # 変換後に同じ値になるカテゴリはひとつにまとめる
+    mapped_codes, categories = pd.factorize(series.cat.categories.map(mapper))
+    codes = series.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, mapped_codes[codes], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(cast(Sequence[int], codes), categories),
+        index=series.index,
+        name=series.name,
+    )
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """カテゴリ型のカラムのカテゴリを揃えてから結合する
+       カテゴリの異なるカテゴリ型を pd.concat で結合すると object 型になるため
+
+    Args:
+        frames (List[pd.DataFrame]): 同じカラムを持つデータ、カテゴリを揃えるために変更される
+
+    Returns:
+        pd.DataFrame: 結合したデータ
+    """
+    for col in frames[0].columns:
+        if not all(is_categorical(df[col]) for df in frames):
+            continue
+        categories = frames[0][col].cat.categories
+        for df in frames[1:]:
+            categories = categories.union(df[col].cat.categories, sort=False)
+        for df in frames:
+            df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def to_plain_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """カテゴリ型を object 型に、欠損の無い nullable 整数型を int64 型に戻す
+       行ごとの値を組み立てる従来の処理に渡す前に使う
+
+    Args:
+        df (pd.DataFrame): 変換するデータ
+
+    Returns:
+        pd.DataFrame: 変換したデータ
+    """
+    dtypes: Dict[Hashable, Any] = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtypes[col] = object
+        elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and (
+            pd.api.types.is_integer_dtype(dtype) and not df[col].hasnans
+        ):
+            dtypes[col] = "int64"
+    return df.astype(dtypes) if dtypes else df
@@ -0,0 +1,55 @@
+from pathlib import Path
+from typing import List
+from typing import Optional
+
+import pandas as pd
+
+from .export import arrow_available
+from .schema import concat_frames
+
+
+class ReportSpill:
+    """分割して処理した報告データをチャンクごとにディスクに書き出し、最後にまとめて読み込む
+    pyarrow がインストールされていれば Parquet、無ければ pickle で書き出す
+    """
+
+    def __init__(self, directory: Path, use_parquet: Optional[bool] = None):
+        """
+        Args:
+            directory (Path): 書き出すディレクトリ
+            use_parquet (Optional[bool], optional): Parquet で書き出すかどうか、省略時は pyarrow があれば Parquet
+        """
+        self.directory = directory
+        self.use_parquet = arrow_available() if use_parquet is None else use_parquet
+        self.paths: List[Path] = []
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def write(self, df: pd.DataFrame) -> None:
+        """チャンクを書き出す
+
+        Args:
+            df (pd.DataFrame): 書き出す報告データ
+        """
+        suffix = ".parquet" if self.use_parquet else ".pickle"
+        path = self.directory / f"chunk-{len(self.paths):05d}{suffix}"
+        # インデックスは保存しない(読み込むときに振り直す)
+        df = df.reset_index(drop=True)
+        if self.use_parquet:
+            df.to_parquet(path, index=False)
+        else:
+            df.to_pickle(path)
+        self.paths.append(path)
+
+    def read(self) -> pd.DataFrame:
+        """書き出したチャンクを書き出した順に読み込んで結合する
+
+        Returns:
+            pd.DataFrame: 結合した報告データ
+        """
+        frames = [
+            pd.read_parquet(path) if self.use_parquet else pd.read_pickle(path)
+            for path in self.paths
+        ]
+        return concat_frames(frames)
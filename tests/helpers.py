@@ -0,0 +1,30 @@
+import pandas as pd
+
+from fgo_drop_analyzer.data_fetcher import DROP_COLUMNS
+from fgo_drop_analyzer.data_fetcher import REPORT_COLUMNS
+
+
+def make_tables(reports, drops):
+    reports_df = pd.DataFrame(
+        [
+            {
+                "id": report_id,
+                "owner": "owner",
+                "name": "name",
+                "twitter_id": None,
+                "twitter_name": "twitter",
+                "twitter_username": "user",
+                "report_type": "open",
+                "war_name": "冬木",
+                "quest_type": "normal",
+                "quest_name": "未確認座標X-A",
+                "timestamp": timestamp,
+                "runs": 10,
+                "note": "",
+            }
+            for report_id, timestamp in reports
+        ],
+        columns=REPORT_COLUMNS,
+    )
+    drops_df = pd.DataFrame(drops, columns=DROP_COLUMNS)
+    return reports_df, drops_df
@@ -0,0 +1,173 @@
+import argparse
+
+import pandas as pd
+
+from fgo_drop_analyzer import app
+from fgo_drop_analyzer.app import clean_in_chunks
+from fgo_drop_analyzer.app import clean_in_shards
+from fgo_drop_analyzer.app import create_clean_executor
+from fgo_drop_analyzer.app import fetch_report_chunks
+from fgo_drop_analyzer.app import prepare_reports
+from fgo_drop_analyzer.app import shard_report_tables
+from fgo_drop_analyzer.app import split_unvalidated
+from fgo_drop_analyzer.app import update_summary
+from fgo_drop_analyzer.app import validate_reports
+from fgo_drop_analyzer.context import AppContext
+from fgo_drop_analyzer.create_report import aggregate_quest_items
+from fgo_drop_analyzer.report_store import iter_report_windows
+from fgo_drop_analyzer.report_store import load_report_tables
+from fgo_drop_analyzer.report_store import open_store
+from fgo_drop_analyzer.report_store import upsert_report_tables
+from fgo_drop_analyzer.spill import ReportSpill
+from tests.helpers import make_tables
+
+REPORTS = [("a", 100), ("b", 200), ("c", 200), ("d", 300), ("e", 400)]
+DROPS = [
+    ("a", "骨", 3, 1),
+    ("a", "証", 2, 1),
+    ("b", "骨", 4, 1),
+    ("b", "QP", 10, 1000),
+    ("c", "証", 99, 1),
+    ("d", "骨", 1, 1),
+    ("d", "剣輝", 1, 1),
+    ("e", "証", 5, 1),
+]
+
+# 報告 a-e のクエスト、同じ時刻の報告 b, c は別のクエストにする
+QUEST_NAMES = [
+    "未確認座標X-A",
+    "未確認座標X-C",
+    "未確認座標X-B",
+    "未確認座標X-A",
+    "未確認座標X-A",
+]
+
+
+def clean_serially(report_table_df, drops_df, context):
+    unvalidated_df = prepare_reports(report_table_df, drops_df, context)
+    validated_df = validate_reports(unvalidated_df.copy(), context)
+    return unvalidated_df, validated_df
+
+
+def assert_same_reports(result_df, expected_df):
+    pd.testing.assert_frame_equal(
+        result_df.reset_index(drop=True),
+        expected_df.reset_index(drop=True),
+        check_categorical=False,
+    )
+
+
+def test_clean_in_chunks_matches_whole(tmp_path):
+    context = AppContext(tmp_path / "config.ini", cache_path=None)
+    conn = open_store(tmp_path / "reports.sqlite3")
+    report_table_df, drops_df = make_tables(REPORTS, DROPS)
+    report_table_df["quest_name"] = QUEST_NAMES
+    upsert_report_tables(conn, report_table_df, drops_df)
+    unvalidated_df, expected_df = clean_serially(*load_report_tables(conn), context)
+
+    spill = ReportSpill(tmp_path, use_parquet=False)
+    cleaned = clean_in_chunks(iter_report_windows(conn, 2), context, spill)
+    reports_df, validated_df = split_unvalidated(spill.read())
+
+    # 同じ時刻の報告 b, c は同じチャンクに含まれる
+    assert len(spill) == 3
+    assert cleaned.latest_unixtime == 400
+    assert_same_reports(reports_df, unvalidated_df)
+    assert_same_reports(validated_df, expected_df[["object_name", "category"]])
+    expected = aggregate_quest_items(expected_df)
+    assert expected["quest_name"].nunique() > 1
+    # 行の順番まで一度に集計した場合と同じになる
+    assert cleaned.stats_df.values.tolist() == expected.values.tolist()
+
+
+def test_clean_in_chunks_stats_order(tmp_path):
+    context = AppContext(tmp_path / "config.ini", cache_path=None)
+    report_table_df, drops_df = make_tables(REPORTS, DROPS)
+    # 同じ時刻の報告 b, c を別のチャンクに分ける
+    report_table_df["quest_name"] = QUEST_NAMES
+    # c のドロップ数を集計に含まれる値にする
+    drops_df.loc[drops_df["id"] == "c", "num"] = 5
+    chunks = [
+        (report_table_df[start:end].copy(), drops_df)
+        for start, end in [(0, 2), (2, 4), (4, 5)]
+    ]
+    _, expected_df = clean_serially(report_table_df, drops_df, context)
+
+    cleaned = clean_in_chunks(chunks, context, ReportSpill(tmp_path, use_parquet=False))
+
+    expected = aggregate_quest_items(expected_df)
+    assert expected["quest_name"].nunique() == 3
+    # 行の順番まで一度に集計した場合と同じになる
+    assert cleaned.stats_df.values.tolist() == expected.values.tolist()
+
+
+def test_fetch_report_chunks_stores_each_batch(tmp_path, monkeypatch):
+    context = AppContext(tmp_path / "config.ini", cache_path=None)
+    conn = open_store(tmp_path / "reports.sqlite3")
+    upsert_report_tables(conn, *make_tables(REPORTS[:1], DROPS))
+    stored_counts = []
+
+    def iter_report_batches(timestamp, batch_size, endpoint=None, api_key=None):
+        # 保存済みの報告より新しい報告を取得する
+        assert (timestamp, batch_size) == (100, 2)
+        for reports in [REPORTS[:3], REPORTS[3:]]:
+            stored_counts.append(len(load_report_tables(conn)[0]))
+            yield make_tables(reports, DROPS)
+
+    monkeypatch.setattr(app, "iter_report_batches", iter_report_batches)
+    chunks = list(fetch_report_chunks(conn, argparse.Namespace(chunk_size=2), context))
+
+    # 次のチャンクを取得する前に、取得したチャンクは保存されている
+    assert stored_counts == [1, 3]
+    assert [df["id"].tolist() for df, _ in chunks] == [["a", "b", "c"], ["d"], ["e"]]
+
+
+def test_shard_report_tables():
+    report_table_df, drops_df = make_tables(REPORTS, DROPS + [("x", "骨", 1, 1)])
+
+    shards = shard_report_tables(report_table_df, drops_df, 2)
+
+    # 報告の並び順で連続するように分け、報告データに無い id のドロップは含めない
+    assert [df["id"].tolist() for df, _ in shards] == [["a", "b", "c"], ["d", "e"]]
+    assert [df["id"].tolist() for _, df in shards] == [
+        ["a", "a", "b", "b", "c"],
+        ["d", "d", "e"],
+    ]
+
+
+def test_clean_in_shards_matches_serial(tmp_path):
+    context = AppContext(tmp_path / "config.ini", cache_path=None)
+    report_table_df, drops_df = make_tables(REPORTS, DROPS)
+    unvalidated_df, expected_df = clean_serially(report_table_df, drops_df, context)
+
+    with create_clean_executor(2, context) as executor:
+        reports_df, validated_df = split_unvalidated(
+            clean_in_shards(report_table_df, drops_df, executor, 3)
+        )
+
+    assert (expected_df["category"] == "Error").any()
+    assert_same_reports(reports_df, unvalidated_df)
+    assert_same_reports(validated_df, expected_df[["object_name", "category"]])
+
+
+def test_update_summary_counts_reports_stored_without_incremental(tmp_path):
+    context = AppContext(tmp_path / "config.ini", cache_path=None)
+    conn = open_store(tmp_path / "reports.sqlite3")
+    reports_df, drops_df = make_tables(REPORTS, DROPS)
+    is_first = reports_df["timestamp"] <= 200
+
+    # --store -i, --store (集計しない), --store -i の順に実行した場合
+    upsert_report_tables(conn, reports_df[is_first], drops_df)
+    update_summary(conn, context)
+    upsert_report_tables(conn, reports_df[~is_first], drops_df)
+    result = update_summary(conn, context, chunk_size=2)
+
+    # すべての報告から一度に集計した場合と同じになり、二重にも数えない
+    _, expected_df = clean_serially(reports_df, drops_df, context)
+    expected = aggregate_quest_items(expected_df)
+    keys = ["war_name", "quest_name", "object_name"]
+    pd.testing.assert_frame_equal(
+        result.sort_values(keys, ignore_index=True),
+        expected.sort_values(keys, ignore_index=True),
+    )
+    assert_same_reports(update_summary(conn, context), result)
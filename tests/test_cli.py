@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "requests", "jaconv"]
+
+
+def test_help_does_not_import_heavy_modules():
+    code = (
+        "import sys\n"
+        "from fgo_drop_analyzer.cli import main\n"
+        "sys.argv = ['fgo_drop_analyzer', '--help']\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    assert output.splitlines()[-1] == "[]"
+
+
+def test_app_import_skips_output_modules():
+    code = (
+        "import sys\n"
+        "import fgo_drop_analyzer.app\n"
+        "print([m for m in ['openpyxl', 'jaconv'] if m in sys.modules])\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,32 @@
+from fgo_drop_analyzer.context import AppContext
+
+
+def test_fetch_point_round_trip(tmp_path):
+    config_path = tmp_path / "config.ini"
+    config_path.write_text(
+        "[DEFAULT]\n\n[appsync]\napi_key = key\ngraphql_endpoint = http://example.com\n"
+    )
+    context = AppContext(config_path)
+    assert context.read_fetch_point() == (0, [""])
+    assert context.graphql_endpoint == "http://example.com"
+    assert context.api_key == "key"
+
+    context.save_fetch_point(1700000000, ["a", "b"])
+    reloaded = AppContext(config_path)
+    assert reloaded.read_fetch_point() == (1700000000, ["a", "b"])
+    assert reloaded.api_key == "key"
+
+
+def test_missing_config(tmp_path):
+    context = AppContext(tmp_path / "config.ini")
+    assert context.graphql_endpoint == ""
+    assert context.read_fetch_point() == (0, [""])
+
+
+def test_reference_data_is_loaded_once(tmp_path):
+    context = AppContext(tmp_path / "config.ini", cache_path=None)
+    reference = context.reference
+    assert context.reference is reference
+    assert not reference.freequest_df.columns.str.contains("^Unnamed").any()
+    assert context.normalize_item_name("英雄の証") == "証"
+    assert reference.rarity_dict["証"] == "銅"
@@ -0,0 +1,442 @@
+import io
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl import Workbook
+
+from fgo_drop_analyzer.create_report import aggregate_quest_items
+from fgo_drop_analyzer.create_report import create_list
+from fgo_drop_analyzer.create_report import create_list_rows
+from fgo_drop_analyzer.create_report import create_statics
+from fgo_drop_analyzer.create_report import fold_quest_item_stats
+from fgo_drop_analyzer.create_report import ITEM_COLUMNS
+from fgo_drop_analyzer.create_report import prepare_data
+from fgo_drop_analyzer.create_report import prepare_report_set
+from fgo_drop_analyzer.create_report import update_report_set
+
+
+def test_aggregate_quest_items():
+    reports_df = pd.DataFrame(
+        {
+            "id": ["a", "a", "a", "b", "c"],
+            "war_name": ["冬木"] * 5,
+            "quest_name": ["X-A"] * 5,
+            "object_name": ["骨", "骨", "剣輝", "骨", "骨"],
+            "num": [10, 2, 5, 20, 99],
+            "stack": [1, 3, 1, 1, 1],
+            "runs": [100, 100, 100, 50, 10],
+            "category": ["フリクエ1部"] * 4 + ["Error"],
+            "timestamp": pd.to_datetime([1000, 1000, 1000, 2000, 3000], unit="s"),
+        }
+    )
+
+    result = aggregate_quest_items(reports_df)
+
+    # 同じ報告の枠数違いは周回数を1回だけ数え、Errorの行は集計しない
+    assert result.values.tolist() == [
+        ["冬木", "X-A", "骨", 150, 36, 2, 2000],
+        ["冬木", "X-A", "剣輝", 100, 5, 1, 1000],
+    ]
+
+
+def test_fold_quest_item_stats():
+    reports_df = pd.DataFrame(
+        {
+            "id": ["c", "b", "b", "a"],
+            "war_name": ["冬木"] * 4,
+            "quest_name": ["X-A", "X-A", "X-B", "X-A"],
+            "object_name": ["骨", "証", "骨", "骨"],
+            "num": [1, 2, 3, 4],
+            "stack": [1] * 4,
+            "runs": [10, 20, 20, 30],
+            "category": ["フリクエ1部"] * 4,
+            "timestamp": pd.to_datetime([3000, 2000, 2000, 1000], unit="s"),
+        }
+    )
+
+    # 部分ごとの集計をどの順に渡しても、まとめて集計した場合と同じ順に並ぶ
+    result = fold_quest_item_stats(
+        [aggregate_quest_items(reports_df[1:]), aggregate_quest_items(reports_df[:1])]
+    )
+
+    pd.testing.assert_frame_equal(result, aggregate_quest_items(reports_df))
+
+
+def _legacy_create_output_df(group, item_columns):
+    # 転置で行を作っていた従来の実装
+    group = group.sort_values(by="timestamp")
+
+    columns_after_item13 = group.columns.tolist()[
+        group.columns.tolist().index("item34") + 1
+    ]
+    output_columns = ["url", "timestamp", "runs"] + list(item_columns)
+
+    if group[columns_after_item13].isnull().all().all():
+        output_df = pd.DataFrame(columns=output_columns)
+    else:
+        output_df = group.drop(["id", "category", "war_name"], axis=1).reset_index(
+            drop=True
+        )
+
+    for col in output_columns:
+        if col not in output_df.columns:
+            output_df[col] = ""
+
+    output_df = output_df[output_columns[2:] + ["url", "timestamp"]]
+    output_df = output_df.rename(
+        columns={"url": "ソース", "timestamp": "メモ", "runs": "周回数"}
+    )
+    output_df = output_df.T
+    output_df.reset_index(inplace=True)
+    output_df.columns = pd.Index(["No."] + list(output_df.columns[1:]))
+    return output_df
+
+
+def _legacy_write_to_sheet(ws, output_df, war_name, quest_name, previous_war_name):
+    if war_name != previous_war_name:
+        ws.append([war_name])
+
+    ws.append([None, quest_name])
+    ws.append([None] + ["No."])
+
+    for data_row in output_df.values:
+        ws.append([None] + data_row.tolist()[:1] + [None, None] + data_row.tolist()[1:])
+        if data_row.tolist()[0] == "メモ":
+            for cell in ws[ws.max_row][4:]:
+                cell.number_format = "mm/dd"
+        elif data_row.tolist()[0] == "ソース":
+            for cell in ws[ws.max_row][4:]:
+                if cell.value is not None:
+                    cell.hyperlink = str(cell.value)
+
+    ws.append([])
+    ws.append([])
+    return war_name
+
+
+# 統計シートの作成で使っていた、報告・アイテムごとに個数を合計する従来の処理
+def _legacy_aggregate_items_by_object(df):
+    # 入力DataFrameのコピーを作成し、元のDataFrameを変更しないようにする
+    df_processed = df.copy()
+
+    # numとstackの乗算結果を計算する一時カラムを作成
+    # numとstackがint型であることを前提としていますが、乗算結果や合計は大きくなる可能性があるので、
+    # Pandasに適切な型を推論させます。
+    df_processed["_num_stack_product"] = df_processed["num"] * df_processed["stack"]
+
+    # グループ化に使用するカラムリストを定義
+    # object_nameもグループ化キーに含めます
+    group_cols = [
+        "id",
+        "owner",
+        "name",
+        "twitter_id",
+        "twitter_name",
+        "twitter_username",
+        "report_type",
+        "war_name",
+        "quest_type",
+        "quest_name",
+        "timestamp",
+        "runs",
+        "note",
+        "category",
+        "url",
+        "object_name",
+    ]
+
+    # 指定されたカラムとobject_nameでグループ化し、_num_stack_productの合計を計算
+    # aggメソッドを使用して集計し、結果のカラム名を'num'とする
+    aggregated_df = (
+        df_processed.groupby(group_cols)
+        .agg(num=("_num_stack_product", "sum"))
+        .reset_index()
+    )  # グループ化キーをカラムに戻す
+
+    # 集計後のDataFrameにstackカラムを追加し、すべての値を1に設定
+    aggregated_df["stack"] = 1
+
+    # 元のDataFrameの順序に合わせてカラムを並べ替える
+    # 必要なカラムリストを定義
+    output_cols = [
+        "id",
+        "owner",
+        "name",
+        "twitter_id",
+        "twitter_name",
+        "twitter_username",
+        "report_type",
+        "war_name",
+        "quest_type",
+        "quest_name",
+        "timestamp",
+        "runs",
+        "note",
+        "object_name",
+        "num",
+        "stack",
+        "category",
+        "url",
+    ]
+
+    # 並べ替えたDataFrameを作成
+    # aggの結果のカラム順序は group_cols + ['num', 'stack'] のようになっているため、
+    # output_colsリストを使って明示的にカラムを選択し、順序を調整します。
+    result_df = aggregated_df[output_cols]
+
+    return result_df
+
+
+def _legacy_create_statics(wb, reports_df, freequest_df):
+    merged_df = prepare_data(
+        _legacy_aggregate_items_by_object(reports_df), freequest_df
+    )
+    for category_name in ["修練場", "フリクエ1部"]:
+        group = freequest_df[freequest_df["category"] == category_name]
+        ws = wb.create_sheet(title=f"統計【{category_name}】")
+        previous_war_name = ""
+        for _, row in group.iterrows():
+            quest_name = row["counter_name"]
+            item_columns = freequest_df.loc[
+                freequest_df["counter_name"] == quest_name, ITEM_COLUMNS
+            ].values.ravel()
+            item_columns = item_columns[~pd.isnull(item_columns)]
+            output_df = _legacy_create_output_df(
+                merged_df[merged_df["quest_name"] == quest_name], item_columns
+            )
+            previous_war_name = _legacy_write_to_sheet(
+                ws, output_df, row["war_name"], quest_name, previous_war_name
+            )
+
+
+def _saved_parts(wb):
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    with zipfile.ZipFile(buffer) as zf:
+        return {
+            name: zf.read(name)
+            for name in zf.namelist()
+            if not name.startswith("docProps/")
+        }
+
+
+def _statics_inputs():
+    freequest_df = pd.DataFrame(
+        {
+            "category": ["修練場", "フリクエ1部", "フリクエ1部", "フリクエ1部"],
+            "war_name": ["月曜", "冬木", "冬木", "オルレアン"],
+            "spot": ["弓の修練場", "X-A", "X-B", "ティエール"],
+            "quest_name": ["弓の修練場 超級", "屋敷跡", "大橋", "刃物の町"],
+            "counter_name": ["弓の修練場 超級", "X-A", "X-B", "ティエール"],
+            "item1": ["弓魔", "骨", "剣輝", "爪"],
+            "item2": ["弓秘", "剣輝", None, "牙"],
+        }
+    ).reindex(
+        columns=["category", "war_name", "spot", "quest_name", "counter_name"]
+        + ITEM_COLUMNS
+    )
+    reports_df = pd.DataFrame(
+        {
+            "id": ["a", "a", "b", "c", "c", "d", "e", "e", "f"],
+            "owner": ["o"] * 9,
+            "name": ["n"] * 9,
+            "twitter_id": ["t"] * 9,
+            "twitter_name": ["t"] * 9,
+            "twitter_username": ["t"] * 9,
+            "report_type": ["open"] * 9,
+            # 修練場は報告とフリクエデータで war_name が異なる
+            "war_name": ["冬木"] * 3 + ["修練場"] * 2 + ["オルレアン"] + ["冬木"] * 3,
+            "quest_type": ["normal"] * 9,
+            "quest_name": ["X-A"] * 3 + ["弓の修練場 超級"] * 2 + ["ティエール"] + ["X-B"] * 3,
+            "timestamp": pd.to_datetime(
+                [2000, 2000, 1000, 3000, 3000, 4000, 5000, 5000, 6000], unit="s"
+            ),
+            "runs": [100, 100, 50, 30, 30, 10, 20, 20, 40],
+            # メモが欠損している報告は統計シートに含まれない
+            "note": [""] * 8 + [None],
+            "object_name": ["骨", "骨", "骨", "弓魔", "弓秘", "爪", "剣輝", "[E: 泥率]骨", "剣輝"],
+            "num": [10, 2, 5, 20, 3, 4, 6, 90, 7],
+            "stack": [1, 3, 1, 1, 1, 1, 1, 2, 1],
+            "category": ["フリクエ1部"] * 3
+            + ["修練場"] * 2
+            + ["フリクエ1部"] * 2
+            + ["Error"]
+            + ["フリクエ1部"],
+            "url": [f"https://example.com/{i}" for i in "aabccdeef"],
+        }
+    )
+    return reports_df, freequest_df
+
+
+def _sheet_contents(wb):
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    loaded = load_workbook(buffer)
+    return {
+        ws.title: [
+            [
+                (
+                    cell.value,
+                    cell.number_format,
+                    cell.hyperlink and cell.hyperlink.target,
+                )
+                for cell in row
+            ]
+            for row in ws.iter_rows()
+        ]
+        for ws in loaded.worksheets
+    }
+
+
+def test_create_statics_matches_transposed_output():
+    reports_df, freequest_df = _statics_inputs()
+
+    expected_wb = Workbook()
+    del expected_wb["Sheet"]
+    _legacy_create_statics(expected_wb, reports_df, freequest_df)
+    wb = Workbook()
+    del wb["Sheet"]
+    create_statics(wb, prepare_report_set(reports_df), freequest_df)
+    for title in wb.sheetnames[2:]:
+        del wb[title]
+
+    assert _saved_parts(wb) == _saved_parts(expected_wb)
+
+
+def test_create_statics_write_only_workbook():
+    reports_df, freequest_df = _statics_inputs()
+
+    prepared = prepare_report_set(reports_df)
+
+    expected_wb = Workbook()
+    del expected_wb["Sheet"]
+    create_statics(expected_wb, prepared, freequest_df)
+    wb = Workbook(write_only=True)
+    create_statics(wb, prepared, freequest_df)
+
+    # 書き込み専用モードでも値・書式・リンクは同じになる
+    assert _sheet_contents(wb) == _sheet_contents(expected_wb)
+
+
+def test_create_sheets_with_process_pool():
+    reports_df, freequest_df = _statics_inputs()
+
+    prepared = prepare_report_set(reports_df)
+
+    expected_wb = Workbook()
+    del expected_wb["Sheet"]
+    create_list(expected_wb, prepared)
+    create_statics(expected_wb, prepared, freequest_df)
+    wb = Workbook()
+    del wb["Sheet"]
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        create_list(wb, prepared, executor)
+        create_statics(wb, prepared, freequest_df, executor)
+
+    assert wb.sheetnames == expected_wb.sheetnames
+    assert _saved_parts(wb) == _saved_parts(expected_wb)
+
+
+def _legacy_list_rows(df):
+    # groupby("id").agg(list) と iterrows で行を作っていた従来の実装
+    rows = [
+        [
+            "id",
+            "timestamp",
+            "owner",
+            "name",
+            "twitter_id",
+            "twitter_name",
+            "twitter_username",
+            "note",
+            "url",
+            "war_name",
+            "quest_name",
+            "runs",
+        ]
+    ]
+    id_group_df = df.groupby("id").agg(list)
+    id_group_df = id_group_df.sort_values(by="timestamp", ascending=False)
+    for idx, row in id_group_df.iterrows():
+        new_row = []
+        for object_name, num, stack in zip(
+            row["object_name"], row["num"], row["stack"]
+        ):
+            if stack == 1:
+                new_row.extend([object_name, num])
+            elif stack > 1:
+                if (
+                    object_name == "QP"
+                    or object_name.endswith("ポイント")
+                    or object_name.endswith("P")
+                ):
+                    new_row.extend([f"{object_name}(+{stack})", num])
+                else:
+                    new_row.extend([f"{object_name}(x{stack})", num])
+        for col in reversed(rows[0][1:]):
+            new_row.insert(0, row[col][0])
+        new_row.insert(0, idx)
+        rows.append(new_row)
+    return rows
+
+
+def test_create_list_rows_matches_grouped_lists():
+    rng = np.random.default_rng(0)
+    records = []
+    for i in range(60):
+        # 同じタイムスタンプ・同じドロップ数の報告を含める
+        report_id = f"{rng.integers(0, 10**6):06d}-{i:02d}"
+        timestamp = pd.Timestamp(1700000000 + int(rng.integers(0, 5)), unit="s")
+        for object_name in rng.choice(
+            ["骨", "QP", "ボックスガチャポイント", "絆P", "剣輝"],
+            size=int(rng.integers(1, 4)),
+        ):
+            records.append(
+                {
+                    "id": report_id,
+                    "timestamp": timestamp,
+                    "owner": "owner",
+                    "name": "name",
+                    "twitter_id": None,
+                    "twitter_name": "twitter",
+                    "twitter_username": "user",
+                    "note": "",
+                    "url": "https://example.com",
+                    "war_name": "冬木",
+                    "quest_name": "X-A",
+                    "runs": 10,
+                    "report_type": "open",
+                    "quest_type": "normal",
+                    "object_name": object_name,
+                    "num": int(rng.integers(0, 100)),
+                    "stack": int(rng.integers(0, 4)),
+                    "category": "フリクエ1部",
+                }
+            )
+    df = pd.DataFrame(records)
+
+    assert create_list_rows(prepare_report_set(df)) == _legacy_list_rows(df)
+
+
+def test_update_report_set():
+    reports_df, _ = _statics_inputs()
+    prepared = prepare_report_set(reports_df)
+
+    # 検証でErrorになった行は名前が変わり、同じ報告の他の行はErrorカテゴリだけが変わる
+    validated_df = reports_df.copy()
+    validated_df.loc[0, "object_name"] = "[E: 非存在]骨"
+    validated_df.loc[[0, 1], "category"] = "Error"
+    validated_df.loc[1, "stack"] = 3
+    updated = update_report_set(prepared, validated_df)
+
+    assert updated.error.tolist() == [True, True] + [False] * 5 + [True, False]
+    assert updated.drops_df["label"].tolist()[:2] == ["[E: 非存在]骨", "骨(x3)"]
+    assert (
+        create_list_rows(updated)[1:]
+        == create_list_rows(prepare_report_set(validated_df))[1:]
+    )
+    # 全データ用の検証前の中間データは変更されない
+    assert prepared.drops_df["label"].tolist()[0] == "骨"
@@ -2,6 +2,8 @@ import pandas as pd
 
 from fgo_drop_analyzer.data_cleaning import check_nonexistent_items
 from fgo_drop_analyzer.data_cleaning import create_item_normalizer
+from fgo_drop_analyzer.data_cleaning import make_sort_name
+from fgo_drop_analyzer.data_cleaning import normalize_quest
 from fgo_drop_analyzer.data_cleaning import remove_drop_up
 from fgo_drop_analyzer.data_cleaning import validate_drop_rates
 
@@ -331,6 +333,25 @@ def test_check_nonexistent_items():
     pd.testing.assert_frame_equal(output_df, expected_df)
 
 
+def test_check_nonexistent_items_categorical():
+    input_df = pd.DataFrame(
+        {
+            "id": [1, 2, 2],
+            "category": pd.Categorical(["フリクエ1部"] * 3),
+            "quest_name": pd.Categorical(["クエスト1"] * 3),
+            "object_name": pd.Categorical(["証", "証", "種"]),
+        }
+    )
+    freequest_df = pd.DataFrame({"quest_name": ["クエスト1"], "item1": ["証"]})
+
+    output_df = check_nonexistent_items(input_df, freequest_df)
+
+    # カテゴリ型のまま足りないカテゴリが追加される
+    assert output_df["category"].dtype == "category"
+    assert output_df["category"].tolist() == ["フリクエ1部", "Error", "Error"]
+    assert output_df["object_name"].tolist() == ["証", "証", "[E: 非存在]種"]
+
+
 def test_create_item_normalizer():
     # テスト対象の関数を呼び出す
     normalize_item_name = create_item_normalizer()
@@ -352,6 +373,17 @@ def test_create_item_normalizer():
     assert normalize_item_name("かけら") == "カケラ"
 
 
+def test_create_item_normalizer_unknown_name():
+    normalize_item_name = create_item_normalizer()
+
+    # 別名に一致しないアイテム名はNFKC正規化だけされる
+    assert normalize_item_name("QP") == "QP"
+    assert normalize_item_name("ｲﾍﾞﾝﾄﾎﾟｲﾝﾄ") == "イベントポイント"
+    # 同じ入力を繰り返しても結果は変わらない
+    assert normalize_item_name("ｲﾍﾞﾝﾄﾎﾟｲﾝﾄ") == "イベントポイント"
+    assert normalize_item_name("宵哭きの鉄杭") == "鉄杭"
+
+
 def test_remove_drop_up():
     # テスト用のデータフレームを作成
     data = {
@@ -431,3 +463,65 @@ def test_remove_drop_up():
     assert "蹄鉄" not in df["object_name"].values
     assert "勲章" not in df["object_name"].values
     assert df.shape[0] == 14
+
+
+def test_normalize_quest():
+    freequest_df = pd.DataFrame(
+        {
+            "category": ["フリクエ1部", "フリクエ1部", "フリクエ2部"],
+            "war_name": ["冬木", "冬木", "北米"],
+            "spot": ["未確認座標X-A", "未確認座標X-B", "デンバー"],
+            "quest_name": ["屋敷跡", "未確認座標X-A", "デンバー"],
+            "counter_name": ["X-A", "X-B", "デンバー"],
+        }
+    )
+    df = pd.DataFrame(
+        {
+            "war_name": ["冬木", "冬木", "冬木", "北米", "修練場", "イベント"],
+            "quest_name": [
+                "屋敷跡",
+                "未確認座標X-A",  # 先の行の spot に一致するものが優先される
+                "未確認座標X-B",
+                "デンバー",
+                "剣の修練場 極級",
+                "屋敷跡",
+            ],
+        }
+    )
+
+    result = normalize_quest(df, freequest_df)
+
+    expected_df = pd.DataFrame(
+        {
+            "war_name": ["冬木", "冬木", "冬木", "北米", "修練場", "イベント"],
+            "quest_name": ["X-A", "X-A", "X-B", "デンバー", "剣の修練場 極級", "屋敷跡"],
+            "category": ["フリクエ1部", "フリクエ1部", "フリクエ1部", "フリクエ2部", "修練場", "その他クエスト"],
+        }
+    )
+    pd.testing.assert_frame_equal(result, expected_df)
+
+
+def test_make_sort_name():
+    assert make_sort_name("剣の輝石") == "剣輝"
+    assert make_sort_name("狂の魔石") == "狂魔"
+    assert make_sort_name("術の秘石") == "術秘"
+    assert make_sort_name("弓の叡智の猛火") == "弓猛火"
+    assert make_sort_name("セイバーピース") == "剣ピ"
+    assert make_sort_name("バーサーカーモニュメント") == "狂モ"
+    assert make_sort_name("証") == "証"
+    assert make_sort_name("星冠の結晶〔セイバー〕") == "星冠の結晶〔セイバー〕"
+
+
+def test_remove_drop_up_multiple_items():
+    df = pd.DataFrame(
+        {
+            "note": ["骨泥UP 5% 牙泥ＵＰ１０％"] * 3 + ["骨泥UP0% 骨泥UP5%"],
+            "object_name": ["骨", "牙", "証", "骨"],
+        }
+    )
+
+    df = remove_drop_up(df)
+
+    # 同じ備考に複数のアイテムの記述があっても、それぞれのアイテムだけが除外される
+    # 同じアイテムの記述が複数ある場合は最初の記述で判定する
+    assert df["object_name"].tolist() == ["証", "骨"]
@@ -0,0 +1,178 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from fgo_drop_analyzer import data_fetcher
+from fgo_drop_analyzer.data_fetcher import fetch_report_tables
+from fgo_drop_analyzer.data_fetcher import fetch_reports
+from fgo_drop_analyzer.data_fetcher import iter_report_batches
+from fgo_drop_analyzer.data_fetcher import split_time_range
+
+
+def make_item(report_id, timestamp, drops):
+    return {
+        "id": report_id,
+        "owner": "owner",
+        "name": "name",
+        "twitterId": "1",
+        "twitterName": "twitter",
+        "twitterUsername": "user",
+        "type": "open",
+        "warName": "冬木",
+        "questType": "normal",
+        "questName": "未確認座標X-A",
+        "timestamp": timestamp,
+        "runs": 10,
+        "note": "",
+        "dropObjects": [
+            {"objectName": name, "drops": [{"num": num, "stack": 1}]}
+            for name, num in drops
+        ],
+    }
+
+
+ITEMS = [
+    make_item("a", 100, [("骨", 3), ("剣輝", 1)]),
+    make_item("b", 200, [("骨", 2)]),
+    make_item("c", 300, []),
+    make_item("d", 400, [("証", 5)]),
+]
+
+
+class StubGraphQLHandler(BaseHTTPRequestHandler):
+    """listReportsSortedByTimestamp を1ページ2件で返すスタブ"""
+
+    page_size = 2
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body["variables"])
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        condition = body["variables"]["timestamp"]
+        if "between" in condition:
+            lower, upper = condition["between"]
+            items = [item for item in ITEMS if lower <= item["timestamp"] <= upper]
+        else:
+            items = [item for item in ITEMS if item["timestamp"] > condition["gt"]]
+        start = int(body["variables"]["nextToken"] or 0)
+        end = start + self.page_size
+        next_token = str(end) if end < len(items) else None
+        data = {
+            "data": {
+                "listReportsSortedByTimestamp": {
+                    "items": items[start:end],
+                    "nextToken": next_token,
+                }
+            }
+        }
+        payload = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGraphQLHandler)
+    server.requests = []
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        data_fetcher, "GRAPHQL_ENDPOINT", f"http://127.0.0.1:{server.server_port}/"
+    )
+    monkeypatch.setattr(data_fetcher, "API_KEY", "dummy")
+    monkeypatch.setattr(data_fetcher, "BACKOFF_SECONDS", 0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_report_tables(stub_server):
+    reports_df, drops_df = fetch_report_tables(0)
+
+    assert reports_df["id"].tolist() == ["a", "b", "c", "d"]
+    assert reports_df["war_name"].tolist() == ["冬木"] * 4
+    assert drops_df["id"].tolist() == ["a", "a", "b", "d"]
+    assert drops_df["object_name"].tolist() == ["骨", "剣輝", "骨", "証"]
+    assert drops_df["num"].tolist() == [3, 1, 2, 5]
+    # 繰り返し現れる文字列はカテゴリ型、個数は nullable 整数型になる
+    assert reports_df["war_name"].dtype == "category"
+    assert drops_df["object_name"].dtype == "category"
+    assert drops_df["num"].dtype == "Int32"
+    # 2件ずつ nextToken をたどって取得する
+    assert [request["nextToken"] for request in stub_server.requests] == [
+        None,
+        "2",
+    ]
+
+
+def test_fetch_reports_flattened(stub_server):
+    df = fetch_reports(150)
+
+    # ドロップの無い報告は含まれない
+    assert df["id"].tolist() == ["b", "d"]
+    assert df.columns.tolist()[-3:] == ["object_name", "num", "stack"]
+
+
+def test_fetch_report_tables_retry(stub_server):
+    stub_server.failures = 2
+
+    reports_df, _ = fetch_report_tables(0)
+
+    assert reports_df["id"].tolist() == ["a", "b", "c", "d"]
+    assert len(stub_server.requests) == 4
+
+
+def test_fetch_report_tables_retry_exhausted(stub_server, monkeypatch):
+    monkeypatch.setattr(data_fetcher, "MAX_RETRIES", 1)
+    stub_server.failures = 2
+
+    with pytest.raises(ValueError):
+        fetch_report_tables(0)
+
+
+def test_fetch_report_tables_windows(stub_server):
+    reports_df, drops_df = fetch_report_tables(0, windows=4, until=400)
+
+    # 期間ごとに取得しても古い順に結合される
+    assert reports_df["id"].tolist() == ["a", "b", "c", "d"]
+    assert drops_df["id"].tolist() == ["a", "a", "b", "d"]
+    conditions = sorted(
+        tuple(request["timestamp"]["between"]) for request in stub_server.requests
+    )
+    assert conditions == [(1, 100), (101, 200), (201, 300), (301, 400)]
+
+
+def test_iter_report_batches(stub_server):
+    batches = list(iter_report_batches(100, 2))
+
+    # 1ページ2件なので、報告数が2件以上になるページごとにまとめる
+    assert [reports_df["id"].tolist() for reports_df, _ in batches] == [
+        ["b", "c"],
+        ["d"],
+    ]
+    assert [drops_df["id"].tolist() for _, drops_df in batches] == [["b"], ["d"]]
+
+
+def test_split_time_range():
+    assert split_time_range(0, 10, 3) == [
+        {"between": [1, 3]},
+        {"between": [4, 6]},
+        {"between": [7, 10]},
+    ]
+    # 分割数が期間より大きい場合は空の期間を作らない
+    assert split_time_range(0, 2, 4) == [{"between": [1, 1]}, {"between": [2, 2]}]
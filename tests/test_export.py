@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from fgo_drop_analyzer.data_fetcher import REPORT_COLUMNS
+from fgo_drop_analyzer.export import create_report_table
+from fgo_drop_analyzer.export import export_tables
+
+
+def make_reports_df():
+    rows = [
+        ("a", "骨", 10, "フリクエ1部"),
+        ("a", "[E: 泥率]剣輝", 90, "Error"),
+        ("b", "骨", 5, "フリクエ1部"),
+    ]
+    return pd.DataFrame(
+        [
+            {
+                "id": report_id,
+                "owner": "owner",
+                "name": "name",
+                "twitter_id": None,
+                "twitter_name": "twitter",
+                "twitter_username": "user",
+                "report_type": "open",
+                "war_name": "冬木",
+                "quest_type": "normal",
+                "quest_name": "未確認座標X-A",
+                "timestamp": pd.Timestamp(1700000000, unit="s"),
+                "runs": 10,
+                "note": "",
+                "object_name": object_name,
+                "num": num,
+                "stack": 1,
+                "category": category,
+                "url": f"https://fgodrop.max747.org/reports/{report_id}",
+            }
+            for report_id, object_name, num, category in rows
+        ]
+    )
+
+
+def test_create_report_table():
+    report_df = create_report_table(make_reports_df())
+
+    assert report_df.columns.tolist() == REPORT_COLUMNS + ["category", "url"]
+    # いずれかのドロップがErrorの報告はErrorになる
+    assert report_df[["id", "category"]].values.tolist() == [
+        ["a", "Error"],
+        ["b", "フリクエ1部"],
+    ]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather"])
+def test_export_tables(tmp_path, fmt):
+    if fmt != "csv":
+        pytest.importorskip("pyarrow")
+    reports_df = make_reports_df()
+    stats_df = pd.DataFrame(
+        [["冬木", "未確認座標X-A", "骨", 20, 15, 2, 1700000000]],
+        columns=[
+            "war_name",
+            "quest_name",
+            "object_name",
+            "runs",
+            "drops",
+            "reports",
+            "last_timestamp",
+        ],
+    )
+
+    paths = export_tables(str(tmp_path / "out.xlsx"), fmt, reports_df, stats_df)
+
+    suffix = {"csv": ".csv.gz", "parquet": ".parquet", "feather": ".feather"}[fmt]
+    assert [path.name for path in paths] == [
+        f"out_drops{suffix}",
+        f"out_reports{suffix}",
+        f"out_quest_stats{suffix}",
+    ]
+    read = {
+        "csv": pd.read_csv,
+        "parquet": pd.read_parquet,
+        "feather": pd.read_feather,
+    }[fmt]
+    assert read(paths[0])["object_name"].tolist() == ["骨", "[E: 泥率]剣輝", "骨"]
+    assert read(paths[1])["id"].tolist() == ["a", "b"]
+    assert read(paths[2]).values.tolist() == stats_df.values.tolist()
@@ -0,0 +1,41 @@
+import json
+import tracemalloc
+
+from fgo_drop_analyzer.profiler import StageProfiler
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = StageProfiler()
+    with profiler.stage("normalize_item", 10) as stage:
+        stage.rows_out = 8
+    assert profiler.records == []
+
+
+def test_stage_records(tmp_path):
+    profiler = StageProfiler(enabled=True, trace_malloc=True)
+    try:
+        with profiler.stage("normalize_item", 10) as stage:
+            data = [0] * 100_000
+            stage.rows_out = 8
+        del data
+        with profiler.stage("全データ"):
+            pass
+    finally:
+        tracemalloc.stop()
+
+    first, second = profiler.records
+    assert (first.name, first.rows_in, first.rows_out) == ("normalize_item", 10, 8)
+    assert first.wall_time >= 0 and first.cpu_time >= 0
+    assert first.peak_traced_mb > 0.5
+    assert (second.rows_in, second.rows_out) == (None, None)
+
+    lines = profiler.format_table().splitlines()
+    assert len(lines) == 4
+    assert lines[2].startswith("全データ ")
+
+    path = tmp_path / "profile.json"
+    profiler.write_json(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["trace_malloc"] is True
+    assert [stage["name"] for stage in data["stages"]] == ["normalize_item", "全データ"]
+    assert data["stages"][0]["rows_out"] == 8
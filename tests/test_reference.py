@@ -0,0 +1,83 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from fgo_drop_analyzer import reference
+from fgo_drop_analyzer.data_cleaning import create_alias_normalizer
+from fgo_drop_analyzer.data_cleaning import create_item_normalizer
+from fgo_drop_analyzer.reference import load_reference_data
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for name in ["freequest.csv", "item.csv"]:
+        shutil.copy(DATA_DIR / name, data_dir / name)
+    return data_dir
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    # 参照データを作成した回数を数える
+    calls = []
+    build = reference.build_reference_data
+
+    def counting_build(data_dir):
+        calls.append(data_dir)
+        return build(data_dir)
+
+    monkeypatch.setattr(reference, "build_reference_data", counting_build)
+    return calls
+
+
+def test_reference_data_matches_csv():
+    loaded = load_reference_data(DATA_DIR, None)
+    normalize_item_name = create_alias_normalizer(loaded.aliases)
+    expected = create_item_normalizer(DATA_DIR / "item.csv")
+    for name in ["英雄の証", "鳳凰の羽", "煌星のかけら", "ｲﾍﾞﾝﾄﾎﾟｲﾝﾄ", "QP"]:
+        assert normalize_item_name(name) == expected(name)
+    assert loaded.quest_index[("冬木", "未確認座標X-A")] == ("未確認座標X-A", "フリクエ1部")
+
+
+def test_cache_is_reused(data_dir, tmp_path, builds):
+    cache_path = tmp_path / "cache" / "reference.pickle"
+    first = load_reference_data(data_dir, cache_path)
+    second = load_reference_data(data_dir, cache_path)
+
+    assert len(builds) == 1
+    assert cache_path.exists()
+    assert second.quest_index == first.quest_index
+    assert second.freequest_df.equals(first.freequest_df)
+
+
+def test_cache_is_invalidated_by_content(data_dir, tmp_path, builds):
+    cache_path = tmp_path / "reference.pickle"
+    load_reference_data(data_dir, cache_path)
+
+    # 更新時刻だけ変わった場合はハッシュが同じなので作成し直さない
+    stat = (data_dir / "item.csv").stat()
+    os.utime(data_dir / "item.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    load_reference_data(data_dir, cache_path)
+    assert len(builds) == 1
+
+    with open(data_dir / "item.csv", "a", encoding="utf-8") as f:
+        f.write("金,テスト素材,テストの素材,\n")
+    loaded = load_reference_data(data_dir, cache_path)
+    assert len(builds) == 2
+    assert loaded.rarity_dict["テスト素材"] == "金"
+    assert create_alias_normalizer(loaded.aliases)("テストの素材") == "テスト素材"
+
+
+def test_broken_cache_is_rebuilt(data_dir, tmp_path, builds):
+    cache_path = tmp_path / "reference.pickle"
+    cache_path.write_bytes(b"broken")
+    loaded = load_reference_data(data_dir, cache_path)
+    assert len(builds) == 1
+    assert loaded.rarity_dict["証"] == "銅"
+    load_reference_data(data_dir, cache_path)
+    assert len(builds) == 1
@@ -0,0 +1,143 @@
+import pandas as pd
+
+from fgo_drop_analyzer.report_store import has_quest_item_stats
+from fgo_drop_analyzer.report_store import iter_report_windows
+from fgo_drop_analyzer.report_store import load_quest_item_stats
+from fgo_drop_analyzer.report_store import load_report_tables
+from fgo_drop_analyzer.report_store import open_store
+from fgo_drop_analyzer.report_store import read_high_water_mark
+from fgo_drop_analyzer.report_store import split_store_windows
+from fgo_drop_analyzer.report_store import STATS_COLUMNS
+from fgo_drop_analyzer.report_store import update_quest_item_stats
+from fgo_drop_analyzer.report_store import upsert_report_tables
+from tests.helpers import make_tables
+
+
+def test_upsert_and_load(tmp_path):
+    conn = open_store(tmp_path / "reports.sqlite3")
+    reports_df, drops_df = make_tables(
+        [("b", 200), ("a", 100)],
+        [("b", "骨", 2, 1), ("a", "証", 3, 1), ("a", "QP", 10, 1000)],
+    )
+
+    assert upsert_report_tables(conn, reports_df, drops_df) == {"a", "b"}
+
+    loaded_reports_df, loaded_drops_df = load_report_tables(conn)
+    assert loaded_reports_df["id"].tolist() == ["a", "b"]
+    assert loaded_reports_df["twitter_id"].tolist() == [None, None]
+    assert loaded_drops_df.values.tolist() == [
+        ["a", "証", 3, 1],
+        ["a", "QP", 10, 1000],
+        ["b", "骨", 2, 1],
+    ]
+
+    loaded_reports_df, loaded_drops_df = load_report_tables(conn, since=100)
+    assert loaded_reports_df["id"].tolist() == ["b"]
+    assert loaded_drops_df["id"].tolist() == ["b"]
+
+
+def test_split_store_windows(tmp_path):
+    conn = open_store(tmp_path / "reports.sqlite3")
+    reports_df, drops_df = make_tables(
+        [("a", 100), ("b", 200), ("c", 200), ("d", 300), ("e", 400)],
+        [("a", "骨", 1, 1), ("c", "骨", 1, 1), ("e", "骨", 1, 1)],
+    )
+    upsert_report_tables(conn, reports_df, drops_df)
+
+    # 同じ timestamp の報告 b, c は同じ期間に含める
+    assert split_store_windows(conn, 2) == [
+        (None, 200),
+        (200, 300),
+        (300, None),
+    ]
+    windows = [
+        (reports["id"].tolist(), drops["id"].tolist())
+        for reports, drops in iter_report_windows(conn, 2)
+    ]
+    assert windows == [(["a", "b", "c"], ["a", "c"]), (["d"], []), (["e"], ["e"])]
+
+
+def test_upsert_replaces_existing_reports(tmp_path):
+    conn = open_store(tmp_path / "reports.sqlite3")
+    upsert_report_tables(conn, *make_tables([("a", 100)], [("a", "証", 3, 1)]))
+
+    new_ids = upsert_report_tables(
+        conn,
+        *make_tables([("a", 100), ("c", 300)], [("a", "骨", 1, 1), ("c", "牙", 4, 1)]),
+    )
+
+    assert new_ids == {"c"}
+    _, drops_df = load_report_tables(conn)
+    assert drops_df[["id", "object_name"]].values.tolist() == [["a", "骨"], ["c", "牙"]]
+
+
+def test_read_high_water_mark(tmp_path):
+    conn = open_store(tmp_path / "reports.sqlite3")
+    assert read_high_water_mark(conn) == (0, [])
+
+    upsert_report_tables(conn, *make_tables([("a", 100), ("b", 300), ("c", 300)], []))
+
+    assert read_high_water_mark(conn) == (300, ["c", "b", "a"])
+
+
+def test_update_quest_item_stats(tmp_path):
+    conn = open_store(tmp_path / "reports.sqlite3")
+    assert not has_quest_item_stats(conn)
+
+    stats_df = pd.DataFrame(
+        {
+            "war_name": ["冬木", "冬木"],
+            "quest_name": ["X-A", "X-A"],
+            "object_name": ["骨", "剣輝"],
+            "runs": [100, 100],
+            "drops": [30, 10],
+            "reports": [1, 1],
+            "last_timestamp": [1000, 1000],
+        }
+    )
+    update_quest_item_stats(conn, stats_df)
+    update_quest_item_stats(
+        conn,
+        stats_df.iloc[:1].assign(runs=50, drops=20, reports=2, last_timestamp=900),
+    )
+
+    assert has_quest_item_stats(conn)
+    result = load_quest_item_stats(conn).sort_values("object_name", ignore_index=True)
+    assert result[
+        ["object_name", "runs", "drops", "reports", "last_timestamp"]
+    ].values.tolist() == [
+        ["剣輝", 100, 10, 1, 1000],
+        ["骨", 150, 50, 3, 1000],
+    ]
+
+
+def test_unaggregated_reports(tmp_path):
+    conn = open_store(tmp_path / "reports.sqlite3")
+    upsert_report_tables(conn, *make_tables([("a", 100), ("b", 200)], []))
+    stats_df = pd.DataFrame(columns=STATS_COLUMNS)
+
+    update_quest_item_stats(conn, stats_df, ["a"])
+    upsert_report_tables(conn, *make_tables([("a", 100), ("c", 300)], []))
+
+    # 取得し直した報告は集計済みのまま
+    reports_df, _ = load_report_tables(conn, unaggregated=True)
+    assert reports_df["id"].tolist() == ["b", "c"]
+    windows = [
+        reports["id"].tolist()
+        for reports, _ in iter_report_windows(conn, 1, unaggregated=True)
+    ]
+    assert windows == [["b"], ["c"], []]
+
+
+def test_open_store_resets_stats_without_aggregated_reports(tmp_path):
+    path = tmp_path / "reports.sqlite3"
+    conn = open_store(path)
+    update_quest_item_stats(
+        conn,
+        pd.DataFrame([["冬木", "X-A", "骨", 10, 3, 1, 100]], columns=STATS_COLUMNS),
+    )
+    # 集計済みの報告を記録する前の保存先
+    conn.execute("DROP TABLE aggregated_reports")
+    conn.close()
+
+    assert not has_quest_item_stats(open_store(path))
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from fgo_drop_analyzer.schema import apply_schema
+from fgo_drop_analyzer.schema import DROP_DTYPES
+from fgo_drop_analyzer.schema import map_values
+from fgo_drop_analyzer.schema import report_urls
+from fgo_drop_analyzer.schema import set_values
+from fgo_drop_analyzer.schema import to_plain_dtypes
+
+
+def test_apply_schema():
+    drops_df = pd.DataFrame(
+        {"id": ["a", "a", "b"], "object_name": ["骨", "証", "骨"], "num": [1, None, 3]}
+    )
+
+    result = apply_schema(drops_df, DROP_DTYPES)
+
+    # stack のように df に無いカラムは無視する
+    assert result.dtypes.astype(str).tolist() == ["object", "category", "Int32"]
+    assert result["num"].tolist() == [1, pd.NA, 3]
+
+
+def test_set_values_adds_categories():
+    df = pd.DataFrame({"object_name": pd.Categorical(["骨", "証", "骨"])})
+
+    error = [False, True, True]
+    set_values(
+        df,
+        error,
+        "object_name",
+        "[E: 泥率]" + df.loc[error, "object_name"].astype(object),
+    )
+    set_values(df, df["object_name"] == "骨", "object_name", "QP")
+
+    assert df["object_name"].dtype == "category"
+    assert df["object_name"].tolist() == ["QP", "[E: 泥率]証", "[E: 泥率]骨"]
+
+
+def test_map_values_merges_categories():
+    series = pd.Series(pd.Categorical(["英雄の証", None, "証", "凶骨"]), index=[3, 1, 2, 0])
+
+    result = map_values(series, lambda name: name.removeprefix("英雄の").strip("凶"))
+
+    assert result.dtype == "category"
+    assert result.cat.categories.tolist() == ["骨", "証"]
+    assert result.isna().tolist() == [False, True, False, False]
+    assert result.dropna().to_dict() == {3: "証", 2: "証", 0: "骨"}
+
+
+def test_to_plain_dtypes():
+    df = pd.DataFrame(
+        {
+            "id": pd.Categorical(["a", "b"]),
+            "runs": pd.array([10, 20], dtype="Int32"),
+            "num": pd.array([1, None], dtype="Int32"),
+        }
+    )
+
+    result = to_plain_dtypes(df)
+
+    # 欠損のある nullable 整数型はそのまま
+    assert result.dtypes.astype(str).tolist() == ["object", "int64", "Int32"]
+
+
+def test_report_urls():
+    assert report_urls(pd.Series(["a", "b"], dtype="category")).tolist() == [
+        "https://fgodrop.max747.org/reports/a",
+        "https://fgodrop.max747.org/reports/b",
+    ]
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from fgo_drop_analyzer.spill import ReportSpill
+
+
+def make_chunk(ids, names):
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "object_name": pd.Categorical(names),
+            "num": pd.array(range(len(ids)), dtype="Int32"),
+        },
+        index=range(10, 10 + len(ids)),
+    )
+
+
+@pytest.mark.parametrize("use_parquet", [False, True])
+def test_report_spill_round_trip(tmp_path, use_parquet):
+    if use_parquet:
+        pytest.importorskip("pyarrow")
+    spill = ReportSpill(tmp_path, use_parquet=use_parquet)
+
+    spill.write(make_chunk(["a", "a"], ["骨", "証"]))
+    spill.write(make_chunk(["b"], ["QP"]))
+
+    result = spill.read()
+    assert len(spill) == 2
+    assert result.index.tolist() == [0, 1, 2]
+    assert result["id"].tolist() == ["a", "a", "b"]
+    # チャンクごとに異なるカテゴリは揃えて結合する
+    assert result["object_name"].dtype == "category"
+    assert result["object_name"].tolist() == ["骨", "証", "QP"]
+    assert result["num"].dtype == "Int32"